@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+from . import views
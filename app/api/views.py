@@ -0,0 +1,214 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''
+A JSON API for the catalogues and tools that follow the glossary.
+
+Terms, rules and columns are served in the serialized form of their models.
+The fields parameter picks the fields served and include adds related rows,
+which are eager loaded so a page is read with a query for its rows and one
+for each kind of related row. Lists are paged by id, each page returning the
+cursor the next page is read after, and the ids parameter reads many rows by
+id at once.
+'''
+
+import json
+
+from flask import abort, jsonify, request, url_for
+from flask_login import login_required
+from sqlalchemy.orm import joinedload, subqueryload
+
+from . import api
+from app.models import Change, Term, Rule, Table, Column, serialize
+from app.term_bp.views import requested_limit
+
+# The related rows each field of a term reads, loaded with the page
+TERM_LOADS = {
+    'status': joinedload(Term.status),
+    'owner': joinedload(Term.owner),
+    'steward': joinedload(Term.steward),
+    'category': subqueryload(Term.categories),
+    'links': subqueryload(Term.listed_links),
+    'columns': subqueryload(Term.columns).joinedload(Column.table).joinedload(Table.location),
+    'rules': subqueryload(Term.rules)
+}
+
+# terms is a backref of Term, so it is named as it is not set until mappers are configured
+RULE_LOADS = {
+    'terms': subqueryload('terms')
+}
+
+COLUMN_LOADS = {
+    'table': joinedload(Column.table),
+    'location': joinedload(Column.table).joinedload(Table.location),
+    'terms': subqueryload('terms')
+}
+
+# The fields served only when asked for with include
+TERM_INCLUDES = ('category', 'links', 'columns', 'rules')
+RULE_INCLUDES = ('terms',)
+COLUMN_INCLUDES = ('terms',)
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def error(err):
+    '''Describe errors in JSON rather than HTML'''
+    return jsonify(error=err.description), err.code
+
+
+def listed(name):
+    '''Return the comma separated values of a request parameter'''
+    return [value.strip() for value in request.args.get(name, '').split(',') if value.strip()]
+
+
+def requested_ids(name):
+    '''Return the ids in a request parameter, without repeats, aborting if any is not a number'''
+    try:
+        ids = [int(value) for value in listed(name)]
+    except ValueError:
+        abort(400, "%s should be a list of ids" % name)
+    return sorted(set(ids), key=ids.index)
+
+
+def requested_fields(model, includes):
+    '''
+    Return the fields of a model asked for with the fields and include
+    parameters, aborting if any is not known
+
+    :param model: The model served
+    :param includes: The fields served only when included
+    '''
+    names = [name for name, _ in model.SERIALIZED]
+    fields = set(listed('fields')) or set(names) - set(includes)
+    included = set(listed('include'))
+    unknown = (fields - set(names)) | (included - set(includes))
+    if unknown:
+        abort(400, "Unknown fields %s" % ', '.join(sorted(unknown)))
+    return (fields | included | {'id'}) & set(names)
+
+
+def loaded(query, fields, loads):
+    '''Eager load what the fields served read'''
+    options = [loads[field] for field in fields if field in loads]
+    return query.options(*options) if options else query
+
+
+def served(query, model, includes, loads):
+    '''
+    Serve the rows of a query with the ids asked for, or a page of them in id
+    order after the cursor asked for
+
+    :param query: The rows that may be served
+    :param model: Their model
+    :param includes: The fields served only when included
+    :param loads: The eager loads of the fields that read related rows
+    '''
+    fields = requested_fields(model, includes)
+    query = loaded(query, fields, loads)
+    limit = requested_limit('API_PAGE_SIZE')
+
+    if 'ids' in request.args:
+        ids = requested_ids('ids')
+        if len(ids) > limit:
+            abort(400, "At most %s ids may be read at once" % limit)
+        rows = dict((row.id, row) for row in query.filter(model.id.in_(ids))) if ids else {}
+        return jsonify(data=[serialize(rows[row_id], fields) for row_id in ids if row_id in rows],
+                       missing=[row_id for row_id in ids if row_id not in rows])
+
+    after = request.args.get('after', '0')
+    if not after.isdigit():
+        abort(400, "after should be the cursor of the page before")
+    after = int(after)
+    rows = query.filter(model.id > after).order_by(model.id).limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = rows[-1].id if rows else after
+
+    args = request.args.to_dict()
+    args.update(request.view_args, after=cursor, limit=limit)
+    return jsonify(data=[serialize(row, fields) for row in rows],
+                   cursor=cursor,
+                   more=more,
+                   next=url_for(request.endpoint, **args))
+
+
+@api.route('/terms')
+@login_required
+def terms():
+    '''Serve a page of terms, or the terms with the ids asked for'''
+    return served(Term.query, Term, TERM_INCLUDES, TERM_LOADS)
+
+
+@api.route('/terms/<int:term_id>')
+@login_required
+def term(term_id):
+    '''Serve a term'''
+    fields = requested_fields(Term, TERM_INCLUDES)
+    term = loaded(Term.query, fields, TERM_LOADS).filter(Term.id == term_id).first()
+    if term is None:
+        abort(404, "There is no term %s" % term_id)
+    return jsonify(data=serialize(term, fields))
+
+
+@api.route('/rules')
+@login_required
+def rules():
+    '''Serve a page of rules, or the rules with the ids asked for'''
+    return served(Rule.query, Rule, RULE_INCLUDES, RULE_LOADS)
+
+
+@api.route('/tables/<int:table_id>/columns')
+@login_required
+def table_columns(table_id):
+    '''Serve a page of the columns of a table, or those with the ids asked for'''
+    if Table.query.get(table_id) is None:
+        abort(404, "There is no table %s" % table_id)
+    return served(Column.query.filter(Column.table_id == table_id), Column, COLUMN_INCLUDES,
+                  COLUMN_LOADS)
+
+
+@api.route('/changes')
+@login_required
+def changes():
+    '''
+    Serve the changes recorded after a cursor, oldest first. The cursor
+    returned is passed as since to fetch the next page, and again later to
+    fetch the changes made since. A reload change means the glossary was
+    loaded in bulk and should be read again in full.
+
+    The cursor is the id of the last change served. It is safe because
+    changes are inserted one transaction at a time, as insert_changes
+    describes, so no change is committed with an id below one already served.
+    '''
+    since = request.args.get('since', '0')
+    if not since.isdigit():
+        abort(400, "since should be the cursor of the last page read")
+    since = int(since)
+    limit = requested_limit('CHANGES_PAGE_SIZE')
+
+    rows = Change.query.filter(Change.id > since).order_by(Change.id).limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = rows[-1].id if rows else since
+
+    return jsonify(changes=[{'id': change.id,
+                             'entity': change.entity,
+                             'operation': change.operation,
+                             'key': json.loads(change.key),
+                             'changed_on': change.changed_on.isoformat()}
+                            for change in rows],
+                   cursor=cursor,
+                   more=more,
+                   next=url_for('api.changes', since=cursor, limit=limit))
@@ -21,8 +21,11 @@ import click
 from flask import current_app
 from flask.cli import with_appcontext
 
+from app import search
+from app.config import BASE_DIR
 from app.extensions import db
-from app.loader import load_yaml, dump_yaml
+from app.loader import load_yaml, dump_yaml, snapshot, load_csv
+from app.main import rendering
 
 
 @click.group()
@@ -38,19 +41,87 @@ def clear():
     db.create_all()
 
 
+@data.command('reindex')
+@with_appcontext
+def reindex():
+    '''Rebuild the search index.'''
+    count = search.rebuild()
+    db.session.commit()
+    print("Indexed %s documents" % count)
+
+
+@data.command('render')
+@click.option('--all', 'everything', is_flag=True,
+              help='Render every row again rather than only those not yet rendered.')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='The number of rows committed at a time.')
+@with_appcontext
+def render(everything, batch_size):
+    '''Render the Markdown of terms, rules and notes to HTML.'''
+    count = rendering.backfill(everything=everything, batch_size=batch_size)
+    print("Rendered %s descriptions and notes" % count)
+
+
+FORMATS = click.Choice(['yaml', 'snapshot'])
+
+
+def load_snapshot(directory, workers=None):
+    '''Restore a snapshot, reporting why it could not be restored'''
+    try:
+        count = snapshot.load(directory, workers=workers)
+    except ValueError as err:
+        print(err)
+        return False
+    print("Restored %s rows" % count)
+    return True
+
+
 @data.command('load')
 @click.argument('filename')
+@click.option('--format', 'data_format', type=FORMATS, default='yaml', show_default=True,
+              help='A YAML file or a snapshot directory.')
+@click.option('--bulk', is_flag=True,
+              help='Load in batches rather than one record at a time.')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='The number of records committed at a time with --bulk.')
+@click.option('--workers', type=int,
+              help='The number of threads restoring a snapshot.')
 @with_appcontext
-def load_data(filename):
-    '''Load all glossary data from YAML file.'''
-    load_yaml.load(filename)
+def load_data(filename, data_format, bulk, batch_size, workers):
+    '''Load all glossary data from YAML file or snapshot.'''
+    if data_format == 'snapshot':
+        load_snapshot(filename, workers)
+    else:
+        load_yaml.load(filename, bulk=bulk, batch_size=batch_size)
+
+
+@data.command('load-csv')
+@click.argument('directory', required=False)
+@click.option('--chunk-size', default=load_csv.CHUNK_SIZE, show_default=True,
+              help='The number of rows committed at a time.')
+@click.option('--sync', is_flag=True,
+              help='Update the locations, tables, columns and terms that have changed.')
+@with_appcontext
+def load_csv_data(directory, chunk_size, sync):
+    '''Load the bg_interface_*.csv files from a directory, bg_interface by default.'''
+    if directory is None:
+        directory = join(dirname(BASE_DIR), 'bg_interface')
+    if not isdir(directory):
+        print("The directory %s does not exist" % directory)
+        return
+    for file_name, count in load_csv.load(directory, chunk_size=chunk_size, sync=sync).items():
+        print("Added %s rows from %s" % (count, file_name))
 
 
 @data.command('dump')
 @click.argument('directory')
+@click.option('--format', 'data_format', type=FORMATS, default='yaml', show_default=True,
+              help='A YAML file or a snapshot directory.')
+@click.option('--incremental', is_flag=True,
+              help='Dump only what changed since the last backup.')
 @with_appcontext
-def dump_data(directory):
-    '''Dump all glossary data to YAML file.'''
+def dump_data(directory, data_format, incremental):
+    '''Dump all glossary data to YAML file or snapshot.'''
 
     timestr = time.strftime("%Y%m%d-%H%M%S")
 
@@ -63,6 +134,39 @@ def dump_data(directory):
         print("The directory %s does not exist" % file_path)
         return
 
-    file_name = join(file_path, "bg_export_" + timestr)
+    if data_format == 'snapshot':
+        if incremental:
+            print("Snapshots are always full backups")
+            return
+        snapshot.dump(join(file_path, "bg_snapshot_" + timestr))
+        return
+
+    since = dump_yaml.last_backup_mark() if incremental else None
+    if incremental and since is None:
+        print("There is no earlier backup so everything will be dumped")
+
+    if since is None:
+        file_name = join(file_path, "bg_export_" + timestr)
+    else:
+        file_name = join(file_path, "bg_delta_" + timestr)
+
+    dump_yaml.dump(file_name + ".yaml", since=since)
+
 
-    dump_yaml.dump(file_name + ".yaml")
+@data.command('restore')
+@click.argument('base')
+@click.argument('deltas', nargs=-1)
+@click.option('--bulk', is_flag=True,
+              help='Load the full backup in batches rather than one record at a time.')
+@click.option('--workers', type=int,
+              help='The number of threads restoring a snapshot.')
+@with_appcontext
+def restore_data(base, deltas, bulk, workers):
+    '''Restore a full backup followed by incremental backups, oldest first.'''
+    if isdir(base):
+        if not load_snapshot(base, workers):
+            return
+    else:
+        load_yaml.load(base, bulk=bulk)
+    for delta in deltas:
+        load_yaml.load(delta, update=True)
@@ -7,7 +7,12 @@ class Config(object):
     '''Define the base configuration object'''
     SECRET_KEY = 'This is a new secret key'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    TERMS_PER_PAGE = 5
+    TERMS_PER_PAGE = 15
+    TERMS_PER_PAGE_MAX = 100
+    AUTOCOMPLETE_LIMIT = 50
+    ASSET_TREE_PAGE_SIZE = 100
+    CHANGES_PAGE_SIZE = 1000
+    API_PAGE_SIZE = 100
     CSRF_ENABLED = True
 
     MAIL_SERVER = 'mail.example.com'
@@ -22,6 +27,43 @@ class Config(object):
 
     APPLICATION_NAME = 'Business Glossary'
 
+    # Search index backend: sqlite, postgres, memory or like. Chosen from the
+    # database dialect when not set.
+    SEARCH_BACKEND = None
+    SEARCH_RESULTS_LIMIT = 200
+    # Snapshot of the in-memory search index so new workers start warm
+    SEARCH_SNAPSHOT = os.path.join(os.path.dirname(BASE_DIR), 'bg_interface', 'search_index.pickle')
+
+    # Threads running background jobs such as backups and PDFs. Jobs run in
+    # the request that submits them when JOBS_SYNCHRONOUS is set.
+    JOB_WORKERS = 2
+    JOBS_SYNCHRONOUS = False
+    # Seconds after which a job queued or started by another process that has
+    # not finished is taken to have been abandoned by a process that stopped
+    JOB_TIMEOUT = 60 * 60
+
+    # Threads inserting the chunks of a snapshot as it is restored. SQLite
+    # restores with one unless told otherwise.
+    RESTORE_WORKERS = 4
+
+    # Glossaries larger than PDF_CHUNK_SIZE terms are printed in chunks by up
+    # to PDF_WORKERS wkhtmltopdf processes, one per CPU when not set
+    PDF_CHUNK_SIZE = 250
+    PDF_WORKERS = None
+
+    # Printed PDFs are kept in bg_interface until the glossary changes or
+    # they are the least recently used when the cache grows past this size
+    PDF_CACHE_SIZE = 500 * 1024 * 1024
+
+    # Cache of rendered term pages: sqlite to share them between the processes
+    # on a host through a file, memory to keep them in each process, or None
+    # to render them on every request. A change only removes pages from the
+    # memory cache of the process that made it, so memory is only for servers
+    # running a single process.
+    FRAGMENT_CACHE = 'sqlite'
+    FRAGMENT_CACHE_SIZE = 1000
+    FRAGMENT_CACHE_PATH = os.path.join(os.path.dirname(BASE_DIR), 'bg_interface', 'fragment_cache.sqlite')
+
     # Flask-Security flags
     SECURITY_CONFIRMABLE = False
     SECURITY_REGISTERABLE = False
@@ -56,6 +98,10 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     '''Define the test configuration object'''
     TESTING = True
+    JOBS_SYNCHRONOUS = True
+    # The tests run in one process, and a cache file would outlive the test
+    # database the pages were rendered from
+    FRAGMENT_CACHE = 'memory'
     SQLALCHEMY_DATABASE_URI = os.environ.get('BG_DATABASE_URL') or \
         'sqlite:///' + os.path.join(BASE_DIR, 'glossary_test.db')
     SQLALCHEMY_ECHO = False
@@ -20,12 +20,15 @@ import warnings
 from app.extensions import db, security, bootstrap, mail, pages, moment, csrf, migrate
 from app.config import config, BASE_DIR
 
-from app import commands
+from app import commands, fragments, search
 
 from app.users.models import User, Role
 
 from app.main import main as main_blueprint
 from app.term_bp import term_bp as term_bp_blueprint
+from app.jobs import jobs as jobs_blueprint, runner as job_runner
+from app.api import api as api_blueprint
+from app.main import rendering
 
 from flask import Flask
 from flaskext.markdown import Markdown
@@ -76,7 +79,7 @@ def create_app(config_name):
     moment.init_app(app)
     migrate.init_app(app, db)
 
-    md = Markdown(app, output_format='html5', extensions=['fenced_code', 'tables', 'abbr', 'footnotes'])
+    md = Markdown(app, output_format='html5', extensions=rendering.EXTENSIONS)
 
     pages.init_app(app)
     csrf.init_app(app)
@@ -84,6 +87,7 @@ def create_app(config_name):
     register_adminviews(app)
 
     app.jinja_env.filters['alert_class'] = alert_class_filter
+    app.jinja_env.filters['markdown_html'] = rendering.markdown_html
 
     # WTForms helpers
     from .utils import add_helpers
@@ -122,6 +126,10 @@ def create_app(config_name):
             db.session.commit()
             app.logger.info('Created admin user admin@example.com')
 
+    search.init_app(app)
+    fragments.init_app(app)
+    job_runner.init_app(app)
+
     return app
 
 #print
@@ -137,7 +145,7 @@ def create_app(config_name):
 def register_adminviews(app):
     '''Register Flask-Admin views.'''
 
-    from app.main.admin import MyHomeView, RuleView, FileView, TableView, ColumnView, ProtectedModelView, TermView, PrintView
+    from app.main.admin import MyHomeView, RuleView, NoteView, FileView, TableView, ColumnView, ProtectedModelView, TermView, PrintView
 
     admin = Admin(app,
                   name='BUSINESS GLOSSARY',
@@ -147,7 +155,7 @@ def register_adminviews(app):
 
     admin.add_view(TermView(Term, db.session))
     admin.add_view(RuleView(Rule, db.session))
-    admin.add_view(ProtectedModelView(Note, db.session))
+    admin.add_view(NoteView(Note, db.session))
     admin.add_view(ProtectedModelView(Link, db.session))
     admin.add_view(FileView(Document, db.session))
     admin.add_view(ProtectedModelView(Location, db.session, category="Assets"))
@@ -164,6 +172,8 @@ def register_blueprints(app):
     '''Register Flask blueprints.'''
     app.register_blueprint(main_blueprint)
     app.register_blueprint(term_bp_blueprint)
+    app.register_blueprint(jobs_blueprint)
+    app.register_blueprint(api_blueprint)
 
 
 def register_commands(app):
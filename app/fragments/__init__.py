@@ -0,0 +1,194 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''
+A cache of rendered page fragments, such as the body of a term page.
+
+Fragments are kept by a pluggable backend chosen with the FRAGMENT_CACHE
+setting and grouped by the term they show. Before each flush the terms whose
+pages show anything being changed are noted, and their fragments are removed
+once the change is committed.
+'''
+
+import itertools
+import logging
+from collections import defaultdict
+
+from flask import current_app, has_app_context
+from markupsafe import Markup
+from sqlalchemy import inspect, select, union
+from sqlalchemy.event import listens_for
+
+from app.extensions import db
+from app.fragments.backends import MemoryBackend, SqliteBackend
+from app.main.models import Term, TermStatus, Category, Link, Location, Table, Column, \
+    Rule, Note, Document, DocumentType, \
+    term_category_relationship, term_column_relationship, term_document_relationship, \
+    term_rule_relationship, term_to_term_relationship, document_types_relationship
+
+LOGGER = logging.getLogger("business-glossary.fragments")
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'sqlite': SqliteBackend
+}
+
+# The key in session.info of the terms whose fragments a commit makes stale
+STALE = 'stale_fragments'
+
+t2t = term_to_term_relationship
+tcr = term_column_relationship
+tdr = term_document_relationship
+
+# How to find the terms whose pages show rows of each model, given their ids
+SHOWN_BY = {
+    Term: lambda ids: union(select([t2t.c.term_id]).where(t2t.c.related_term_id.in_(ids)),
+                            select([t2t.c.related_term_id]).where(t2t.c.term_id.in_(ids))),
+    TermStatus: lambda ids: select([Term.id]).where(Term.status_id.in_(ids)),
+    Category: lambda ids: select([term_category_relationship.c.term_id])
+                          .where(term_category_relationship.c.category_id.in_(ids)),
+    Link: lambda ids: select([Link.term_id]).where(Link.id.in_(ids)),
+    Rule: lambda ids: select([term_rule_relationship.c.term_id])
+                      .where(term_rule_relationship.c.rule_id.in_(ids)),
+    Document: lambda ids: select([tdr.c.term_id]).where(tdr.c.document_id.in_(ids)),
+    DocumentType: lambda ids: select([tdr.c.term_id])
+                              .select_from(tdr.join(document_types_relationship,
+                                                    document_types_relationship.c.document_id ==
+                                                    tdr.c.document_id))
+                              .where(document_types_relationship.c.document_type_id.in_(ids)),
+    Note: lambda ids: select([term_rule_relationship.c.term_id])
+                      .select_from(term_rule_relationship.join(
+                          Note.__table__, Note.rule_id == term_rule_relationship.c.rule_id))
+                      .where(Note.id.in_(ids)),
+    Column: lambda ids: select([tcr.c.term_id]).where(tcr.c.column_id.in_(ids)),
+    Table: lambda ids: select([tcr.c.term_id])
+                       .select_from(tcr.join(Column.__table__, Column.id == tcr.c.column_id))
+                       .where(Column.table_id.in_(ids)),
+    Location: lambda ids: select([tcr.c.term_id])
+                          .select_from(tcr.join(Column.__table__, Column.id == tcr.c.column_id)
+                                       .join(Table.__table__, Table.id == Column.table_id))
+                          .where(Table.location_id.in_(ids))
+}
+
+# The attributes of new or moved rows, which SHOWN_BY cannot find until they
+# are flushed, that refer to what they are shown with
+REFERENCES = {
+    Link: (('term_id', Term), ('term', Term), ('terms', Term)),
+    Note: (('rule_id', Rule), ('rule', Rule), ('rules', Rule))
+}
+
+
+def init_app(app):
+    '''Choose the fragment cache backend for the application'''
+    name = app.config.get('FRAGMENT_CACHE')
+    app.extensions['fragments'] = BACKENDS[name].from_config(app.config) if name else None
+
+
+def get_backend():
+    '''Return the fragment cache backend of the current application'''
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('fragments')
+
+
+def term_group(term_id):
+    '''Return the group of the fragments showing a term'''
+    return 'term:%s' % term_id
+
+
+def cached(group, key, render):
+    '''
+    Return a fragment from the cache, rendering and caching it if it is not there
+
+    :param group: The group of the fragment
+    :param key: Identifies the fragment within its group
+    :param render: Called to render the fragment when it is not cached
+    '''
+    backend = get_backend()
+    if backend is None:
+        return Markup(render())
+    fragment = backend.get(group, key)
+    if fragment is None:
+        fragment = render()
+        backend.set(group, key, fragment)
+    return Markup(fragment)
+
+
+def clear():
+    '''Remove every fragment, after changes made without the ORM'''
+    backend = get_backend()
+    if backend is not None:
+        backend.clear()
+
+
+def mark_stale(session, term_ids):
+    '''Note the terms whose fragments a change made without the ORM makes
+    stale, to be removed when the session commits'''
+    if get_backend() is not None:
+        session.info.setdefault(STALE, set()).update(term_ids)
+
+
+def history_ids(state, attribute):
+    '''Return the ids an attribute of an instance refers to now and before it changed'''
+    history = state.attrs[attribute].history
+    for value in itertools.chain(history.added or (), history.unchanged or (),
+                                 history.deleted or ()):
+        value = getattr(value, 'id', value)
+        if value is not None:
+            yield value
+
+
+def shown_on(connection, objects):
+    '''Return the ids of the terms whose pages show any of some instances'''
+    term_ids = set()
+    ids = defaultdict(set)
+    for obj in objects:
+        if obj.id is not None:
+            ids[type(obj)].add(obj.id)
+        state = inspect(obj)
+        for attribute, model in REFERENCES.get(type(obj), ()):
+            (term_ids if model is Term else ids[model]).update(history_ids(state, attribute))
+
+    # A term's page shows the term and the names of the terms related to it
+    term_ids.update(ids.get(Term, ()))
+    for model, model_ids in ids.items():
+        if model_ids:
+            term_ids.update(row[0] for row in connection.execute(SHOWN_BY[model](list(model_ids))))
+    return term_ids
+
+
+@listens_for(db.session, 'before_flush')
+def note_stale_fragments(session, flush_context, instances):
+    '''Note the terms whose pages show anything the flush changes'''
+    if get_backend() is None:
+        return
+    changed = [obj for obj in itertools.chain(session.new, session.dirty, session.deleted)
+               if type(obj) in SHOWN_BY]
+    if changed:
+        session.info.setdefault(STALE, set()).update(shown_on(session.connection(), changed))
+
+
+@listens_for(db.session, 'after_commit')
+def remove_stale_fragments(session):
+    '''Remove the fragments made stale by the changes just committed'''
+    term_ids = session.info.pop(STALE, None)
+    backend = get_backend()
+    if term_ids and backend is not None:
+        backend.invalidate([term_group(term_id) for term_id in term_ids])
+
+
+@listens_for(db.session, 'after_rollback')
+def forget_stale_fragments(session):
+    '''Forget the changes that were rolled back'''
+    session.info.pop(STALE, None)
@@ -0,0 +1,179 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''Fragment cache backends'''
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+LOGGER = logging.getLogger("business-glossary.fragments")
+
+
+class FragmentBackend(object):
+    '''
+    Base class of the fragment cache backends.
+
+    Fragments are cached by group, such as the term they show, and key, such
+    as the version of the term and whether it was rendered for an editor, so
+    every fragment of a group can be removed at once.
+    '''
+    name = None
+
+    @classmethod
+    def from_config(cls, config):
+        '''Create the backend from the application configuration'''
+        return cls()
+
+    def get(self, group, key):
+        '''Return a cached fragment or None'''
+
+    def set(self, group, key, fragment):
+        '''Cache a fragment'''
+
+    def invalidate(self, groups):
+        '''Remove every fragment of some groups'''
+
+    def clear(self):
+        '''Remove every fragment'''
+
+
+class MemoryBackend(FragmentBackend):
+    '''
+    Keeps the most recently used fragments in the memory of each process.
+
+    Each process only removes the fragments made stale by changes made through
+    it, so this suits deployments with a single application process.
+    '''
+    name = 'memory'
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.lock = threading.Lock()
+        self.fragments = OrderedDict()
+        self.groups = {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(size=config['FRAGMENT_CACHE_SIZE'])
+
+    def get(self, group, key):
+        with self.lock:
+            fragment = self.fragments.get((group, key))
+            if fragment is not None:
+                self.fragments.move_to_end((group, key))
+            return fragment
+
+    def set(self, group, key, fragment):
+        with self.lock:
+            self.fragments[(group, key)] = fragment
+            self.fragments.move_to_end((group, key))
+            self.groups.setdefault(group, set()).add(key)
+            while len(self.fragments) > self.size:
+                (old_group, old_key), _ = self.fragments.popitem(last=False)
+                self._forget(old_group, old_key)
+
+    def _forget(self, group, key):
+        keys = self.groups.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.groups[group]
+
+    def invalidate(self, groups):
+        with self.lock:
+            for group in groups:
+                for key in self.groups.pop(group, ()):
+                    self.fragments.pop((group, key), None)
+
+    def clear(self):
+        with self.lock:
+            self.fragments.clear()
+            self.groups.clear()
+
+
+class SqliteBackend(FragmentBackend):
+    '''
+    Keeps fragments in a SQLite file that every application process on the
+    host shares, so a change made through one process is seen by all.
+
+    When the file holds more than the configured number of fragments the
+    oldest are removed. A cache that cannot be read or written is logged and
+    the fragment rendered as if it was not cached.
+    '''
+    name = 'sqlite'
+
+    # The most groups removed by one statement
+    BATCH = 500
+
+    def __init__(self, path, size=1000):
+        self.path = path
+        self.size = size
+        self.local = threading.local()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['FRAGMENT_CACHE_PATH'], size=config['FRAGMENT_CACHE_SIZE'])
+
+    def connection(self):
+        '''Return the connection of this thread, creating the cache if needed'''
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS fragment ("
+                               "grp TEXT NOT NULL, key TEXT NOT NULL, fragment TEXT NOT NULL, "
+                               "stored REAL NOT NULL, PRIMARY KEY (grp, key))")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_fragment_stored "
+                               "ON fragment (stored)")
+            self.local.connection = connection
+        return connection
+
+    def get(self, group, key):
+        try:
+            row = self.connection().execute(
+                "SELECT fragment FROM fragment WHERE grp = ? AND key = ?", (group, key)).fetchone()
+        except sqlite3.Error as ex:
+            LOGGER.warning("Could not read the fragment cache: %s", ex)
+            return None
+        return row[0] if row else None
+
+    def set(self, group, key, fragment):
+        try:
+            connection = self.connection()
+            connection.execute("INSERT OR REPLACE INTO fragment (grp, key, fragment, stored) "
+                               "VALUES (?, ?, ?, ?)", (group, key, fragment, time.time()))
+            connection.execute("DELETE FROM fragment WHERE rowid IN (SELECT rowid FROM fragment "
+                               "ORDER BY stored DESC, rowid DESC LIMIT -1 OFFSET ?)", (self.size,))
+        except sqlite3.Error as ex:
+            LOGGER.warning("Could not write the fragment cache: %s", ex)
+
+    def invalidate(self, groups):
+        groups = list(groups)
+        try:
+            connection = self.connection()
+            for index in range(0, len(groups), self.BATCH):
+                batch = groups[index:index + self.BATCH]
+                connection.execute("DELETE FROM fragment WHERE grp IN (%s)" %
+                                   ', '.join('?' * len(batch)), batch)
+        except sqlite3.Error as ex:
+            LOGGER.error("Could not remove stale fragments from the cache: %s", ex)
+
+    def clear(self):
+        try:
+            self.connection().execute("DELETE FROM fragment")
+        except sqlite3.Error as ex:
+            LOGGER.error("Could not clear the fragment cache: %s", ex)
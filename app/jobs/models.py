@@ -0,0 +1,75 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+import datetime
+import json
+
+from app.extensions import db
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+
+class Job(db.Model):
+    '''A piece of work run in the background that produces a file in bg_interface'''
+    __tablename__ = 'job'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    arguments = db.Column(db.Text)
+    status = db.Column(db.String(10), nullable=False, default=QUEUED)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.String(200))
+    filename = db.Column(db.String(200))
+    error = db.Column(db.Text)
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user = db.relationship('User')
+
+    created_on = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    started_on = db.Column(db.DateTime)
+    finished_on = db.Column(db.DateTime)
+
+    @property
+    def args(self):
+        '''The arguments the job is run with'''
+        return json.loads(self.arguments) if self.arguments else []
+
+    @property
+    def done(self):
+        return self.status in (FINISHED, FAILED)
+
+    def report(self, progress, message=None):
+        '''Record how far through the job is'''
+        self.progress = progress
+        self.message = message
+        db.session.commit()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'filename': self.filename,
+            'error': self.error,
+            'created_on': self.created_on.isoformat() if self.created_on else None,
+            'started_on': self.started_on.isoformat() if self.started_on else None,
+            'finished_on': self.finished_on.isoformat() if self.finished_on else None
+        }
+
+    def __repr__(self):
+        return '<Job %s %s %s>' % (self.id, self.kind, self.status)
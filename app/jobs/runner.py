@@ -0,0 +1,166 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''
+Run jobs on a pool of threads so long running work does not hold up a request.
+
+Each job is recorded in the job table when it is submitted and updated as it
+runs, so its progress can be followed from any request. A job runs in its own
+request context with its own database session.
+
+Jobs live only in the pool of the process that submitted them, so a job left
+queued or running when its process stops never finishes. A job is taken to
+be live while it is in the pool of this process, or for JOB_TIMEOUT seconds
+after it was queued or started by another. Older jobs are failed as abandoned
+when the application starts and when their status is read. Other processes
+are still running, so their jobs can only be judged by their age.
+'''
+
+import datetime
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from flask_login import current_user
+from sqlalchemy import func
+
+from app.extensions import db
+from app.jobs.models import Job, QUEUED, RUNNING, FINISHED, FAILED
+
+LOGGER = logging.getLogger("business-glossary.jobs")
+
+# The function that does the work of each kind of job
+TASKS = {}
+
+# The ids of the jobs submitted in this process that have not yet finished
+ACTIVE = set()
+
+ABANDONED = "The job was abandoned when the process running it stopped"
+
+
+def task(kind):
+    '''Register the function that runs a kind of job'''
+    def register(function):
+        TASKS[kind] = function
+        return function
+    return register
+
+
+def init_app(app):
+    '''Start the pool of job threads, or run jobs as they are submitted if
+    JOBS_SYNCHRONOUS is set'''
+    if app.config.get('JOBS_SYNCHRONOUS'):
+        app.extensions['jobs'] = None
+    else:
+        app.extensions['jobs'] = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'])
+
+    with app.app_context():
+        expire_abandoned()
+
+
+def stale_before():
+    '''Return the time before which jobs in other processes are taken to be abandoned'''
+    return datetime.datetime.utcnow() - \
+        datetime.timedelta(seconds=current_app.config['JOB_TIMEOUT'])
+
+
+def live(job):
+    '''Return whether a job that has not finished may still finish'''
+    if job.done:
+        return False
+    return job.id in ACTIVE or (job.started_on or job.created_on) >= stale_before()
+
+
+def abandon(job):
+    '''Record a job as failed because the process running it stopped'''
+    LOGGER.warning("Job %s %s was abandoned", job.id, job.kind)
+    job.status = FAILED
+    job.error = ABANDONED
+    job.finished_on = datetime.datetime.utcnow()
+
+
+def expire_abandoned():
+    '''Fail the jobs queued or running for longer than JOB_TIMEOUT that are not
+    in this process, and return how many there were'''
+    jobs = Job.query.filter(Job.status.in_((QUEUED, RUNNING)),
+                            func.coalesce(Job.started_on, Job.created_on) < stale_before()).all()
+    jobs = [job for job in jobs if job.id not in ACTIVE]
+    for job in jobs:
+        abandon(job)
+    db.session.commit()
+    return len(jobs)
+
+
+def submit(kind, filename, *args):
+    '''
+    Queue a job and return its id
+
+    :param kind: The kind of job, one of TASKS
+    :param filename: The name of the file the job creates in bg_interface
+    :param args: Arguments passed to the task, which must be JSON serialisable
+    '''
+    if kind not in TASKS:
+        raise ValueError("Unknown job %s" % kind)
+
+    job = Job(kind=kind, filename=filename, arguments=json.dumps(list(args)))
+    if current_user and current_user.is_authenticated:
+        job.user_id = current_user.id
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.id
+
+    executor = current_app.extensions.get('jobs')
+    if executor is None:
+        execute(job_id)
+    else:
+        ACTIVE.add(job_id)
+        executor.submit(run, current_app._get_current_object(), job_id)
+    return job_id
+
+
+def run(app, job_id):
+    '''Run a job on a pool thread'''
+    with app.test_request_context():
+        try:
+            execute(job_id)
+        finally:
+            ACTIVE.discard(job_id)
+            db.session.remove()
+
+
+def execute(job_id):
+    '''Run a job, recording whether it finished or failed'''
+    job = Job.query.get(job_id)
+    job.status = RUNNING
+    job.started_on = datetime.datetime.utcnow()
+    db.session.commit()
+    LOGGER.info("Started job %s %s", job.id, job.kind)
+
+    try:
+        TASKS[job.kind](job, *job.args)
+    except Exception as ex:
+        LOGGER.exception("Job %s failed", job_id)
+        db.session.rollback()
+        job = Job.query.get(job_id)
+        job.status = FAILED
+        job.error = str(ex)
+    else:
+        job.status = FINISHED
+        job.error = None
+        job.progress = 100
+        LOGGER.info("Finished job %s %s", job.id, job.kind)
+
+    job.finished_on = datetime.datetime.utcnow()
+    db.session.commit()
@@ -0,0 +1,48 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''The jobs that can be run in the background'''
+
+from os.path import dirname, join
+
+from app.config import BASE_DIR
+from app.jobs.runner import task
+
+
+def output_path(filename):
+    '''Return where a job writes its file'''
+    return join(dirname(BASE_DIR), 'bg_interface', filename)
+
+
+@task('backup')
+def backup(job):
+    '''Dump all glossary data to YAML'''
+    from app.loader import dump_yaml
+    dump_yaml.dump(output_path(job.filename), progress=job.report)
+
+
+@task('export')
+def column_association_export(job):
+    '''Export the columns associated with each term to CSV'''
+    from app.loader import export
+    export.export(output_path(job.filename))
+
+
+@task('pdf')
+def pdf(job, categories):
+    '''Print glossary content to PDF and add it to the PDF cache'''
+    from app import pdf_cache
+    from app.print import generate_pdf
+    generate_pdf(job.filename, categories, user=job.user, progress=job.report)
+    pdf_cache.evict(job.filename)
@@ -0,0 +1,57 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+from flask import abort, jsonify, render_template, url_for
+from flask_login import current_user, login_required
+
+from . import jobs
+from app.extensions import db
+from app.jobs import runner
+from app.jobs.models import Job, FINISHED
+
+TITLES = {
+    'backup': 'Backup Business Glossary Data',
+    'export': 'Column Associations Export',
+    'pdf': 'Print Glossary Content'
+}
+
+
+def get_job(job_id):
+    '''Return a job if the current user may see it'''
+    job = Job.query.get_or_404(job_id)
+    if job.user_id and job.user_id != current_user.id and not current_user.has_role('admin'):
+        abort(404)
+    return job
+
+
+@jobs.route('/jobs/<int:job_id>')
+@login_required
+def show_job(job_id):
+    '''Present a page that follows a job until its file can be downloaded'''
+    job = get_job(job_id)
+    return render_template('jobs/show_job.html', job=job, title=TITLES.get(job.kind, 'Job'))
+
+
+@jobs.route('/jobs/<int:job_id>/status')
+@login_required
+def job_status(job_id):
+    '''Return the status and progress of a job as JSON'''
+    job = get_job(job_id)
+    if not job.done and not runner.live(job):
+        runner.abandon(job)
+        db.session.commit()
+    status = job.to_dict()
+    if job.status == FINISHED:
+        status['download'] = url_for('main.download', selected_filename=job.filename)
+    return jsonify(status)
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''
+Bulk loading of glossary data.
+
+The BulkLoader loads the same sections as load_yaml with the same rules for
+skipping records that already exist, but it looks names up in maps built once
+per load, writes rows and associations with executemany and commits once per
+batch rather than once per record.
+'''
+
+import logging
+from itertools import islice
+
+from sqlalchemy import select, and_, func
+
+from app import fragments, search
+from app.extensions import db
+from app.main.rendering import render_row
+from app.main.models import Term, TermStatus, Person, Category, Link, \
+    Rule, Note, \
+    Location, Table, Column, \
+    Document, DocumentType, bump_revision, record_reload, name_key, \
+    term_category_relationship, term_rule_relationship, term_column_relationship, \
+    term_document_relationship, document_types_relationship, term_to_term_relationship
+
+LOGGER = logging.getLogger("business-glossary.load_data")
+
+
+def batches(records, size):
+    '''Yield lists of up to size records'''
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def table_row(table, record):
+    '''
+    Return the insert parameters of a row from a record. Every column is given
+    a value so the rows of a batch can be inserted with one executemany, with
+    column defaults used for anything the record leaves out. Markdown is
+    rendered into its HTML column and names are keyed as the ORM would.
+    '''
+    row = {}
+    for column in table.columns:
+        if column.primary_key:
+            continue
+        if column.name in record:
+            row[column.name] = record[column.name]
+        elif column.default is not None and column.default.is_callable:
+            row[column.name] = column.default.arg(None)
+        elif column.default is not None:
+            row[column.name] = column.default.arg
+        else:
+            row[column.name] = None
+    if 'name_key' in row:
+        row['name_key'] = name_key(row['name'])
+    return render_row(table, row)
+
+
+class BulkLoader(object):
+    '''
+    Load glossary records in batches.
+
+    :param batch_size: The number of records written per transaction
+    '''
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.people = self.lookup(Person.name)
+        self.statuses = self.lookup(TermStatus.status)
+        self.categories = self.lookup(Category.name)
+        self.document_types = self.lookup(DocumentType.type)
+        self.locations = self.lookup(Location.name)
+        self.terms = self.lookup(Term.name)
+        self.rules = self.lookup(Rule.name)
+        self.tables = self.lookup(Table.name)
+        self.documents = self.lookup(Document.name)
+        self.links = set(text for text, in db.session.query(Link.text))
+
+    @staticmethod
+    def lookup(name_column):
+        '''Return a map of name to id for every row of a table'''
+        table = name_column.table
+        return dict((name, row_id) for row_id, name in
+                    db.session.execute(select([table.c.id, name_column])))
+
+    @staticmethod
+    def insert(table, rows):
+        '''Insert rows with a single executemany'''
+        if rows:
+            db.session.execute(table.insert(), rows)
+
+    @staticmethod
+    def refresh(lookup, name_column, names):
+        '''Add the ids of newly inserted rows to a name to id map'''
+        table = name_column.table
+        for name_batch in batches(names, 500):
+            statement = select([table.c.id, name_column]).where(name_column.in_(name_batch))
+            for row_id, name in db.session.execute(statement):
+                lookup[name] = row_id
+
+    def sections(self):
+        '''Return the loader of each section of a glossary file'''
+        return {
+            'person': self.add_people,
+            'term_status': self.add_term_statuses,
+            'document_type': self.add_document_types,
+            'location': self.add_locations,
+            'category': self.add_categories,
+            'terms': self.add_terms,
+            'rules': self.add_rules,
+            'tables': self.add_tables,
+            'columns': self.add_columns,
+            'documents': self.add_documents,
+            'links': self.add_links,
+            'related_terms': self.add_related_terms,
+            'notes': self.add_notes
+        }
+
+    def load_section(self, section, records):
+        '''Load the records of one section in batches, committing each batch'''
+        add = self.sections()[section]
+        count = 0
+        for batch in batches(records, self.batch_size):
+            add(batch)
+            db.session.commit()
+            count += len(batch)
+            LOGGER.info("Processed %s %s records", count, section)
+        return count
+
+    def finish(self):
+        '''Bring the search index, revision and fragment cache up to date
+        after rows were written in bulk'''
+        search.rebuild()
+        bump_revision(db.session.connection())
+        record_reload(db.session.connection())
+        db.session.commit()
+        fragments.clear()
+
+    def add_named(self, table, name_column, lookup, records, description):
+        '''Insert the records whose name is not already in the lookup'''
+        rows = []
+        for record in records:
+            name = record[name_column.name]
+            if name in lookup:
+                LOGGER.warning("%s %s already exists", description, name)
+                continue
+            lookup[name] = None
+            rows.append(table_row(table, record))
+        self.insert(table, rows)
+        self.refresh(lookup, name_column, [row[name_column.name] for row in rows])
+        return rows
+
+    def add_people(self, records):
+        self.add_named(Person.__table__, Person.name, self.people, records, "Person")
+
+    def add_term_statuses(self, records):
+        self.add_named(TermStatus.__table__, TermStatus.status, self.statuses, records,
+                       "Term status")
+
+    def add_document_types(self, records):
+        self.add_named(DocumentType.__table__, DocumentType.type, self.document_types, records,
+                       "Document type")
+
+    def add_locations(self, records):
+        self.add_named(Location.__table__, Location.name, self.locations, records, "Location")
+
+    def add_categories(self, records):
+        self.add_named(Category.__table__, Category.name, self.categories, records, "Category")
+
+    def missing(self, lookup, table, name_column, names, description, owner):
+        '''Create the named rows that do not exist yet, as the single loaders do'''
+        new = []
+        for name in names:
+            if name not in lookup and name not in new:
+                LOGGER.warning("Added non-existent %s %s to associate with %s",
+                               description, name, owner)
+                new.append(name)
+        self.insert(table, [{name_column.name: name} for name in new])
+        self.refresh(lookup, name_column, new)
+
+    def associate(self, association, left, right, pairs, description):
+        '''Insert association rows, warning about names that were not found'''
+        rows = []
+        for left_id, right_name, lookup, owner in pairs:
+            right_id = lookup.get(right_name)
+            if right_id is None:
+                LOGGER.warning("Could not find the %s %s to associate with %s",
+                               description, right_name, owner)
+                continue
+            rows.append({left: left_id, right: right_id})
+        self.insert(association, rows)
+
+    def add_terms(self, records):
+        new = []
+        for record in records:
+            if record['name'] in self.terms:
+                LOGGER.warning("Term %s already exists", record['name'])
+                continue
+            self.terms[record['name']] = None
+            new.append(record)
+
+        rows = []
+        for record in new:
+            row = table_row(Term.__table__, record)
+            row['status_id'] = self.statuses.get(record.get('status'))
+            row['owner_id'] = self.people.get(record.get('owner'))
+            row['steward_id'] = self.people.get(record.get('steward'))
+            rows.append(row)
+            self.missing(self.categories, Category.__table__, Category.name,
+                         record.get('categories') or [], "category", record['name'])
+        self.insert(Term.__table__, rows)
+        self.refresh(self.terms, Term.name, [record['name'] for record in new])
+
+        self.associate(term_category_relationship, 'term_id', 'category_id',
+                       [(self.terms[record['name']], category, self.categories, record['name'])
+                        for record in new for category in record.get('categories') or []],
+                       "category")
+
+    def add_rules(self, records):
+        new = []
+        for record in records:
+            if record['name'] in self.rules:
+                LOGGER.warning("Rule %s already exists", record['name'])
+                continue
+            self.rules[record['name']] = None
+            new.append(record)
+
+        self.insert(Rule.__table__, [table_row(Rule.__table__, record) for record in new])
+        self.refresh(self.rules, Rule.name, [record['name'] for record in new])
+
+        self.associate(term_rule_relationship, 'rule_id', 'term_id',
+                       [(self.rules[record['name']], term, self.terms, record['name'])
+                        for record in new for term in record.get('terms') or []],
+                       "term")
+
+    def add_tables(self, records):
+        rows = []
+        for record in records:
+            if record['name'] in self.tables:
+                LOGGER.warning("Table %s already exists", record['name'])
+                continue
+            self.tables[record['name']] = None
+            row = table_row(Table.__table__, record)
+            row['location_id'] = self.locations.get(record.get('location'))
+            rows.append(row)
+        self.insert(Table.__table__, rows)
+        self.refresh(self.tables, Table.name, [row['name'] for row in rows])
+
+    def add_columns(self, records):
+        table_ids = set(self.tables.get(record['table']) for record in records)
+        names = set(record['name'] for record in records)
+        existing = set(db.session.query(Column.table_id, Column.name).filter(
+            and_(Column.table_id.in_([table_id for table_id in table_ids if table_id]),
+                 Column.name.in_(names))))
+
+        new = []
+        for record in records:
+            key = (self.tables.get(record['table']), record['name'])
+            if key[0] is not None and key in existing:
+                LOGGER.warning("Column %s already exists in table %s",
+                               record['name'], record['table'])
+                continue
+            existing.add(key)
+            new.append(record)
+
+        if not new:
+            return
+        table = Column.__table__
+        rows = []
+        for record in new:
+            row = table_row(table, record)
+            row['table_id'] = self.tables.get(record.get('table'))
+            rows.append(row)
+
+        # Column names are only unique within a table, so the ids of the new
+        # columns are matched up by table and name above the highest id
+        # before the insert
+        high_water = db.session.execute(select([func.max(table.c.id)])).scalar() or 0
+        self.insert(table, rows)
+        inserted = {}
+        statement = select([table.c.id, table.c.table_id, table.c.name]) \
+            .where(table.c.id > high_water).order_by(table.c.id)
+        for row_id, table_id, name in db.session.execute(statement):
+            inserted.setdefault((table_id, name), []).append(row_id)
+
+        pairs = []
+        for record, row in zip(new, rows):
+            record_id = inserted[(row['table_id'], row['name'])].pop(0)
+            pairs.extend((record_id, term, self.terms, record['name'])
+                         for term in record.get('terms') or [])
+        self.associate(term_column_relationship, 'column_id', 'term_id', pairs, "term")
+
+    def add_documents(self, records):
+        new = []
+        for record in records:
+            if record['name'] in self.documents:
+                LOGGER.warning("Document %s already exists", record['name'])
+                continue
+            self.documents[record['name']] = None
+            new.append(record)
+            self.missing(self.document_types, DocumentType.__table__, DocumentType.type,
+                         record.get('types') or [], "type", record['name'])
+
+        self.insert(Document.__table__, [table_row(Document.__table__, record) for record in new])
+        self.refresh(self.documents, Document.name, [record['name'] for record in new])
+
+        self.associate(term_document_relationship, 'document_id', 'term_id',
+                       [(self.documents[record['name']], term, self.terms, record['name'])
+                        for record in new for term in record.get('terms') or []],
+                       "term")
+        self.associate(document_types_relationship, 'document_id', 'document_type_id',
+                       [(self.documents[record['name']], doc_type, self.document_types,
+                         record['name'])
+                        for record in new for doc_type in record.get('types') or []],
+                       "document type")
+
+    def add_links(self, records):
+        rows = []
+        for record in records:
+            if record['text'] in self.links:
+                LOGGER.warning("Link %s already exists", record['text'])
+                continue
+            self.links.add(record['text'])
+            row = table_row(Link.__table__, record)
+            row['term_id'] = self.terms.get(record.get('term'))
+            rows.append(row)
+        self.insert(Link.__table__, rows)
+
+    def add_related_terms(self, records):
+        pairs = set()
+        for record in records:
+            term_id = self.terms.get(record['term'])
+            if term_id is None:
+                LOGGER.warning("Could not find the term %s with which to associate related terms",
+                               record['term'])
+                continue
+            for name in record['related_terms']:
+                related_id = self.terms.get(name)
+                if related_id is None:
+                    LOGGER.warning("Could not find the related term %s", name)
+                    continue
+                pairs.add((term_id, related_id))
+                pairs.add((related_id, term_id))
+
+        if not pairs:
+            return
+        term_ids = set(term_id for term_id, _ in pairs)
+        statement = select([term_to_term_relationship.c.term_id,
+                            term_to_term_relationship.c.related_term_id]) \
+            .where(term_to_term_relationship.c.term_id.in_(term_ids))
+        existing = set(tuple(row) for row in db.session.execute(statement))
+        self.insert(term_to_term_relationship,
+                    [{'term_id': term_id, 'related_term_id': related_id}
+                     for term_id, related_id in sorted(pairs - existing)])
+
+    def add_notes(self, records):
+        rows = []
+        for record in records:
+            row = table_row(Note.__table__, record)
+            row['rule_id'] = self.rules.get(record.get('rule'))
+            rows.append(row)
+        self.insert(Note.__table__, rows)
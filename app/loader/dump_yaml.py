@@ -16,14 +16,30 @@
  
 '''Dump data to yaml'''
 
+import datetime
+import json
 import logging
+import re
 import textwrap
+from os.path import basename
+
 import yaml
 
+# Use the libyaml emitter when PyYAML was built with it
+try:
+    from yaml import CSafeDumper as Dumper
+except ImportError:
+    from yaml import SafeDumper as Dumper
+
+from yaml.nodes import ScalarNode, SequenceNode, MappingNode
+
+from sqlalchemy.orm import joinedload, subqueryload
+
+from app.extensions import db
 from app.main.models import Category, Term, Person, TermStatus, \
     Document, DocumentType, Rule, Note, \
     Location, Table, Column, \
-    Link
+    Link, Backup, Tombstone
 
 from app.config import BASE_DIR
 from flask import current_app as app
@@ -35,8 +51,25 @@ LOGGER = logging.getLogger("business-glossary.dump_data")
 class literal(str): pass
 
 def literal_representer(dumper, data):
-    return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='|')
+    return dumper.represent_scalar('tag:yaml.org,2002:str', str(data), style='|')
 yaml.add_representer(literal, literal_representer)
+yaml.add_representer(literal, literal_representer, Dumper=Dumper)
+
+# The number of rows read and written at a time
+PAGE_SIZE = 1000
+
+# How far before the previous backup an incremental backup starts, so changes
+# committed while it was being written are not missed. Restoring a change twice
+# leaves the same result.
+MARK_OVERLAP = datetime.timedelta(minutes=5)
+
+STR_TAG = 'tag:yaml.org,2002:str'
+NULL_TAG = 'tag:yaml.org,2002:null'
+MAP_TAG = 'tag:yaml.org,2002:map'
+SEQ_TAG = 'tag:yaml.org,2002:seq'
+
+# The whitespace other than spaces that textwrap replaces
+WRAP_WHITESPACE = re.compile(r'[\t\n\x0b\x0c\r]')
 
 
 def return_categories(term):
@@ -87,222 +120,315 @@ def return_related_terms(term):
     return terms
 
 
-def prep_terms():
-    '''Return terms as a dictionary'''
-    LOGGER.info("Dumping Term")
+def term_record(term):
+    '''Return a term as a dictionary'''
+    return {
+        "name": term.name,
+        "short_description": literal(prepare_string(term.short_description)),
+        "long_description": literal(prepare_string(term.long_description)),
+        "abbreviation": term.abbreviation,
+        "status": term.status.status if term.status else None,
+        "categories": return_categories(term),
+        "owner": term.owner.name if term.owner else None,
+        "steward": term.steward.name if term.steward else None,
+        "created_on": term.created_on,
+        "updated_on": term.updated_on
+    }
 
-    terms = Term.query.all()
-    my_terms = []
 
-    for term in terms:
-        my_term = {
-            "name": term.name,
-            "short_description": literal(prepare_string(term.short_description)),
-            "long_description": literal(prepare_string(term.long_description)),
-            "abbreviation": term.abbreviation,
-            "status": term.status.status,
-            "categories": return_categories(term),
-            "owner": term.owner.name,
-            "steward": term.steward.name,
-            "created_on": term.created_on,
-            "updated_on": term.updated_on
-        }
-        my_terms.append(my_term)
-    return my_terms
+def note_record(note):
+    '''Return a rule note as a dictionary'''
+    return {
+        "note": literal(prepare_string(note.note)),
+        "note_type": note.note_type,
+        "rule": note.rule.name if note.rule else None,
+        "created_on": note.created_on,
+        "updated_on": note.updated_on
+    }
 
 
-def prepare_rule_notes():
-    '''Returns rule notes as a dictionary'''
-    LOGGER.info("Dumping Rule Notes")
+def rule_record(rule):
+    '''Return a rule as a dictionary'''
+    return {
+        "identifier": rule.identifier,
+        "name": rule.name,
+        "description": literal(prepare_string(rule.description)),
+        "notes": literal(prepare_string(rule.notes)),
+        "created_on": rule.created_on,
+        "updated_on": rule.updated_on,
+        "terms": return_terms(rule)
+    }
 
-    notes = Note.query.all()
-    my_notes = []
 
-    for note in notes:
-        # print("note_type: %s" % note.note_type)
-        my_note = {
-            "note": literal(prepare_string(note.note)),
-            "note_type": note.note_type,
-            "rule": note.rules.name,
-            "created_on": note.created_on,
-            "updated_on": note.updated_on
-        }
-        my_notes.append(my_note)
-    return my_notes
+def person_record(person):
+    '''Return a person as a dictionary'''
+    return {
+        "name": person.name,
+    }
 
 
-def prep_rules():
-    '''Return rules as a dictionary'''
-    LOGGER.info("Dumping Rule")
+def category_record(category):
+    '''Return a category as a dictionary'''
+    return {
+        "name": category.name,
+        "description": category.description
+    }
 
-    rules = Rule.query.all()
-    my_rules = []
 
-    for rule in rules:
-        my_rule = {
-            "identifier": rule.identifier,
-            "name": rule.name,
-            "description": literal(prepare_string(rule.description)),
-            "notes": literal(prepare_string(rule.notes)),
-            "created_on": rule.created_on,
-            "updated_on": rule.updated_on,
-            "terms": return_terms(rule)
-        }
-        my_rules.append(my_rule)
-    return my_rules
-
-
-def prep_person():
-    '''Return people as a dictionary'''
-    LOGGER.info("Dumping Person")
-    people = Person.query.all()
-    my_people = []
-    for person in people:
-        this_person = {
-            "name": person.name,
-        }
-        my_people.append(this_person)
-    return my_people
-
-
-def prep_category():
-    '''Return category as a dictionary'''
-    LOGGER.info("Dumping Category")
-    categories = Category.query.all()
-    my_category = []
-    for category in categories:
-        this_category = {
-            "name": category.name,
-            "description": category.description
-        }
-        my_category.append(this_category)
-    return my_category
-
-
-def prep_term_status():
-    '''Return term status as a dictionary'''
-    LOGGER.info("Dumping TermStatus")
-    status = TermStatus.query.all()
-    my_status = []
-    for term_status in status:
-        this_status = {
-            "status": term_status.status,
-        }
-        my_status.append(this_status)
-    return my_status
-
-
-def prep_location():
-    '''Return location as a dictionary'''
-    LOGGER.info("Dumping Location")
-    locations = Location.query.all()
-    my_locations = []
-    for location in locations:
-        this_location = {
-            "name": location.name,
-            "host": location.host,
-            "description": location.description,
-            "path": location.path,
-            "notes": location.notes,
-        }
-        my_locations.append(this_location)
-    return my_locations
-
-
-def prep_tables():
-    '''Return tables as a dictionary for dumping'''
-    LOGGER.info("Dumping tables")
-    tables = Table.query.all()
-    my_tables = []
-    for table in tables:
-        this_table = {
-            "name": table.name,
-            "description": table.description,
-            "location": table.location.name
-        }
-        new_table = dict((k, v) for k, v in this_table.items() if v)
-        my_tables.append(new_table)
-    return my_tables
-
-
-def prep_columns():
-    '''Return columns as a dictionary for dumping'''
-    LOGGER.info("Dumping Columns")
-    columns = Column.query.all()
-    my_columns = []
-    for column in columns:
-        this_column = {
-            "name": column.name,
-            "description": column.description,
-            "type": column.type,
-            "length": column.length,
-            "format": column.format,
-            "table": column.table.name,
-            "terms": return_column_terms(column)
-        }
-        new_column = dict((k, v) for k, v in this_column.items() if v)
-        my_columns.append(new_column)
-    return my_columns
-
-
-def prep_document_type():
-    '''Return document types as a dictionary'''
-    LOGGER.info("Dumping DocumentType")
-    types = DocumentType.query.all()
-    my_types = []
-    for doc_type in types:
-        my_type = {
-            "type": doc_type.type,
-        }
-        my_types.append(my_type)
-    return my_types
-
-
-def prep_documents():
-    '''Return documents as a dictionary'''
-    LOGGER.info("Dumping Documents")
-    documents = Document.query.all()
-    my_documents = []
-    for document in documents:
-        my_document = {
-            "name": document.name,
-            "path": document.path,
-            "description": document.description,
-            "types": return_document_types(document),
-            "terms": return_document_terms(document)
-        }
-        new_doc = dict((k, v) for k, v in my_document.items() if v)
-        my_documents.append(new_doc)
-    return my_documents
-
-
-def prep_links():
-    '''Return links as a dictionary'''
-    LOGGER.info("Dumping Links")
-    links = Link.query.all()
-    my_links = []
-    for link in links:
-        my_link = {
-            "text": link.text,
-            "address": link.address,
-            "term": link.term.name
-        }
-        my_links.append(my_link)
-    return my_links
+def term_status_record(term_status):
+    '''Return a term status as a dictionary'''
+    return {
+        "status": term_status.status,
+    }
 
 
-def prep_related_terms():
-    '''Return related terms as a dictionary'''
-    LOGGER.info("Dumping Related Terms")
-    terms = Term.query.filter(Term.related_terms != None).all()
-    my_terms = []
-    for term in terms:
-        my_term = {
-            "term": term.name,
-            "related_terms": return_related_terms(term)
-        }
-        my_terms.append(my_term)
-    return my_terms
+def location_record(location):
+    '''Return a location as a dictionary'''
+    return {
+        "name": location.name,
+        "host": location.host,
+        "description": location.description,
+        "path": location.path,
+        "notes": location.notes,
+    }
+
+
+def table_record(table):
+    '''Return a table as a dictionary, leaving out empty values'''
+    this_table = {
+        "name": table.name,
+        "description": table.description,
+        "location": table.location.name if table.location else None
+    }
+    return dict((k, v) for k, v in this_table.items() if v)
+
+
+def column_record(column):
+    '''Return a column as a dictionary, leaving out empty values'''
+    this_column = {
+        "name": column.name,
+        "description": column.description,
+        "type": column.type,
+        "length": column.length,
+        "format": column.format,
+        "table": column.table.name if column.table else None,
+        "terms": return_column_terms(column)
+    }
+    return dict((k, v) for k, v in this_column.items() if v)
+
+
+def document_type_record(doc_type):
+    '''Return a document type as a dictionary'''
+    return {
+        "type": doc_type.type,
+    }
+
+
+def document_record(document):
+    '''Return a document as a dictionary, leaving out empty values'''
+    my_document = {
+        "name": document.name,
+        "path": document.path,
+        "description": document.description,
+        "types": return_document_types(document),
+        "terms": return_document_terms(document)
+    }
+    return dict((k, v) for k, v in my_document.items() if v)
+
+
+def link_record(link):
+    '''Return a link as a dictionary'''
+    return {
+        "text": link.text,
+        "address": link.address,
+        "term": link.term.name if link.term else None
+    }
+
+
+def related_terms_record(term):
+    '''Return the related terms of a term as a dictionary'''
+    return {
+        "term": term.name,
+        "related_terms": return_related_terms(term)
+    }
+
+
+def tombstone_record(tombstone):
+    '''Return a deleted row as a dictionary of its section and key'''
+    return {
+        "section": tombstone.section,
+        "key": json.loads(tombstone.key)
+    }
+
+
+def sections(since=None):
+    '''
+    Return the sections of a backup in the order they are written. Each is a
+    tuple of the heading written before the section (if any), the section
+    name, the query of its rows with the relationships each record uses
+    loaded eagerly, the function making a record from a row and the comment
+    written when the section is empty (if any).
+
+    :param since: Return only the rows changed after this time, and the rows
+                  deleted after it first, for an incremental backup
+    '''
+    if since is None:
+        related_terms = Term.query.filter(Term.related_terms != None)
+    else:
+        # A term whose relations were all removed is restored with none
+        related_terms = Term.query
+
+    all_sections = [
+        ("# People, Categories, Document Types and Status\n\n", "category",
+         Category.query, category_record, None),
+        (None, "document_type", DocumentType.query, document_type_record, None),
+        (None, "location", Location.query, location_record, None),
+        (None, "person", Person.query, person_record, None),
+        (None, "term_status", TermStatus.query, term_status_record, None),
+        ("\n# Terms\n\n", "terms",
+         Term.query.options(joinedload(Term.status), joinedload(Term.owner),
+                            joinedload(Term.steward), subqueryload(Term.categories)),
+         term_record, None),
+        ("\n# Rules\n\n", "rules",
+         Rule.query.options(subqueryload(Rule.terms)), rule_record, None),
+        ("\n# Rule Notes\n\n", "notes",
+         Note.query.options(joinedload(Note.rule)), note_record, None),
+        ("\n# Tables and Columns\n\n", "tables",
+         Table.query.options(joinedload(Table.location)), table_record, None),
+        (None, "columns",
+         Column.query.options(joinedload(Column.table), subqueryload(Column.terms)),
+         column_record, None),
+        ("\n# Documents\n\n", "documents",
+         Document.query.options(subqueryload(Document.types), subqueryload(Document.terms)),
+         document_record, "# No documents\n"),
+        ("\n# Links\n\n", "links",
+         Link.query.options(joinedload(Link.term)), link_record, "# No links\n"),
+        ("\n# Related Terms\n\n", "related_terms",
+         related_terms.options(subqueryload(Term.related_terms)),
+         related_terms_record, "# No related terms\n")
+    ]
+    if since is None:
+        return all_sections
+
+    changed = [(heading, name, changed_since(query, since), make_record, empty_comment)
+               for heading, name, query, make_record, empty_comment in all_sections]
+    deleted = ("# Deleted since %s\n\n" % since, "deleted",
+               Tombstone.query.filter(Tombstone.deleted_on > since),
+               tombstone_record, "# No deletions\n")
+    return [deleted] + changed
+
+
+def changed_since(query, since):
+    '''Restrict a query of a model to the rows changed after a time'''
+    model = query.column_descriptions[0]['entity']
+    return query.filter(model.updated_on > since)
+
+
+def last_backup_mark():
+    '''
+    Return the time an incremental backup should start from, a little before
+    the most recent backup, or None if there has not been one
+    '''
+    until = db.session.query(db.func.max(Backup.until)).scalar()
+    return until - MARK_OVERLAP if until is not None else None
+
+
+def record_backup(file_name, since, until):
+    '''
+    Record the high-water mark of a backup and remove the tombstones that no
+    later incremental backup will include
+    '''
+    db.session.add(Backup(filename=basename(file_name), since=since, until=until))
+    Tombstone.query.filter(Tombstone.deleted_on < until - MARK_OVERLAP) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+
+
+def iter_pages(query, page_size=PAGE_SIZE):
+    '''
+    Yield the rows of a query a page at a time in id order.
+
+    Each page is its own query so the eager loads of a page cover just that
+    page, and pages start after the last id read rather than at an offset so
+    every page is as quick to read as the first. Rows of earlier pages are
+    not referenced once they have been written and are released from the
+    session.
+    '''
+    model = query.column_descriptions[0]['entity']
+    last_id = None
+    while True:
+        page_query = query
+        if last_id is not None:
+            page_query = page_query.filter(model.id > last_id)
+        page = page_query.order_by(model.id).limit(page_size).all()
+        if not page:
+            return
+        yield page
+        last_id = page[-1].id
+
+
+def represent(dumper, data):
+    '''
+    Return the YAML node of a record. Records are built from dicts, lists,
+    strings and None, so their nodes are made directly rather than through
+    the general representer, which spends most of its time looking up the
+    representer of each value and tracking aliases. The output is the same.
+    '''
+    data_type = type(data)
+    if data_type is str:
+        return ScalarNode(STR_TAG, data)
+    if data_type is literal:
+        return ScalarNode(STR_TAG, str(data), style='|')
+    if data is None:
+        return ScalarNode(NULL_TAG, 'null')
+    if data_type is dict:
+        return MappingNode(MAP_TAG, [(ScalarNode(STR_TAG, key), represent(dumper, value))
+                                     for key, value in sorted(data.items())],
+                           flow_style=False)
+    if data_type is list:
+        return SequenceNode(SEQ_TAG, [represent(dumper, value) for value in data],
+                            flow_style=False)
+    return dumper.represent_data(data)
+
+
+def write_records(outfile, records):
+    '''Write a list of records as a YAML sequence'''
+    dumper = Dumper(outfile, default_flow_style=False, allow_unicode=True)
+    try:
+        dumper.open()
+        dumper.serialize(represent(dumper, records))
+        dumper.close()
+    finally:
+        dumper.dispose()
+
+
+def write_section(outfile, name, pages, make_record, empty_comment):
+    '''Write the records of a section a page at a time'''
+    LOGGER.info("Dumping %s", name)
+    count = 0
+    for page in pages:
+        records = [make_record(row) for row in page]
+        if not count:
+            outfile.write("%s:\n" % name)
+        write_records(outfile, records)
+        count += len(records)
+
+    if not count:
+        outfile.write(empty_comment or "%s: []\n" % name)
+    LOGGER.info("Dumped %s %s", count, name)
+    return count
+
+
+def fill(line, width=100):
+    '''
+    Wrap a line as textwrap.fill does, without the work of splitting it into
+    words when it already fits
+    '''
+    if len(line) <= width and not WRAP_WHITESPACE.search(line):
+        stripped = line.rstrip(' ')
+        if not stripped or not stripped[-1].isspace():
+            return stripped
+    return textwrap.fill(line, width)
 
 
 def prepare_string(data):
@@ -313,12 +439,12 @@ def prepare_string(data):
             # it back together
             new_lines = []
             for line in data.splitlines():
-                wrap = textwrap.fill(line, 100)
+                wrap = fill(line, 100)
                 new_lines.append(wrap)
 
             new_string = "\n".join(new_lines)
         else:
-            new_string = textwrap.fill(data, 100)
+            new_string = fill(data, 100)
     else:
         new_string = ""
     return new_string
@@ -414,78 +540,43 @@ def dump_termx(term, file_name):
         print(yaml.dump(my_term))
 
 
-def dump(file_name):
-    '''Start the dumping process'''
+def dump(file_name, page_size=PAGE_SIZE, progress=None, since=None):
+    '''
+    Start the dumping process
+
+    Each section is read a page at a time and written as it is read, so the
+    memory used does not grow with the size of the glossary. The time the dump
+    started is recorded as the mark the next incremental backup starts from.
+
+    :param file_name: The YAML file to write
+    :param page_size: The number of rows read and written at a time
+    :param progress: Called with the percentage done and a message after
+                     each section is written
+    :param since: Write only what changed after this time, with a section of
+                  the rows deleted after it, rather than the whole glossary
+    '''
     log_format = "%(asctime)-15s [%(levelname)s] %(message)s"
     logging.basicConfig(level=logging.INFO, format=log_format)
 
     LOGGER.info("Dump process started")
-    
-    app.config['SQLALCHEMY_ECHO'] = False
-
-    file_contents_1 = {
-        "person": prep_person(),
-        "category": prep_category(),
-        "document_type": prep_document_type(),
-        "term_status": prep_term_status(),
-        "location": prep_location()
-    }   
-
-    file_contents_2 = {
-        "terms": prep_terms()
-    }
-
-    file_contents_3 = {
-        "rules": prep_rules()
-    }
-
-    file_contents_4 = {
-        "notes": prepare_rule_notes()
-    }
 
-    file_contents_5 = {
-        "columns": prep_columns(),
-        "tables": prep_tables()
-    }
-
-    file_contents_6 = {
-        "documents": prep_documents()
-    }
-
-    file_contents_7 = {
-        "links": prep_links()
-    }
-
-    file_contents_8 = {
-        "related_terms": prep_related_terms()
-    }
+    app.config['SQLALCHEMY_ECHO'] = False
 
+    until = datetime.datetime.utcnow()
+    all_sections = sections(since)
     with open(file_name, 'w') as outfile:
-        outfile.write("# People, Categories, Document Types and Status\n\n")
-        yaml.dump(file_contents_1, outfile, default_flow_style=False, allow_unicode=True)
-        outfile.write("\n# Terms\n\n")
-        yaml.dump(file_contents_2, outfile, default_flow_style=False, allow_unicode=True)
-        outfile.write("\n# Rules\n\n")
-        yaml.dump(file_contents_3, outfile, default_flow_style=False, allow_unicode=True)
-        outfile.write("\n# Rule Notes\n\n")
-        yaml.dump(file_contents_4, outfile, default_flow_style=False, allow_unicode=True)
-        outfile.write("\n# Tables and Columns\n\n")
-        yaml.dump(file_contents_5, outfile, default_flow_style=False, allow_unicode=True)
-        outfile.write("\n# Documents\n\n")
-        if len(file_contents_6['documents']) == 0:
-            outfile.write("# No documents\n")
-        else:
-            yaml.dump(file_contents_6, outfile, default_flow_style=False, allow_unicode=True)
-        outfile.write("\n# Links\n\n")
-        if len(file_contents_7['links']) == 0:
-            outfile.write("# No links\n")
-        else:
-            yaml.dump(file_contents_7, outfile, default_flow_style=False, allow_unicode=True)
-        outfile.write("\n# Related Terms\n\n")
-        if len(file_contents_8['related_terms']) == 0:
-            outfile.write("# No related terms\n")
-        else:
-            yaml.dump(file_contents_8, outfile, default_flow_style=False, allow_unicode=True)
+        if since is not None:
+            outfile.write("# Changes from %s to %s\n\n" % (since, until))
+        for done, (heading, name, query, make_record, empty_comment) in \
+                enumerate(all_sections, 1):
+            if heading:
+                outfile.write(heading)
+            count = write_section(outfile, name, iter_pages(query, page_size),
+                                  make_record, empty_comment)
+            if progress:
+                progress(done * 100 // len(all_sections), "Dumped %s %s" % (count, name))
+
+    record_backup(file_name, since, until)
 
     LOGGER.info("File %s created", file_name)
     LOGGER.info("Dump process ended")
@@ -14,31 +14,71 @@
 #   License for the specific language governing permissions and limitations
 #   under the License.
  
-import logging
+'''
+Export the term to column associations to CSV.
+
+The associations are read with a single join, a batch of rows at a time, and
+written as they are read so the memory used does not grow with the number of
+associations.
+'''
+
 import csv
+import io
+import logging
 
 from flask import current_app
 
+from app.extensions import db
+from app.main.models import Term, Location, Table, Column, term_column_relationship
+
 LOGGER = logging.getLogger("business-glossary.export_data")
 
-from app.main.models import Term
+# The columns of the export
+FIELDS = ['term', 'table', 'column']
+
 
-def get_column_associations():
-    terms = Term.query.all()
+def get_column_associations(batch_size=1000):
+    '''
+    Yield the term, qualified table name and column of every term to column
+    association, ordered by term
 
-    rows = []
+    :param batch_size: The number of rows fetched from the database at a time
+    '''
+    tcr = term_column_relationship
+    query = db.session.query(Term.name, Location.name, Table.name, Column.name) \
+        .select_from(tcr) \
+        .join(Term, Term.id == tcr.c.term_id) \
+        .join(Column, Column.id == tcr.c.column_id) \
+        .outerjoin(Table, Table.id == Column.table_id) \
+        .outerjoin(Location, Location.id == Table.location_id) \
+        .order_by(Term.name, Term.id, Column.id) \
+        .yield_per(batch_size)
 
-    for term in terms:
-        if term.columns:
-            for column in term.columns:
-                rows.append(
-                    {
-                        'term': term.name,
-                        'table': column.table.location.name + '.' + column.table.name,
-                        'column': column.name
-                    }
-                )
-    return rows
+    for term, location, table, column in query:
+        yield {
+            'term': term,
+            'table': '.'.join(name for name in (location, table) if name is not None),
+            'column': column
+        }
+
+
+def csv_chunks(rows, batch_size=1000):
+    '''
+    Yield the CSV text of a header and the rows, a batch of rows at a time
+
+    :param rows: An iterable of dicts keyed by FIELDS
+    :param batch_size: The number of rows in each chunk
+    '''
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, FIELDS)
+    writer.writeheader()
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
 
 
 def export(file_name):
@@ -50,11 +90,8 @@ def export(file_name):
 
     current_app.config['SQLALCHEMY_ECHO'] = False
 
-    rows = get_column_associations()
-    keys = rows[0].keys()
-
-    print(rows)
     with open(file_name, 'w', newline='') as output_file:
-        dict_writer = csv.DictWriter(output_file, keys)
-        dict_writer.writeheader()
-        dict_writer.writerows(rows)
\ No newline at end of file
+        for chunk in csv_chunks(get_column_associations()):
+            output_file.write(chunk)
+
+    LOGGER.info("Exported column associations to %s", file_name)
@@ -0,0 +1,554 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''
+Load the CSV interface files of the glossary.
+
+Each file is read a chunk of rows at a time. A chunk is written to a temporary
+staging table and the names it refers to are resolved to ids with one query
+joining the staging table to the tables they name, which also leaves out the
+rows that already exist. The new rows are then inserted with executemany and
+the chunk committed, so the number of statements run does not depend on the
+number of rows in a chunk.
+
+In sync mode locations, tables, columns and terms that exist are compared
+with the file as they are resolved, and only those that differ are updated,
+so loading a file that has not changed writes nothing.
+'''
+
+import csv
+import datetime
+import logging
+from os.path import join, isfile
+
+import sqlalchemy
+from flask import current_app as app
+from sqlalchemy import select, and_, exists, func, bindparam, MetaData, Integer, Text
+from sqlalchemy.orm import aliased
+
+from app import fragments, search
+from app.extensions import db
+from app.main.assignments import chunks
+from app.loader.bulk_load import batches, table_row
+from app.main.rendering import render_row
+from app.main.models import Term, TermStatus, Person, Category, Link, Rule, \
+    Location, Table, Column, DocumentType, bump_revision, record_reload, name_key, \
+    term_category_relationship, term_rule_relationship, term_column_relationship
+
+LOGGER = logging.getLogger("business-glossary.load_data")
+
+# The number of CSV rows staged and committed at a time
+CHUNK_SIZE = 10000
+
+# The most unresolved names listed when warning about them
+WARN_NAMES = 5
+
+
+def staging_table(fields):
+    '''Return a temporary table with a text column for each field of a file'''
+    return sqlalchemy.Table('csv_staging', MetaData(),
+                            sqlalchemy.Column('line', Integer, primary_key=True),
+                            *[sqlalchemy.Column(field, Text) for field in fields],
+                            prefixes=['TEMPORARY'])
+
+
+def stage(connection, fields, records, first_line):
+    '''Create the staging table and insert a chunk of records into it'''
+    staging = staging_table(fields)
+    staging.create(connection)
+    connection.execute(staging.insert(),
+                       [dict([('line', line)] + [(field, record.get(field)) for field in fields])
+                        for line, record in enumerate(records, first_line)])
+    return staging
+
+
+def insert(connection, table, rows):
+    '''Insert rows with a single executemany'''
+    if rows:
+        connection.execute(table.insert(), rows)
+    return len(rows)
+
+
+def warn_unresolved(description, names):
+    '''Warn about the names a chunk refers to that could not be found'''
+    names = sorted(set(name for name in names if name))
+    if names:
+        LOGGER.warning("Could not find %s %s %s", len(names), description,
+                       ', '.join(names[:WARN_NAMES]) + (' ...' if len(names) > WARN_NAMES else ''))
+
+
+def touch(connection, table, ids):
+    '''Move on the updated_on of the rows given associations without the ORM'''
+    now = datetime.datetime.utcnow()
+    ids = sorted(ids)
+    for chunk in chunks(ids):
+        connection.execute(table.update().where(table.c.id.in_(chunk)).values(updated_on=now))
+
+
+def new_rows(table, results, key, record):
+    '''
+    Return the insert parameters of the staged rows resolved by a query,
+    leaving out rows with the same key as one before them
+
+    :param table: The table the rows are inserted into
+    :param results: The rows resolved from the staging table
+    :param key: Returns the key of a resolved row
+    :param record: Returns the record of a resolved row
+    '''
+    seen = set()
+    rows = []
+    for result in results:
+        if key(result) in seen:
+            continue
+        seen.add(key(result))
+        rows.append(table_row(table, record(result)))
+    return rows
+
+
+def named(model, fields):
+    '''
+    Return the loader of a file of rows named by a single column
+
+    :param model: The model of the rows
+    :param fields: Pairs of the field in the file and the column it is
+                   loaded into, the first being the name
+    '''
+    table = model.__table__
+    name_field, name_column = fields[0]
+
+    def load(connection, staging):
+        query = select([staging.c[field] for field, _ in fields]) \
+            .where(and_(staging.c[name_field] != None,
+                        ~exists().where(table.c[name_column] == staging.c[name_field]))) \
+            .order_by(staging.c.line)
+        return insert(connection, table,
+                      new_rows(table, connection.execute(query), lambda row: row[name_field],
+                               lambda row: dict((column, row[field]) for field, column in fields)))
+    return load
+
+
+def load_terms(connection, staging):
+    '''Insert the terms that do not exist, with their status, owner and steward'''
+    owner = aliased(Person.__table__)
+    steward = aliased(Person.__table__)
+    query = select([staging, TermStatus.id.label('status_id'),
+                    owner.c.id.label('owner_id'), steward.c.id.label('steward_id')]) \
+        .select_from(staging
+                     .outerjoin(TermStatus.__table__, TermStatus.status == staging.c.status)
+                     .outerjoin(owner, owner.c.name == staging.c.owner)
+                     .outerjoin(steward, steward.c.name == staging.c.steward)) \
+        .where(and_(staging.c.name != None,
+                    ~exists().where(Term.name_key == func.lower(staging.c.name)))) \
+        .order_by(staging.c.line)
+    results = connection.execute(query).fetchall()
+
+    warn_unresolved("term statuses", [row.status for row in results if row.status_id is None])
+    warn_unresolved("people", [row.owner for row in results if row.owner_id is None] +
+                    [row.steward for row in results if row.steward_id is None])
+    fields = ('name', 'short_description', 'long_description', 'abbreviation',
+              'status_id', 'owner_id', 'steward_id')
+    return insert(connection, Term.__table__,
+                  new_rows(Term.__table__, results, lambda row: row.name.lower(),
+                           lambda row: dict((field, row[field]) for field in fields)))
+
+
+def associate(connection, association, results, left, right, description):
+    '''
+    Insert the association rows resolved from the staging table, warning about
+    those whose names could not be found, and return the ids on each side
+
+    :param association: The association table
+    :param results: Rows of the left id, right id and the names of each
+    :param left: The column of the association holding the left id
+    :param right: The column of the association holding the right id
+    :param description: The descriptions of the left and right names
+    '''
+    results = results.fetchall()
+    warn_unresolved(description[0], [row[2] for row in results if row[0] is None])
+    warn_unresolved(description[1], [row[3] for row in results if row[1] is None])
+    seen = set()
+    pairs = []
+    for row in results:
+        pair = (row[0], row[1])
+        if None not in pair and pair not in seen:
+            seen.add(pair)
+            pairs.append(pair)
+    insert(connection, association, [{left: left_id, right: right_id} for left_id, right_id in pairs])
+    return pairs
+
+
+def term_key(staging, field):
+    '''Return the condition matching a staged term name to a term'''
+    return Term.name_key == func.lower(staging.c[field])
+
+
+def load_term_categories(connection, staging):
+    '''Associate terms with categories'''
+    tcr = term_category_relationship
+    query = select([Term.id, Category.id, staging.c.term, staging.c.category]) \
+        .select_from(staging
+                     .outerjoin(Term.__table__, term_key(staging, 'term'))
+                     .outerjoin(Category.__table__, Category.name == staging.c.category)) \
+        .where(~exists().where(and_(tcr.c.term_id == Term.id, tcr.c.category_id == Category.id))) \
+        .order_by(staging.c.line)
+    pairs = associate(connection, tcr, connection.execute(query), 'term_id', 'category_id',
+                      ("terms", "categories"))
+    touch(connection, Term.__table__, set(term_id for term_id, _ in pairs))
+    return len(pairs)
+
+
+def load_links(connection, staging):
+    '''Insert the links that do not exist, each with the term it belongs to'''
+    query = select([staging, Term.id.label('term_id')]) \
+        .select_from(staging.outerjoin(Term.__table__, term_key(staging, 'term'))) \
+        .where(and_(staging.c.text != None, ~exists().where(Link.text == staging.c.text))) \
+        .order_by(staging.c.line)
+    results = connection.execute(query).fetchall()
+    warn_unresolved("terms", [row.term for row in results if row.term_id is None])
+    return insert(connection, Link.__table__,
+                  new_rows(Link.__table__, results, lambda row: row.text,
+                           lambda row: {'text': row.text, 'address': row.address,
+                                        'term_id': row.term_id}))
+
+
+def load_rules(connection, staging):
+    '''Insert the rules that do not exist and associate them with their terms'''
+    query = select([staging]) \
+        .where(and_(staging.c.name != None,
+                    ~exists().where(Rule.name_key == func.lower(staging.c.name)))) \
+        .order_by(staging.c.line)
+    count = insert(connection, Rule.__table__,
+                   new_rows(Rule.__table__, connection.execute(query),
+                            lambda row: row.name.lower(),
+                            lambda row: {'identifier': row.identifier, 'name': row.name,
+                                         'description': row.description,
+                                         'notes': (row.notes or '').replace('\\n', '\n')
+                                                                   .replace('\\r', '\r')}))
+
+    trr = term_rule_relationship
+    query = select([Rule.id, Term.id, staging.c.name, staging.c.term]) \
+        .select_from(staging
+                     .join(Rule.__table__, Rule.name_key == func.lower(staging.c.name))
+                     .outerjoin(Term.__table__, term_key(staging, 'term'))) \
+        .where(and_(staging.c.term != None,
+                    ~exists().where(and_(trr.c.rule_id == Rule.id, trr.c.term_id == Term.id)))) \
+        .order_by(staging.c.line)
+    pairs = associate(connection, trr, connection.execute(query), 'rule_id', 'term_id',
+                      ("rules", "terms"))
+    touch(connection, Term.__table__, set(term_id for _, term_id in pairs))
+    return count
+
+
+def load_tables(connection, staging):
+    '''Insert the tables that do not exist, each in its location'''
+    query = select([staging, Location.id.label('location_id')]) \
+        .select_from(staging.outerjoin(Location.__table__, Location.name == staging.c.location)) \
+        .where(and_(staging.c.table != None, ~exists().where(Table.name == staging.c.table))) \
+        .order_by(staging.c.line)
+    results = connection.execute(query).fetchall()
+    warn_unresolved("locations", [row.location for row in results if row.location_id is None])
+    return insert(connection, Table.__table__,
+                  new_rows(Table.__table__, results, lambda row: row.table,
+                           lambda row: {'name': row.table, 'description': row.description,
+                                        'location_id': row.location_id}))
+
+
+def load_columns(connection, staging):
+    '''Insert the columns that do not exist in their tables'''
+    query = select([staging, Table.id.label('table_id')]) \
+        .select_from(staging.outerjoin(Table.__table__, Table.name == staging.c.table)) \
+        .where(and_(staging.c.name != None,
+                    ~exists().where(and_(Column.table_id == Table.id,
+                                         Column.name == staging.c.name)))) \
+        .order_by(staging.c.line)
+    results = connection.execute(query).fetchall()
+
+    # A column is only known by its table, so columns of unknown tables are skipped
+    warn_unresolved("tables", [row.table for row in results if row.table_id is None])
+    fields = ('name', 'description', 'type', 'length', 'format', 'table_id')
+    return insert(connection, Column.__table__,
+                  new_rows(Column.__table__, [row for row in results if row.table_id is not None],
+                           lambda row: (row.table_id, row.name),
+                           lambda row: dict((field, row[field]) for field in fields)))
+
+
+def load_column_terms(connection, staging):
+    '''Associate columns, named by their table and name, with terms'''
+    tcr = term_column_relationship
+    query = select([Column.id, Term.id,
+                    (func.coalesce(staging.c.table, '') + '.' +
+                     func.coalesce(staging.c.name, '')).label('column'),
+                    staging.c.term]) \
+        .select_from(staging
+                     .outerjoin(Table.__table__, Table.name == staging.c.table)
+                     .outerjoin(Column.__table__, and_(Column.table_id == Table.id,
+                                                       Column.name == staging.c.name))
+                     .outerjoin(Term.__table__, term_key(staging, 'term'))) \
+        .where(~exists().where(and_(tcr.c.column_id == Column.id, tcr.c.term_id == Term.id))) \
+        .order_by(staging.c.line)
+    pairs = associate(connection, tcr, connection.execute(query), 'column_id', 'term_id',
+                      ("columns", "terms"))
+    touch(connection, Column.__table__, set(column_id for column_id, _ in pairs))
+    touch(connection, Term.__table__, set(term_id for _, term_id in pairs))
+    return len(pairs)
+
+
+def current(table, columns):
+    '''Return the id and the values of some columns of the row a staged row matches'''
+    return [table.c.id.label('existing_id')] + \
+        [table.c[column].label('current_' + column) for column in columns]
+
+
+def resolved(row, column, name_field):
+    '''
+    Return the id a name in a staged row resolved to. Where a name is given
+    that could not be found, the id the row it matches already refers to is
+    kept rather than cleared.
+
+    :param row: The row resolved from the staging table, with the columns
+                selected by current
+    :param column: The label of the resolved id
+    :param name_field: The field holding the name
+    '''
+    if row[column] is None and row[name_field]:
+        return row['current_' + column]
+    return row[column]
+
+
+def sync_rows(connection, table, results, key, record, description):
+    '''
+    Insert the resolved rows that are new and update those that differ from
+    the row they match, and return the number of rows written
+
+    :param table: The table the rows are written to
+    :param results: The rows resolved from the staging table, with the
+                    columns selected by current
+    :param key: Returns the key of a resolved row
+    :param record: Returns the values of the columns compared of a resolved row
+    :param description: How the rows are described when logging
+    '''
+    now = datetime.datetime.utcnow()
+    seen = set()
+    new = []
+    changed = []
+    for result in results:
+        if key(result) in seen:
+            continue
+        seen.add(key(result))
+        values = record(result)
+        if result.existing_id is None:
+            new.append(table_row(table, values))
+        elif any(values[column] != result['current_' + column] for column in values):
+            values['row_id'] = result.existing_id
+            values['updated_on'] = now
+            if 'name_key' in table.c and 'name' in values:
+                values['name_key'] = name_key(values['name'])
+            changed.append(render_row(table, values))
+
+    insert(connection, table, new)
+    if changed:
+        connection.execute(table.update().where(table.c.id == bindparam('row_id')), changed)
+    if new or changed:
+        LOGGER.info("Added %s and updated %s %s", len(new), len(changed), description)
+    return len(new) + len(changed)
+
+
+def sync_locations(connection, staging):
+    '''Insert the locations that are new and update those that changed'''
+    fields = ('host', 'description', 'path', 'notes')
+    query = select([staging] + current(Location.__table__, ('name',) + fields)) \
+        .select_from(staging.outerjoin(Location.__table__, Location.name == staging.c.name)) \
+        .where(staging.c.name != None) \
+        .order_by(staging.c.line)
+    return sync_rows(connection, Location.__table__, connection.execute(query),
+                     lambda row: row.name,
+                     lambda row: dict([('name', row.name)] +
+                                      [(field, row[field]) for field in fields]),
+                     "locations")
+
+
+def sync_tables(connection, staging):
+    '''Insert the tables that are new and update those that changed'''
+    query = select([staging, Location.id.label('location_id')] +
+                   current(Table.__table__, ('name', 'description', 'location_id'))) \
+        .select_from(staging
+                     .outerjoin(Location.__table__, Location.name == staging.c.location)
+                     .outerjoin(Table.__table__, Table.name == staging.c.table)) \
+        .where(staging.c.table != None) \
+        .order_by(staging.c.line)
+    results = connection.execute(query).fetchall()
+    warn_unresolved("locations", [row.location for row in results if row.location_id is None])
+    return sync_rows(connection, Table.__table__, results, lambda row: row.table,
+                     lambda row: {'name': row.table, 'description': row.description,
+                                  'location_id': resolved(row, 'location_id', 'location')},
+                     "tables")
+
+
+def sync_columns(connection, staging):
+    '''Insert the columns that are new and update those that changed'''
+    fields = ('description', 'type', 'length', 'format')
+    query = select([staging, Table.id.label('table_id')] +
+                   current(Column.__table__, ('name', 'table_id') + fields)) \
+        .select_from(staging
+                     .outerjoin(Table.__table__, Table.name == staging.c.table)
+                     .outerjoin(Column.__table__, and_(Column.table_id == Table.id,
+                                                       Column.name == staging.c.name))) \
+        .where(staging.c.name != None) \
+        .order_by(staging.c.line)
+    results = connection.execute(query).fetchall()
+    warn_unresolved("tables", [row.table for row in results if row.table_id is None])
+    return sync_rows(connection, Column.__table__,
+                     [row for row in results if row.table_id is not None],
+                     lambda row: (row.table_id, row.name),
+                     lambda row: dict([('name', row.name), ('table_id', row.table_id)] +
+                                      [(field, row[field]) for field in fields]),
+                     "columns")
+
+
+def sync_terms(connection, staging):
+    '''Insert the terms that are new and update those that changed'''
+    owner = aliased(Person.__table__)
+    steward = aliased(Person.__table__)
+    fields = ('name', 'short_description', 'long_description', 'abbreviation')
+    references = (('status_id', 'status'), ('owner_id', 'owner'), ('steward_id', 'steward'))
+    query = select([staging, TermStatus.id.label('status_id'),
+                    owner.c.id.label('owner_id'), steward.c.id.label('steward_id')] +
+                   current(Term.__table__,
+                           fields + tuple(column for column, _ in references))) \
+        .select_from(staging
+                     .outerjoin(TermStatus.__table__, TermStatus.status == staging.c.status)
+                     .outerjoin(owner, owner.c.name == staging.c.owner)
+                     .outerjoin(steward, steward.c.name == staging.c.steward)
+                     .outerjoin(Term.__table__, term_key(staging, 'name'))) \
+        .where(staging.c.name != None) \
+        .order_by(staging.c.line)
+    results = connection.execute(query).fetchall()
+    warn_unresolved("term statuses", [row.status for row in results if row.status_id is None])
+    warn_unresolved("people", [row.owner for row in results if row.owner_id is None] +
+                    [row.steward for row in results if row.steward_id is None])
+    return sync_rows(connection, Term.__table__, results, lambda row: row.name.lower(),
+                     lambda row: dict([(field, row[field]) for field in fields] +
+                                      [(column, resolved(row, column, name_field))
+                                       for column, name_field in references]),
+                     "terms")
+
+
+# The interface files in the order they are loaded, with how each is
+# described when logging, the fields read from it and its loader
+FEEDS = [
+    ('bg_interface_status.csv', 'term statuses', ('status',),
+     named(TermStatus, (('status', 'status'),))),
+    ('bg_interface_category.csv', 'categories', ('category', 'description'),
+     named(Category, (('category', 'name'), ('description', 'description')))),
+    ('bg_interface_document_type.csv', 'document types', ('document_type',),
+     named(DocumentType, (('document_type', 'type'),))),
+    ('bg_interface_person.csv', 'people', ('person',),
+     named(Person, (('person', 'name'),))),
+    ('bg_interface_terms.csv', 'terms',
+     ('name', 'short_description', 'long_description', 'abbreviation', 'status', 'owner',
+      'steward'),
+     load_terms),
+    ('bg_interface_categories.csv', 'term categories', ('term', 'category'),
+     load_term_categories),
+    ('bg_interface_links.csv', 'links', ('text', 'address', 'term'), load_links),
+    ('bg_interface_rules.csv', 'rules', ('identifier', 'name', 'description', 'notes', 'term'),
+     load_rules),
+    ('bg_interface_locations.csv', 'locations', ('name', 'host', 'description', 'path', 'notes'),
+     named(Location, (('name', 'name'), ('host', 'host'), ('description', 'description'),
+                      ('path', 'path'), ('notes', 'notes')))),
+    ('bg_interface_table.csv', 'tables', ('location', 'table', 'description'), load_tables),
+    ('bg_interface_column.csv', 'columns',
+     ('table', 'name', 'description', 'type', 'length', 'format'),
+     load_columns),
+    ('bg_interface_columns_term.csv', 'column terms', ('table', 'name', 'term'),
+     load_column_terms)
+]
+
+# The loaders of the files whose rows are updated in sync mode
+SYNC = {
+    'bg_interface_terms.csv': sync_terms,
+    'bg_interface_locations.csv': sync_locations,
+    'bg_interface_table.csv': sync_tables,
+    'bg_interface_column.csv': sync_columns
+}
+
+
+def load_file(file_name, fields, load, description, chunk_size):
+    '''
+    Load a CSV file a chunk at a time, committing each chunk, and return the
+    number of rows written
+    '''
+    LOGGER.info("Loading %s from file %s", description, file_name)
+    count = 0
+    lines = 0
+    with open(file_name, 'rt', encoding='utf-8', newline='') as csv_file:
+        for records in batches(csv.DictReader(csv_file), chunk_size):
+            connection = db.session.connection()
+            try:
+                staging = stage(connection, fields, records, lines)
+                count += load(connection, staging)
+                staging.drop(connection)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            lines += len(records)
+            LOGGER.info("Processed %s %s records", lines, description)
+    LOGGER.info("Loaded %s %s", count, description)
+    return count
+
+
+def load(directory, chunk_size=CHUNK_SIZE, sync=False):
+    '''
+    Load the interface files found in a directory, skipping the rows that
+    already exist, and return the number of rows written from each file
+
+    :param directory: The directory holding the bg_interface_*.csv files
+    :param chunk_size: The number of rows staged and committed at a time
+    :param sync: Update the locations, tables, columns and terms that exist
+                 where they differ from the files rather than skipping them
+    '''
+    log_format = "%(asctime)-15s [%(levelname)s] %(message)s"
+    logging.basicConfig(level=logging.INFO, format=log_format)
+
+    LOGGER.info("Starting CSV load process")
+    app.config['SQLALCHEMY_ECHO'] = False
+
+    counts = {}
+    for file_name, description, fields, loader in FEEDS:
+        path = join(directory, file_name)
+        if isfile(path):
+            if sync:
+                loader = SYNC.get(file_name, loader)
+            counts[file_name] = load_file(path, fields, loader, description, chunk_size)
+
+    if not counts:
+        LOGGER.error("There are no interface files in %s", directory)
+        return counts
+
+    # Nothing is written when the files match the glossary
+    if not any(counts.values()):
+        LOGGER.info("The glossary is up to date")
+        return counts
+
+    search.rebuild()
+    bump_revision(db.session.connection())
+    record_reload(db.session.connection())
+    db.session.commit()
+    fragments.clear()
+
+    LOGGER.info("CSV load process ended")
+    return counts
@@ -16,6 +16,7 @@
 
 '''Script to load data to the application database'''
 
+import datetime
 import logging
 
 import yaml
@@ -35,6 +36,8 @@ from app.main.models import Term, TermStatus, Person, Category, Link, \
 from sqlalchemy import and_
 
 from app.config import BASE_DIR
+from app.loader.bulk_load import BulkLoader
+from app.loader.stream_yaml import read_sections
 
 LOGGER = logging.getLogger("business-glossary.load_data")
 
@@ -361,8 +364,297 @@ def add_notes(note):
     LOGGER.info("Loaded note for rule %s", note['rule'])
 
 
-def load(file_name):
-    '''Start the loading process'''
+def parse_timestamp(value):
+    '''Return a timestamp read from a tombstone key as a datetime'''
+    if not isinstance(value, str):
+        return value
+    for timestamp_format in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.datetime.strptime(value, timestamp_format)
+        except ValueError:
+            pass
+    return None
+
+
+# The model of each section and the field its records are found by
+KEYED = {
+    'person': (Person, 'name'),
+    'term_status': (TermStatus, 'status'),
+    'document_type': (DocumentType, 'type'),
+    'location': (Location, 'name'),
+    'category': (Category, 'name'),
+    'terms': (Term, 'name'),
+    'rules': (Rule, 'name'),
+    'tables': (Table, 'name'),
+    'documents': (Document, 'name'),
+    'links': (Link, 'text')
+}
+
+
+def find(section, key):
+    '''
+    Return the row of a section with the key of a record or tombstone, or None
+
+    :param section: The section of the record
+    :param key: The record, or a tombstone key, holding the fields that
+                identify the row
+    '''
+    if section == 'columns':
+        query = Column.query.filter(Column.name == key['name'])
+        if key.get('table'):
+            return query.join(Table).filter(Table.name == key['table']).first()
+        return query.filter(Column.table_id == None).first()
+    if section == 'notes':
+        return Note.query.join(Note.rule) \
+            .filter(Rule.name == key.get('rule'),
+                    Note.created_on == parse_timestamp(key.get('created_on'))).first()
+    model, field = KEYED[section]
+    return model.query.filter(getattr(model, field) == key[field]).first()
+
+
+def named(model, field, name):
+    '''Return the row of a model with a name, or None'''
+    if not name:
+        return None
+    return model.query.filter(getattr(model, field) == name).first()
+
+
+def all_named(model, field, names, create=False):
+    '''
+    Return the rows of a model with the given names
+
+    :param create: Add the rows that do not exist rather than leave them out
+    '''
+    rows = []
+    for name in names or ():
+        row = named(model, field, name)
+        if row is None and create:
+            row = model(**{field: name})
+            db.session.add(row)
+        if row is None:
+            LOGGER.warning("Could not find %s %s", model.__tablename__, name)
+            continue
+        rows.append(row)
+    return rows
+
+
+def set_fields(row, record, fields):
+    '''Set the fields of a row from a record, clearing those it leaves out'''
+    for field in fields:
+        setattr(row, field, record.get(field))
+
+
+def updater(section, add, fields):
+    '''Return a function that updates the fields of a row or adds it if it is new'''
+    def update(record):
+        row = find(section, record)
+        if row is None:
+            return add(record)
+        set_fields(row, record, fields)
+        db.session.commit()
+        LOGGER.info("Updated %s %s", section, record[KEYED[section][1]])
+    return update
+
+
+def update_term(term):
+    '''Update a term from a dict, or add it if it is new'''
+    record = find('terms', term)
+    if record is None:
+        return add_term(term)
+
+    set_fields(record, term, ('short_description', 'long_description', 'abbreviation',
+                              'created_on', 'updated_on'))
+    record.status = named(TermStatus, 'status', term.get('status'))
+    record.owner = named(Person, 'name', term.get('owner'))
+    record.steward = named(Person, 'name', term.get('steward'))
+    record.categories = all_named(Category, 'name', term.get('categories'), create=True)
+    db.session.commit()
+    LOGGER.info("Updated term %s", term['name'])
+
+
+def update_rule(rule):
+    '''Update a rule from a dict, or add it if it is new'''
+    record = find('rules', rule)
+    if record is None:
+        return add_rule(rule)
+
+    set_fields(record, rule, ('identifier', 'description', 'notes', 'created_on', 'updated_on'))
+    record.terms = all_named(Term, 'name', rule.get('terms'))
+    db.session.commit()
+    LOGGER.info("Updated rule %s", rule['name'])
+
+
+def update_note(note):
+    '''Update a rule note from a dict, or add it if it is new'''
+    record = find('notes', note)
+    if record is None:
+        return add_notes(note)
+
+    set_fields(record, note, ('note', 'note_type', 'updated_on'))
+    db.session.commit()
+    LOGGER.info("Updated note for rule %s", note['rule'])
+
+
+def update_table(table):
+    '''Update a table from a dict, or add it if it is new'''
+    record = find('tables', table)
+    if record is None:
+        return add_table(table)
+
+    set_fields(record, table, ('description',))
+    record.location = named(Location, 'name', table.get('location'))
+    db.session.commit()
+    LOGGER.info("Updated table %s", table['name'])
+
+
+def update_column(column):
+    '''Update a column from a dict, or add it if it is new'''
+    record = find('columns', column)
+    if record is None:
+        return add_column(column)
+
+    set_fields(record, column, ('description', 'type', 'length', 'format'))
+    record.terms = all_named(Term, 'name', column.get('terms'))
+    db.session.commit()
+    LOGGER.info("Updated column %s in table %s", column['name'], column.get('table'))
+
+
+def update_document(document):
+    '''Update a document from a dict, or add it if it is new'''
+    record = find('documents', document)
+    if record is None:
+        return add_document(document)
+
+    set_fields(record, document, ('path', 'description'))
+    record.types = all_named(DocumentType, 'type', document.get('types'), create=True)
+    record.terms = all_named(Term, 'name', document.get('terms'))
+    db.session.commit()
+    LOGGER.info("Updated document %s", document['name'])
+
+
+def update_link(link):
+    '''Update a link from a dict, or add it if it is new'''
+    record = find('links', link)
+    if record is None:
+        return add_link(link)
+
+    set_fields(record, link, ('address',))
+    record.term = named(Term, 'name', link.get('term'))
+    db.session.commit()
+    LOGGER.info("Updated link %s", link['text'])
+
+
+def update_related_terms(related_term):
+    '''Set the related terms of a term from a dict'''
+    term = named(Term, 'name', related_term['term'])
+    if term is None:
+        LOGGER.warning("Could not find the term %s with which to associate related terms",
+                       related_term['term'])
+        return
+
+    related = all_named(Term, 'name', related_term.get('related_terms'))
+    for other in list(term.related_terms):
+        if other not in related:
+            term.unrelate(other)
+    for other in related:
+        term.relate(other)
+    db.session.commit()
+    LOGGER.info("Updated the related terms of %s", term.name)
+
+
+def delete_record(tombstone):
+    '''Delete the row a tombstone from an incremental backup refers to'''
+    record = find(tombstone['section'], tombstone['key'])
+    if record is None:
+        LOGGER.info("The deleted %s %s does not exist", tombstone['section'], tombstone['key'])
+        return
+
+    db.session.delete(record)
+    db.session.commit()
+    LOGGER.info("Deleted %s %s", tombstone['section'], tombstone['key'])
+
+
+# The functions that update the records of each section from an incremental
+# backup, adding those that are new
+UPDATES = {
+    'person': updater('person', add_person, ()),
+    'term_status': updater('term_status', add_term_status, ()),
+    'document_type': updater('document_type', add_document_type, ()),
+    'location': updater('location', add_location, ('host', 'description', 'path', 'notes')),
+    'category': updater('category', add_category, ('description',)),
+    'terms': update_term,
+    'rules': update_rule,
+    'tables': update_table,
+    'columns': update_column,
+    'documents': update_document,
+    'links': update_link,
+    'related_terms': update_related_terms,
+    'notes': update_note
+}
+
+
+# The sections of a glossary file in the order they are loaded, with how each
+# is described when logging and the function that adds one of its records
+SECTIONS = [
+    ('person', 'people', add_person),
+    ('term_status', 'term status', add_term_status),
+    ('document_type', 'document types', add_document_type),
+    ('location', 'locations', add_location),
+    ('category', 'categories', add_category),
+    ('terms', 'terms', add_term),
+    ('rules', 'rules', add_rule),
+    ('tables', 'tables', add_table),
+    ('columns', 'columns', add_column),
+    ('documents', 'documents', add_document),
+    ('links', 'links', add_link),
+    ('related_terms', 'term relations', add_related_terms),
+    ('notes', 'notes', add_notes)
+]
+
+
+# The sections whose records are referred to by name from each section. A
+# section is only loaded once the sections it depends on have been loaded.
+DEPENDENCIES = {
+    'terms': ('person', 'term_status', 'category'),
+    'rules': ('terms',),
+    'tables': ('location',),
+    'columns': ('tables', 'terms'),
+    'documents': ('document_type', 'terms'),
+    'links': ('terms',),
+    'related_terms': ('terms',),
+    'notes': ('rules',)
+}
+
+# How often progress is logged when loading one record at a time
+PROGRESS_INTERVAL = 1000
+
+
+def load_records(records, add, description):
+    '''Add the records of a section one at a time, logging progress'''
+    count = 0
+    for record in records:
+        add(record)
+        count += 1
+        if count % PROGRESS_INTERVAL == 0:
+            LOGGER.info("Loaded %s %s", count, description)
+    return count
+
+
+def load(file_name, bulk=False, batch_size=1000, update=False):
+    '''
+    Start the loading process
+
+    The file is read one record at a time. Sections are loaded in the order
+    they appear in the file unless they depend on a section that comes later,
+    in which case they are loaded on a further pass over the file.
+
+    :param file_name: The YAML file to load
+    :param bulk: Load each section in batches with the BulkLoader
+    :param batch_size: The number of records committed at a time in bulk mode
+    :param update: Replay an incremental backup, updating the records that
+                   exist and deleting those in its deleted section, which
+                   comes first in the file
+    '''
     log_format = "%(asctime)-15s [%(levelname)s] %(message)s"
     logging.basicConfig(level=logging.INFO, format=log_format)
 
@@ -372,86 +664,68 @@ def load(file_name):
 
     if not isfile(file_name):
         LOGGER.error("The file does not exist")
-    else:
-        with open(file_name, 'r') as stream:
-            try:
-                objects = yaml.load(stream)
-
-                # Should be a dict of lists of dicts
-                # If missing the record type then it will just be a list of dicts
-                if not isinstance(objects, dict):
-                    LOGGER.error("Please check the file format, it appears to be incorrect.")
-                    return
-
-                for obj in objects:
-                    LOGGER.info("Found %s objects in file", obj)
-
-                if 'person' in objects:
-                    LOGGER.info("Loading people from file %s", file_name)
-                    for obj in objects['person']:
-                        add_person(obj)
-
-                if 'term_status' in objects:
-                    LOGGER.info("Loading term status from file %s", file_name)
-                    for obj in objects['term_status']:
-                        add_term_status(obj)
-
-                if 'document_type' in objects:
-                    LOGGER.info("Loading document types from file %s", file_name)
-                    for obj in objects['document_type']:
-                        add_document_type(obj)
-
-                if 'location' in objects:
-                    LOGGER.info("Loading locations from file %s", file_name)
-                    for obj in objects['location']:
-                        add_location(obj)
-
-                if 'category' in objects:
-                    LOGGER.info("Loading categories from file %s", file_name)
-                    for obj in objects['category']:
-                        add_category(obj)
-
-                if 'terms' in objects:
-                    LOGGER.info("Loading terms from file %s", file_name)
-                    for obj in objects['terms']:
-                        add_term(obj)
-
-                if 'rules' in objects:
-                    LOGGER.info("Loading rules from file %s", file_name)
-                    for obj in objects['rules']:
-                        add_rule(obj)
-
-                if 'tables' in objects:
-                    LOGGER.info("Loading tables from file %s", file_name)
-                    for obj in objects['tables']:
-                        add_table(obj)
-
-                if 'columns' in objects:
-                    LOGGER.info("Loading columns from file %s", file_name)
-                    for obj in objects['columns']:
-                        add_column(obj)
-
-                if 'documents' in objects:
-                    LOGGER.info("Loading documents from file %s", file_name)
-                    for obj in objects['documents']:
-                        add_document(obj)
-
-                if 'links' in objects:
-                    LOGGER.info("Loading links from file %s", file_name)
-                    for obj in objects['links']:
-                        add_link(obj)
-
-                if 'related_terms' in objects:
-                    LOGGER.info("Loading term relations from file %s", file_name)
-                    for obj in objects['related_terms']:
-                        add_related_terms(obj)
-
-                if 'notes' in objects:
-                    LOGGER.info("Loading notes from file %s", file_name)
-                    for obj in objects['notes']:
-                        add_notes(obj)
-
-                LOGGER.info("Import process ended.")
-
-            except yaml.YAMLError as ex:
-                print(ex)
+        return
+
+    loaders = dict((section, (description, add)) for section, description, add in SECTIONS)
+    if update:
+        loaders = dict((section, (description, UPDATES[section]))
+                       for section, (description, add) in loaders.items())
+        loaders['deleted'] = ('deletions', delete_record)
+        if bulk:
+            LOGGER.warning("Incremental backups are replayed one record at a time")
+            bulk = False
+    loader = BulkLoader(batch_size) if bulk else None
+    # The sections in the file, known after the first pass
+    present = None
+    loaded = set()
+
+    def ready(section):
+        '''Whether the sections a section depends on have been loaded'''
+        return all(dependency in loaded or (present is not None and dependency not in present)
+                   for dependency in DEPENDENCIES.get(section, ()))
+
+    def handler(section):
+        '''Return the function that loads a section or None to skip it for now'''
+        if present is None:
+            LOGGER.info("Found %s objects in file", section)
+        if section not in loaders or section in loaded or not ready(section):
+            return None
+
+        description, add = loaders[section]
+
+        def consume(records):
+            LOGGER.info("Loading %s from file %s", description, file_name)
+            if loader:
+                count = loader.load_section(section, records)
+            else:
+                count = load_records(records, add, description)
+            loaded.add(section)
+            LOGGER.info("Loaded %s %s", count, description)
+        return consume
+
+    try:
+        while True:
+            first_pass = present is None
+            before = len(loaded)
+            with open(file_name, 'r') as stream:
+                sections = read_sections(stream, handler)
+
+            # Should be a dict of lists of dicts
+            # If missing the record type then it will just be a list of dicts
+            if sections is None:
+                LOGGER.error("Please check the file format, it appears to be incorrect.")
+                return
+
+            if present is None:
+                present = set(sections) & set(loaders)
+            # Every pass after the first loads at least one section
+            if present <= loaded or (not first_pass and len(loaded) == before):
+                break
+
+        if loader:
+            loader.finish()
+
+        LOGGER.info("Import process ended.")
+
+    except yaml.YAMLError as ex:
+        print(ex)
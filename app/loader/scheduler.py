@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''
+Run the partitions of a restore on a pool of threads in dependency order.
+
+The tables of the glossary form a graph through their foreign keys. The
+partitions of a table are loaded once every partition of the tables it refers
+to has been loaded, so tables that do not depend on each other, and the
+partitions of one table, load at the same time.
+'''
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+LOGGER = logging.getLogger("business-glossary.scheduler")
+
+
+def dependency_graph(tables):
+    '''
+    Return the names of the tables each table refers to through its foreign
+    keys, among the tables given
+
+    :param tables: The SQLAlchemy tables
+    '''
+    names = set(table.name for table in tables)
+    return dict((table.name, set(key.column.table.name for key in table.foreign_keys
+                                 if key.column.table.name in names and
+                                 key.column.table.name != table.name))
+                for table in tables)
+
+
+def run(graph, partitions, work, workers, progress=None):
+    '''
+    Call work for every partition of every node of a graph, up to workers at
+    a time, starting the partitions of a node once the nodes it depends on are
+    done. The first error raised by work is raised once the partitions already
+    running have finished, and no more are started.
+
+    :param graph: The set of nodes each node depends on
+    :param partitions: The list of partitions of each node
+    :param work: Called with a node and one of its partitions
+    :param workers: The number of threads
+    :param progress: Called with each node as it is done
+    '''
+    waiting = dict((node, set(depends_on)) for node, depends_on in graph.items())
+    remaining = dict((node, len(partitions.get(node, ()))) for node in graph)
+    running = {}
+
+    def finished(node):
+        '''Note a node is done and release the nodes waiting for it'''
+        del remaining[node]
+        for depends_on in waiting.values():
+            depends_on.discard(node)
+        if progress:
+            progress(node)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while waiting or running:
+            for node in [node for node, depends_on in waiting.items() if not depends_on]:
+                del waiting[node]
+                if not remaining[node]:
+                    finished(node)
+                for partition in partitions.get(node, ()):
+                    running[pool.submit(work, node, partition)] = node
+
+            if not running:
+                # Nodes with no partitions may have released others
+                if any(not depends_on for depends_on in waiting.values()):
+                    continue
+                if waiting:
+                    raise ValueError("The dependencies of %s form a cycle" %
+                                     ', '.join(sorted(waiting)))
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                if future.exception() is not None:
+                    LOGGER.error("Loading %s failed: %s", node, future.exception())
+                    wait(running)
+                    raise future.exception()
+                remaining[node] -= 1
+                if not remaining[node]:
+                    finished(node)
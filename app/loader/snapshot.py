@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''
+Snapshots of the glossary tables for fast backup and restore.
+
+A snapshot is a directory holding the rows of each glossary table as gzip
+compressed JSON lines, one list of column values per line, split into chunks
+of CHUNK_ROWS rows. The manifest.json file lists the tables in the order they
+are restored, their columns and the row count and SHA-256 checksum of each
+chunk.
+
+Rows are written and restored as they are stored, ids included, so restoring
+is a series of bulk inserts with no names to look up, and the chunks of
+tables that do not refer to each other can be inserted at the same time.
+'''
+
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+from os.path import join, isdir, isfile
+
+from flask import current_app as app
+from sqlalchemy import select, func
+from sqlalchemy.types import DateTime
+
+from app import fragments, search
+from app.extensions import db
+from app.loader import scheduler
+from app.loader.dump_yaml import record_backup
+from app.main.models import REVISED, bump_revision, record_reload, \
+    term_category_relationship, document_types_relationship, term_column_relationship, \
+    term_document_relationship, term_rule_relationship, rule_document_relationship, \
+    term_to_term_relationship
+
+LOGGER = logging.getLogger("business-glossary.snapshot")
+
+FORMAT_VERSION = 1
+
+MANIFEST = 'manifest.json'
+
+# The number of rows in each chunk file
+CHUNK_ROWS = 50000
+
+# The number of rows inserted with each executemany
+INSERT_ROWS = 5000
+
+# Fast compression, the rows being written and read rather than archived
+COMPRESS_LEVEL = 6
+
+ASSOCIATIONS = [term_category_relationship, document_types_relationship, term_column_relationship,
+                term_document_relationship, term_rule_relationship, rule_document_relationship,
+                term_to_term_relationship]
+
+
+def glossary_tables():
+    '''Return the glossary tables, each after the tables it refers to'''
+    names = set(model.__table__.name for model in REVISED) | \
+        set(table.name for table in ASSOCIATIONS)
+    return [table for table in db.metadata.sorted_tables if table.name in names]
+
+
+def encoder(column):
+    '''Return the function making a JSON value of a column'''
+    if isinstance(column.type, DateTime):
+        return lambda value: value.isoformat() if value is not None else None
+    return lambda value: value
+
+
+def decoder(column):
+    '''Return the function making a column value from its JSON value'''
+    if isinstance(column.type, DateTime):
+        return parse_timestamp
+    return lambda value: value
+
+
+def parse_timestamp(value):
+    '''
+    Return a timestamp written by encoder as a datetime. The fields are sliced
+    from their fixed places, which is several times faster than strptime.
+    '''
+    if value is None:
+        return None
+    try:
+        return datetime.datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                                 int(value[11:13]), int(value[14:16]), int(value[17:19]),
+                                 int(value[20:26].ljust(6, '0')) if len(value) > 19 else 0)
+    except ValueError:
+        raise ValueError("Unreadable timestamp %s" % value)
+
+
+def checksum(path):
+    '''Return the SHA-256 of a file'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as chunk_file:
+        for block in iter(lambda: chunk_file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_chunk(directory, table, number, rows):
+    '''Write rows to a chunk file and return its manifest entry'''
+    file_name = '%s.%04d.jsonl.gz' % (table.name, number)
+    path = join(directory, file_name)
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=COMPRESS_LEVEL) as chunk_file:
+        for row in rows:
+            chunk_file.write(json.dumps(row, separators=(',', ':')))
+            chunk_file.write('\n')
+    return {'file': file_name, 'rows': len(rows), 'sha256': checksum(path)}
+
+
+def dump_table(connection, directory, table, chunk_rows):
+    '''Write the rows of a table in chunks and return its manifest entry'''
+    columns = list(table.columns)
+    encoders = [encoder(column) for column in columns]
+    result = connection.execution_options(stream_results=True) \
+        .execute(select(columns).order_by(*table.primary_key.columns))
+
+    chunks = []
+    count = 0
+    while True:
+        rows = result.fetchmany(chunk_rows)
+        if not rows:
+            break
+        rows = [[encode(value) for encode, value in zip(encoders, row)] for row in rows]
+        chunks.append(write_chunk(directory, table, len(chunks), rows))
+        count += len(rows)
+
+    LOGGER.info("Dumped %s rows of %s", count, table.name)
+    return {'name': table.name, 'columns': [column.name for column in columns], 'chunks': chunks}
+
+
+def dump(directory, chunk_rows=CHUNK_ROWS, progress=None):
+    '''
+    Write a snapshot of the glossary to a new directory. The time it started
+    is recorded as the mark the next incremental backup starts from.
+
+    :param directory: The directory to create
+    :param chunk_rows: The number of rows in each chunk file
+    :param progress: Called with the percentage done and a message after
+                     each table is written
+    '''
+    LOGGER.info("Snapshot started")
+    app.config['SQLALCHEMY_ECHO'] = False
+
+    started = datetime.datetime.utcnow()
+    os.makedirs(directory)
+    tables = glossary_tables()
+    connection = db.session.connection()
+    manifest = {'format': FORMAT_VERSION,
+                'created_on': started.isoformat(),
+                'tables': []}
+    for done, table in enumerate(tables, 1):
+        manifest['tables'].append(dump_table(connection, directory, table, chunk_rows))
+        if progress:
+            progress(done * 100 // len(tables), "Dumped %s" % table.name)
+    db.session.commit()
+
+    # The manifest is written last so a snapshot without one is incomplete
+    with open(join(directory, MANIFEST), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    record_backup(directory, None, started)
+
+    LOGGER.info("Snapshot %s created", directory)
+
+
+def read_manifest(directory):
+    '''Return the manifest of a snapshot after checking its chunks are intact'''
+    path = join(directory, MANIFEST)
+    if not isdir(directory) or not isfile(path):
+        raise ValueError("%s is not a complete snapshot" % directory)
+    with open(path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError("Snapshot format %s is not supported" % manifest.get('format'))
+
+    for table in manifest['tables']:
+        for chunk in table['chunks']:
+            if checksum(join(directory, chunk['file'])) != chunk['sha256']:
+                raise ValueError("The checksum of %s does not match" % chunk['file'])
+    return manifest
+
+
+def defer_foreign_keys(connection):
+    '''Check foreign keys when the restore commits rather than row by row'''
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        connection.execute('PRAGMA defer_foreign_keys = ON')
+    elif dialect == 'postgresql':
+        connection.execute('SET CONSTRAINTS ALL DEFERRED')
+    elif dialect == 'mysql':
+        connection.execute('SET FOREIGN_KEY_CHECKS = 0')
+
+
+def restore_foreign_keys(connection):
+    '''Check foreign keys row by row again where they were turned off'''
+    if connection.dialect.name == 'mysql':
+        connection.execute('SET FOREIGN_KEY_CHECKS = 1')
+
+
+def reset_sequences(connection, tables):
+    '''Move id sequences past the ids restored, which PostgreSQL does not do itself'''
+    if connection.dialect.name != 'postgresql':
+        return
+    for table in tables:
+        if 'id' in table.c:
+            connection.execute(
+                select([func.setval(func.pg_get_serial_sequence(table.name, 'id'),
+                                    func.coalesce(func.max(table.c.id), 0) + 1, False)]))
+
+
+def read_chunk(directory, chunk):
+    '''Yield the rows of a chunk file'''
+    with gzip.open(join(directory, chunk['file']), 'rt', encoding='utf-8') as chunk_file:
+        for line in chunk_file:
+            yield json.loads(line)
+
+
+def insert_chunk(connection, directory, table, names, chunk):
+    '''Insert the rows of a chunk file with one executemany per INSERT_ROWS rows'''
+    decoders = [decoder(table.c[name]) for name in names]
+    insert = table.insert()
+    rows = []
+    for values in read_chunk(directory, chunk):
+        rows.append(dict((name, decode(value))
+                         for name, decode, value in zip(names, decoders, values)))
+        if len(rows) == INSERT_ROWS:
+            connection.execute(insert, rows)
+            rows = []
+    if rows:
+        connection.execute(insert, rows)
+
+
+def restore_tables(connection, directory, manifest, tables, progress=None):
+    '''Insert every chunk of a snapshot in one transaction, in manifest order'''
+    defer_foreign_keys(connection)
+    try:
+        for done, entry in enumerate(manifest['tables'], 1):
+            table = tables[entry['name']]
+            for chunk in entry['chunks']:
+                insert_chunk(connection, directory, table, entry['columns'], chunk)
+            LOGGER.info("Restored %s", table.name)
+            if progress:
+                progress(done * 100 // len(manifest['tables']), "Restored %s" % table.name)
+    finally:
+        restore_foreign_keys(connection)
+
+
+def restore_in_parallel(engine, directory, manifest, tables, workers, progress=None):
+    '''
+    Insert the chunks of a snapshot on a pool of threads, each chunk in its own
+    transaction on its own connection. The chunks of a table are inserted once
+    the tables it refers to are committed, so the foreign keys of every chunk
+    can be checked as it commits.
+    '''
+    entries = dict((entry['name'], entry) for entry in manifest['tables'])
+    graph = scheduler.dependency_graph([tables[name] for name in entries])
+    done = []
+
+    def work(name, chunk):
+        '''Insert one chunk of a table'''
+        with engine.begin() as connection:
+            defer_foreign_keys(connection)
+            try:
+                insert_chunk(connection, directory, tables[name], entries[name]['columns'], chunk)
+            finally:
+                restore_foreign_keys(connection)
+
+    def restored(name):
+        '''Note a table has been restored'''
+        done.append(name)
+        LOGGER.info("Restored %s", name)
+        if progress:
+            progress(len(done) * 100 // len(entries), "Restored %s" % name)
+
+    scheduler.run(graph, dict((name, entry['chunks']) for name, entry in entries.items()),
+                  work, workers, restored)
+
+
+def load(directory, progress=None, workers=None):
+    '''
+    Restore a snapshot into a database whose glossary tables are empty, and
+    return the number of rows restored
+
+    With more than one worker the tables and their chunks are inserted on a
+    pool of threads in the order of their foreign keys, each chunk committed
+    on its own, so a restore that fails part way leaves the chunks already
+    committed. SQLite writes one transaction at a time, so there snapshots are
+    restored in a single transaction unless workers is given.
+
+    :param directory: The snapshot directory
+    :param progress: Called with the percentage done and a message after
+                     each table is restored
+    :param workers: The number of threads inserting chunks, RESTORE_WORKERS
+                    when not given
+    '''
+    LOGGER.info("Restoring snapshot %s", directory)
+    app.config['SQLALCHEMY_ECHO'] = False
+
+    manifest = read_manifest(directory)
+    tables = dict((table.name, table) for table in glossary_tables())
+    connection = db.session.connection()
+    for table in tables.values():
+        if connection.execute(select([func.count()]).select_from(table)).scalar():
+            raise ValueError("The glossary should be empty before a snapshot is restored, "
+                             "%s has rows" % table.name)
+
+    if workers is None:
+        workers = 1 if connection.dialect.name == 'sqlite' else app.config['RESTORE_WORKERS']
+    if workers > 1:
+        db.session.commit()
+        restore_in_parallel(db.engine, directory, manifest, tables, workers, progress)
+        connection = db.session.connection()
+    else:
+        restore_tables(connection, directory, manifest, tables, progress)
+
+    reset_sequences(connection, tables.values())
+    search.rebuild()
+    bump_revision(connection)
+    record_reload(connection)
+    db.session.commit()
+    fragments.clear()
+
+    count = sum(chunk['rows'] for entry in manifest['tables'] for chunk in entry['chunks'])
+    LOGGER.info("Restored %s rows", count)
+    return count
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''
+Read a glossary YAML file one record at a time.
+
+A glossary file is a mapping of section names to lists of records. Rather than
+building the whole file in memory, the parser events are walked and each record
+is composed and constructed on its own, so memory use depends on the size of a
+record and not on the size of the file.
+'''
+
+import yaml
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.resolver import Resolver
+from yaml.events import DocumentStartEvent, \
+    MappingStartEvent, MappingEndEvent, SequenceStartEvent, SequenceEndEvent, ScalarEvent
+
+try:
+    from yaml.cyaml import CParser
+
+    class StreamLoader(CParser, Composer, SafeConstructor, Resolver):
+        '''Parses with libyaml and composes records in Python'''
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+
+except ImportError:
+    StreamLoader = yaml.SafeLoader
+
+
+def skip_node(loader):
+    '''Consume the events of the next node without building it'''
+    depth = 0
+    while True:
+        event = loader.get_event()
+        if isinstance(event, (MappingStartEvent, SequenceStartEvent)):
+            depth += 1
+        elif isinstance(event, (MappingEndEvent, SequenceEndEvent)):
+            depth -= 1
+        if depth == 0:
+            return
+
+
+def next_record(loader):
+    '''Compose and construct the next node'''
+    return loader.construct_document(loader.compose_node(None, None))
+
+
+def iter_records(loader):
+    '''Yield the records of the section at the current position one at a time'''
+    if not loader.check_event(SequenceStartEvent):
+        # An empty section or one that is not a list
+        for record in next_record(loader) or []:
+            yield record
+        return
+
+    loader.get_event()
+    while not loader.check_event(SequenceEndEvent):
+        yield next_record(loader)
+    loader.get_event()
+
+
+def read_sections(stream, handler):
+    '''
+    Read the sections of a glossary file in the order they appear.
+
+    :param stream: The open glossary file
+    :param handler: Called with the name of each section. Returns None to skip
+                    the section or a function that is passed an iterator over
+                    the records of the section.
+    :returns: The names of the sections in the file or None if the file is
+              not a mapping of sections
+    '''
+    loader = StreamLoader(stream)
+    try:
+        loader.get_event()
+        if not loader.check_event(DocumentStartEvent):
+            return None
+        loader.get_event()
+        if not loader.check_event(MappingStartEvent):
+            return None
+        loader.get_event()
+
+        sections = []
+        while not loader.check_event(MappingEndEvent):
+            if not loader.check_event(ScalarEvent):
+                raise yaml.YAMLError("Section names should be plain strings")
+            section = loader.get_event().value
+            sections.append(section)
+
+            consume = handler(section)
+            if consume is None:
+                skip_node(loader)
+                continue
+
+            records = iter_records(loader)
+            consume(records)
+            # Read whatever the handler left so the next section can be found
+            for _ in records:
+                pass
+
+        return sections
+    finally:
+        loader.dispose()
@@ -72,7 +72,8 @@ class FileView(ProtectedModelView):
 
 class RuleView(ProtectedModelView):
     '''Set the view options with displaying a Rule in the admin view'''
-    form_excluded_columns = ('created_on', 'updated_on')
+    form_excluded_columns = ('created_on', 'updated_on', 'description_html', 'notes_html',
+                             'name_key', 'listed_comments')
     column_list = ('identifier', 'name', 'description', 'notes')
     #form_columns = ('identifier', 'name', 'description', 'notes', 'terms')
     column_searchable_list = ['identifier', 'name', 'description']
@@ -95,7 +96,7 @@ class TermView(ProtectedModelView):
                        'steward', 'status', 'categories', 'links', 'rules', 'related_terms',
                        'documents', 'columns')
     column_list = ['name', 'short_description', 'abbreviation', 'status', ]
-    form_excluded_columns = ('created_on', 'updated_on')
+    form_excluded_columns = ('created_on', 'updated_on', 'long_description_html')
     column_searchable_list = ['name']
     form_widget_args = {
         'long_description': {
@@ -104,6 +105,12 @@ class TermView(ProtectedModelView):
     }
 
 
+class NoteView(ProtectedModelView):
+    '''Set the view options with displaying a Note in the admin view'''
+    column_exclude_list = ('note_html',)
+    form_excluded_columns = ('note_html',)
+
+
 class TableView(ProtectedModelView):
     '''Set the view options with displaying a Table in the admin view'''
     column_default_sort = 'name'
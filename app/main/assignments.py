@@ -0,0 +1,147 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''
+Assign columns to a term, or remove them, many at a time.
+
+The columns are looked up and the relationship rows written with a handful of
+statements in one transaction, however many columns are given.
+'''
+
+import datetime
+import logging
+
+from sqlalchemy import select, and_, bindparam
+
+from app import fragments
+from app.extensions import db
+from app.main.models import Term, Column, bump_revision, record_changes, \
+    term_column_relationship
+
+LOGGER = logging.getLogger("business-glossary.assignments")
+
+# The most ids bound to one IN clause, within the limit of every database
+IN_CHUNK_SIZE = 500
+
+
+def chunks(ids):
+    '''Yield lists of up to IN_CHUNK_SIZE ids'''
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        yield ids[start:start + IN_CHUNK_SIZE]
+
+
+def matching_ids(connection, query, ids):
+    '''
+    Return the ids an IN query matches
+
+    :param connection: The connection to query with
+    :param query: Returns a select of the ids matching a list of ids
+    :param ids: The ids to match
+    '''
+    matched = set()
+    for chunk in chunks(ids):
+        matched.update(row[0] for row in connection.execute(query(chunk)))
+    return matched
+
+
+def unique_ids(column_ids):
+    '''Return the distinct ids, as integers, in the order they were given'''
+    seen = set()
+    ids = []
+    for column_id in column_ids:
+        column_id = int(column_id)
+        if column_id not in seen:
+            seen.add(column_id)
+            ids.append(column_id)
+    return ids
+
+
+def assigned_to(term_id):
+    '''Return a function selecting which of a list of columns are assigned to a term'''
+    tcr = term_column_relationship
+    return lambda chunk: select([tcr.c.column_id]) \
+        .where(and_(tcr.c.term_id == term_id, tcr.c.column_id.in_(chunk)))
+
+
+def changed(connection, term_id, column_ids, operation):
+    '''
+    Note that the assets of a term were changed without the ORM, moving on
+    the updated_on of the term and columns and logging the change as the ORM
+    would
+    '''
+    record_changes(connection, term_column_relationship.name, operation,
+                   [{'term_id': term_id, 'column_id': column_id} for column_id in column_ids])
+    now = datetime.datetime.utcnow()
+    connection.execute(Term.__table__.update().where(Term.id == term_id).values(updated_on=now))
+    for chunk in chunks(column_ids):
+        connection.execute(Column.__table__.update().where(Column.id.in_(chunk))
+                           .values(updated_on=now))
+    bump_revision(connection)
+    fragments.mark_stale(db.session, [term_id])
+
+
+def assign_columns(term_id, column_ids):
+    '''
+    Relate columns to a term and return a dict of the ids of the columns
+    assigned, those already assigned and those that do not exist
+
+    :param term_id: The id of the term
+    :param column_ids: The ids of the columns
+    '''
+    ids = unique_ids(column_ids)
+    tcr = term_column_relationship
+    connection = db.session.connection()
+
+    known = matching_ids(connection,
+                         lambda chunk: select([Column.id]).where(Column.id.in_(chunk)), ids)
+    existing = matching_ids(connection, assigned_to(term_id), ids)
+    assigned = [column_id for column_id in ids if column_id in known and column_id not in existing]
+
+    if assigned:
+        connection.execute(tcr.insert(), [{'term_id': term_id, 'column_id': column_id}
+                                          for column_id in assigned])
+        changed(connection, term_id, assigned, 'insert')
+    db.session.commit()
+    LOGGER.info("Assigned %s columns to term %s", len(assigned), term_id)
+
+    return {'assigned': assigned,
+            'existing': [column_id for column_id in ids if column_id in existing],
+            'unknown': [column_id for column_id in ids if column_id not in known]}
+
+
+def unassign_columns(term_id, column_ids):
+    '''
+    Remove columns from a term and return a dict of the ids of the columns
+    removed and those that were not assigned
+
+    :param term_id: The id of the term
+    :param column_ids: The ids of the columns
+    '''
+    ids = unique_ids(column_ids)
+    tcr = term_column_relationship
+    connection = db.session.connection()
+
+    existing = matching_ids(connection, assigned_to(term_id), ids)
+    unassigned = [column_id for column_id in ids if column_id in existing]
+
+    if unassigned:
+        connection.execute(tcr.delete().where(and_(tcr.c.term_id == term_id,
+                                                   tcr.c.column_id == bindparam('column'))),
+                           [{'column': column_id} for column_id in unassigned])
+        changed(connection, term_id, unassigned, 'delete')
+    db.session.commit()
+    LOGGER.info("Unassigned %s columns from term %s", len(unassigned), term_id)
+
+    return {'unassigned': unassigned,
+            'missing': [column_id for column_id in ids if column_id not in existing]}
@@ -1,6 +1,9 @@
 import os
 import datetime
+import itertools
+import json
 
+from sqlalchemy import func, inspect, select
 from sqlalchemy.event import listens_for
 from sqlalchemy.sql import expression
 from sqlalchemy.ext.compiler import compiles
@@ -11,6 +14,26 @@ from app.extensions import db
 
 file_path = os.path.join(os.path.dirname(__file__), 'static/files')
 
+
+def serialize(obj, fields=None, exclude=()):
+    '''
+    Return the serialized form of an instance from the SERIALIZED fields of
+    its model, computing only the fields asked for
+
+    :param obj: The instance
+    :param fields: The names of the fields, or None for all of them
+    :param exclude: The names of fields left out when fields is None
+    '''
+    return dict((name, value(obj)) for name, value in obj.SERIALIZED
+                if (name in fields if fields is not None else name not in exclude))
+
+
+def name_key(name):
+    '''Return the key a name is looked up by regardless of case'''
+    if name is None:
+        return None
+    return name.lower()
+
 term_category_relationship = db.Table('term_category_relationship',
                                       db.Column('term_id',
                                                 db.Integer,
@@ -19,7 +42,8 @@ term_category_relationship = db.Table('term_category_relationship',
                                       db.Column('category_id',
                                                 db.Integer,
                                                 db.ForeignKey('category.id'),
-                                                nullable=False),
+                                                nullable=False,
+                                                index=True),
                                       db.PrimaryKeyConstraint('term_id', 'category_id'))
 
 document_types_relationship = db.Table('document_types_table',
@@ -30,7 +54,8 @@ document_types_relationship = db.Table('document_types_table',
                                        db.Column('document_type_id',
                                                  db.Integer,
                                                  db.ForeignKey('document_type.id'),
-                                                 nullable=False),
+                                                 nullable=False,
+                                                 index=True),
                                        db.PrimaryKeyConstraint('document_id', 'document_type_id'))
 
 term_column_relationship = db.Table('term_column_relationship',
@@ -41,7 +66,8 @@ term_column_relationship = db.Table('term_column_relationship',
                                     db.Column('column_id',
                                               db.Integer,
                                               db.ForeignKey('column.id'),
-                                              nullable=False),
+                                              nullable=False,
+                                              index=True),
                                     db.PrimaryKeyConstraint('term_id', 'column_id'))
 
 term_document_relationship = db.Table('term_document_relationship',
@@ -52,7 +78,8 @@ term_document_relationship = db.Table('term_document_relationship',
                                       db.Column('document_id',
                                                 db.Integer,
                                                 db.ForeignKey('document.id'),
-                                                nullable=False),
+                                                nullable=False,
+                                                index=True),
                                       db.PrimaryKeyConstraint('term_id', 'document_id'))
 
 term_rule_relationship = db.Table('term_rule_relationship',
@@ -63,7 +90,8 @@ term_rule_relationship = db.Table('term_rule_relationship',
                                   db.Column('rule_id',
                                             db.Integer,
                                             db.ForeignKey('rule.id'),
-                                            nullable=False),
+                                            nullable=False,
+                                            index=True),
                                   db.PrimaryKeyConstraint('term_id', 'rule_id'))
 
 rule_document_relationship = db.Table('rule_document_relationship',
@@ -74,7 +102,8 @@ rule_document_relationship = db.Table('rule_document_relationship',
                                       db.Column('document_id',
                                                 db.Integer,
                                                 db.ForeignKey('document.id'),
-                                                nullable=False),
+                                                nullable=False,
+                                                index=True),
                                       db.PrimaryKeyConstraint('rule_id', 'document_id'))
 
 term_to_term_relationship = db.Table('term_to_term_relationship',
@@ -85,7 +114,8 @@ term_to_term_relationship = db.Table('term_to_term_relationship',
                                      db.Column('related_term_id',
                                                db.Integer,
                                                db.ForeignKey('term.id'),
-                                               primary_key=True),
+                                               primary_key=True,
+                                               index=True),
                                      db.UniqueConstraint('term_id',
                                                          'related_term_id',
                                                          name='unique_related_terms'))
@@ -93,10 +123,12 @@ term_to_term_relationship = db.Table('term_to_term_relationship',
 
 class Term(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100))
+    name = db.Column(db.String(100), index=True)
+    name_key = db.Column(db.String(100), index=True)
     short_description = db.Column(db.String(200))
     long_description = db.Column(db.Text)
-    abbreviation = db.Column(db.String(10))
+    long_description_html = db.Column(db.Text)
+    abbreviation = db.Column(db.String(10), index=True)
 
     categories = db.relationship('Category', secondary=term_category_relationship, backref='terms')
 
@@ -107,8 +139,10 @@ class Term(db.Model):
     rules = db.relationship('Rule', secondary=term_rule_relationship, backref='terms')
 
     links = db.relationship('Link', backref="terms", cascade="all, delete-orphan", lazy='dynamic')
+    # The links as a list rather than a query, so they can be eager loaded
+    listed_links = db.relationship('Link', viewonly=True, order_by='Link.id')
 
-    status_id = db.Column(db.Integer, db.ForeignKey('term_status.id'))
+    status_id = db.Column(db.Integer, db.ForeignKey('term_status.id'), index=True)
     status = db.relationship('TermStatus', backref=db.backref('terms', lazy='dynamic'))
 
     owner_id = db.Column(db.Integer, db.ForeignKey('person.id'))
@@ -128,7 +162,8 @@ class Term(db.Model):
                            default=datetime.datetime.utcnow)
     updated_on = db.Column(db.DateTime,
                            default=datetime.datetime.utcnow,
-                           onupdate=datetime.datetime.utcnow)
+                           onupdate=datetime.datetime.utcnow,
+                           index=True)
 
     def relate(self, term):
         if term not in self.related_terms:
@@ -149,23 +184,28 @@ class Term(db.Model):
         except NameError:
             return str(self.id)  # python 3
 
+    # The fields of the serialized form of a term, each computed when asked for
+    SERIALIZED = (
+        ('id', lambda term: term.id),
+        ('name', lambda term: term.name),
+        ('short_description', lambda term: term.short_description),
+        ('long_description', lambda term: term.long_description),
+        ('abbreviation', lambda term: term.abbreviation),
+        ('status', lambda term: term.status.status if term.status else None),
+        ('owner', lambda term: term.owner.name if term.owner else None),
+        ('steward', lambda term: term.steward.name if term.steward else None),
+        ('created_on', lambda term: dump_datetime(term.created_on)),
+        ('updated_on', lambda term: dump_datetime(term.updated_on)),
+        ('category', lambda term: term.serialize_categories),
+        ('links', lambda term: term.serialize_links),
+        ('columns', lambda term: term.serialize_columns),
+        ('rules', lambda term: term.serialize_rules)
+    )
+
     @property
     def serialize(self):
         """Return object data in easily serializeable format"""
-        return {
-            'name': self.name,
-            'short_description': self.short_description,
-            'long_description': self.long_description,
-            'status': self.status.status,
-            'category': self.serialize_categories,
-            'links': self.serialize_links,
-            'columns': self.serialize_columns,
-            'owner': self.owner.name,
-            'steward': self.owner.name,
-            'created_on': dump_datetime(self.created_on),
-            'updated_on': dump_datetime(self.updated_on),
-            'rules': self.serialize_rules
-        }
+        return serialize(self)
 
     @property
     def serialize_rules(self):
@@ -187,9 +227,9 @@ class Term(db.Model):
     def serialize_links(self):
         """
         Return object's relations in easily serializeable format.
-        NB! Calls many2many's serialize property.
+        NB! Reads the links through listed_links, which can be eager loaded.
         """
-        return [item.serialize for item in self.links]
+        return [item.serialize for item in self.listed_links]
 
     @property
     def serialize_columns(self):
@@ -203,6 +243,10 @@ class Term(db.Model):
 class TermStatus(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     status = db.Column(db.String(20), unique=True, nullable=False)
+    updated_on = db.Column(db.DateTime,
+                           default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow,
+                           index=True)
 
     def __repr__(self):
         return self.status
@@ -212,41 +256,57 @@ class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
     description = db.Column(db.String(50))
+    updated_on = db.Column(db.DateTime,
+                           default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow,
+                           index=True)
 
     def __repr__(self):
         return self.name
 
+    SERIALIZED = (
+        ('name', lambda category: category.name),
+        ('description', lambda category: category.description)
+    )
+
     @property
     def serialize(self):
         """Return object data in easily serializeable format"""
-        return {
-            'name': self.name,
-            'description': self.description
-        }
+        return serialize(self)
 
 
 class Link(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.String(100), nullable=False)
     address = db.Column(db.String(200), nullable=False)
-    term_id = db.Column(db.Integer, db.ForeignKey('term.id'))
+    term_id = db.Column(db.Integer, db.ForeignKey('term.id'), index=True)
     term = db.relationship("Term", backref=db.backref('term_link', lazy='dynamic'))
+    updated_on = db.Column(db.DateTime,
+                           default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow,
+                           index=True)
 
     def __repr__(self):
         return self.text
 
+    SERIALIZED = (
+        ('text', lambda link: link.text),
+        ('address', lambda link: link.address)
+    )
+
     @property
     def serialize(self):
         """Return object data in easily serializeable format"""
-        return {
-            'text': self.text,
-            'address': self.address
-        }
+        return serialize(self)
 
 
 class Person(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
+    updated_on = db.Column(db.DateTime,
+                           default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow,
+                           index=True)
 
     def __repr__(self):
         return self.name
@@ -259,6 +319,10 @@ class Location(db.Model):
     description = db.Column(db.String(200))
     path = db.Column(db.String(100))
     notes = db.Column(db.String(300))
+    updated_on = db.Column(db.DateTime,
+                           default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow,
+                           index=True)
 
     def __repr__(self):
         return self.name
@@ -268,48 +332,64 @@ class Table(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
     description = db.Column(db.String(length=200))
-    location_id = db.Column(db.Integer, db.ForeignKey('location.id'))
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), index=True)
     location = db.relationship("Location", backref=db.backref('tables', lazy='dynamic'))
+    updated_on = db.Column(db.DateTime,
+                           default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow,
+                           index=True)
 
     def __repr__(self):
         return self.name
 
+    SERIALIZED = (
+        ('id', lambda table: table.id),
+        ('name', lambda table: table.name),
+        ('description', lambda table: table.description),
+        ('location', lambda table: table.location.name if table.location else None)
+    )
+
     @property
     def serialize(self):
         """Return object data in easily serializeable format"""
-        return {
-            'name': self.name,
-            'description': self.description,
-            'location': self.location.name
-        }
+        return serialize(self)
 
 
 class Column(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
     description = db.Column(db.String(100))
     type = db.Column(db.String(50))
     length = db.Column(db.String(10))
     format = db.Column(db.String(50))
 
-    table_id = db.Column(db.Integer, db.ForeignKey('table.id'))
+    table_id = db.Column(db.Integer, db.ForeignKey('table.id'), index=True)
     table = db.relationship("Table", backref=db.backref('columns', lazy='dynamic', cascade="all,delete"))
+    updated_on = db.Column(db.DateTime,
+                           default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow,
+                           index=True)
 
     def __repr__(self):
         return self.name
 
+    SERIALIZED = (
+        ('id', lambda column: column.id),
+        ('name', lambda column: column.name),
+        ('description', lambda column: column.description),
+        ('type', lambda column: column.type),
+        ('length', lambda column: column.length),
+        ('format', lambda column: column.format),
+        ('table', lambda column: column.table.name if column.table else None),
+        ('location', lambda column: column.table.location.name
+         if column.table and column.table.location else None),
+        ('terms', lambda column: [{'id': term.id, 'name': term.name} for term in column.terms])
+    )
+
     @property
     def serialize(self):
         """Return object data in easily serializeable format"""
-        return {
-            'name': self.name,
-            'description': self.description,
-            'type': self.type,
-            'length': self.type,
-            'format': self.format,
-            'table': self.table.name,
-            'location': self.table.location.name
-        }
+        return serialize(self, exclude=('terms',))
 
     @property
     def serialize_table(self):
@@ -320,43 +400,58 @@ class Column(db.Model):
         return [item.serialize for item in self.table]
 
 
+db.Index('ix_column_name_lower', func.lower(Column.name))
+
+
 class Rule(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    identifier = db.Column(db.String(20), nullable=False)
+    identifier = db.Column(db.String(20), nullable=False, index=True)
     name = db.Column(db.String(100), unique=True)
+    name_key = db.Column(db.String(100), index=True)
     description = db.Column(db.Text)
+    description_html = db.Column(db.Text)
     notes = db.Column(db.Text)
+    notes_html = db.Column(db.Text)
     comments = db.relationship('Note', backref='rules', cascade="all, delete-orphan", lazy='dynamic')
+    # The notes as a list rather than a query, so they can be eager loaded
+    listed_comments = db.relationship('Note', viewonly=True, order_by='Note.id')
     documents = db.relationship('Document', secondary=rule_document_relationship, backref='rules')
     created_on = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_on = db.Column(db.DateTime,
                            default=datetime.datetime.utcnow,
-                           onupdate=datetime.datetime.utcnow)
+                           onupdate=datetime.datetime.utcnow,
+                           index=True)
     def __repr__(self):
         return self.name
 
+    SERIALIZED = (
+        ('id', lambda rule: rule.id),
+        ('identifier', lambda rule: rule.identifier),
+        ('name', lambda rule: rule.name),
+        ('description', lambda rule: rule.description),
+        ('created_on', lambda rule: dump_datetime(rule.created_on)),
+        ('updated_on', lambda rule: dump_datetime(rule.updated_on)),
+        ('terms', lambda rule: [{'id': term.id, 'name': term.name} for term in rule.terms])
+    )
+
     @property
     def serialize(self):
         """Return the Rule object in serializable form"""
-        return {
-            'identifier': self.identifier,
-            'name': self.name,
-            'description': self.description,
-            'created_on': dump_datetime(self.created_on),
-            'updated_on': dump_datetime(self.updated_on)
-        }
+        return serialize(self, exclude=('terms',))
 
 
 class Note(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     note_type = db.Column(db.String(10))
     note = db.Column(db.Text)
-    rule_id = db.Column(db.Integer, db.ForeignKey('rule.id'))
+    note_html = db.Column(db.Text)
+    rule_id = db.Column(db.Integer, db.ForeignKey('rule.id'), index=True)
     rule = db.relationship('Rule', foreign_keys=[rule_id])
     created_on = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_on = db.Column(db.DateTime,
                            default=datetime.datetime.utcnow,
-                           onupdate=datetime.datetime.utcnow)
+                           onupdate=datetime.datetime.utcnow,
+                           index=True)
     def __repr__(self):
         return self.note
 
@@ -368,6 +463,10 @@ class Document(db.Model):
     description = db.Column(db.String(200))
 
     types = db.relationship('DocumentType', secondary=document_types_relationship)
+    updated_on = db.Column(db.DateTime,
+                           default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow,
+                           index=True)
 
     def __repr__(self):
         return self.name
@@ -376,6 +475,10 @@ class Document(db.Model):
 class DocumentType(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(45))
+    updated_on = db.Column(db.DateTime,
+                           default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow,
+                           index=True)
 
     def __repr__(self):
         return self.type
@@ -384,6 +487,275 @@ class DocumentType(db.Model):
         return self.type
 
 
+
+class Revision(db.Model):
+    '''A counter moved on by every change to the glossary, for caches of
+    anything rendered from it'''
+    __tablename__ = 'glossary_revision'
+    id = db.Column(db.Integer, primary_key=True)
+    revision = db.Column(db.Integer, nullable=False, default=0)
+
+
+def current_revision():
+    '''Return the revision of the glossary'''
+    return db.session.query(Revision.revision).scalar() or 0
+
+
+def bump_revision(connection):
+    '''Move the revision of the glossary on, for changes made without the ORM'''
+    table = Revision.__table__
+    result = connection.execute(table.update().values(revision=table.c.revision + 1))
+    if not result.rowcount:
+        connection.execute(table.insert().values(id=1, revision=1))
+
+
+# The models whose changes move the revision of the glossary on
+REVISED = (Term, TermStatus, Category, Link, Person, Location, Table, Column,
+           Rule, Note, Document, DocumentType)
+
+
+@listens_for(db.session, 'after_flush')
+def revise(session, flush_context):
+    '''Move the revision on when a flush changes the glossary'''
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, REVISED):
+            bump_revision(session.connection())
+            return
+
+
+@listens_for(db.session, 'before_flush')
+def touch(session, flush_context, instances):
+    '''
+    Move updated_on on for rows whose relationships alone have changed, such as
+    a term given another column, as no UPDATE of the row would record it. The
+    rows added to or removed from the relationship are moved on as well since
+    their side of it may not be loaded.
+    '''
+    touched = set()
+    for obj in session.dirty:
+        if not isinstance(obj, REVISED):
+            continue
+        state = inspect(obj)
+        for relationship in state.mapper.relationships:
+            if not relationship.uselist:
+                continue
+            history = state.attrs[relationship.key].history
+            changed = list(history.added or ()) + list(history.deleted or ())
+            if changed:
+                touched.add(obj)
+                touched.update(member for member in changed if isinstance(member, REVISED))
+
+    now = datetime.datetime.utcnow()
+    for obj in touched:
+        if obj in session.new or obj in session.deleted:
+            continue
+        if not session.is_modified(obj, include_collections=False):
+            obj.updated_on = now
+
+
+class Backup(db.Model):
+    '''A backup of the glossary and the time up to which it holds its changes,
+    the high-water mark the next incremental backup starts from'''
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(200), nullable=False)
+    since = db.Column(db.DateTime)
+    until = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class Tombstone(db.Model):
+    '''A row deleted from the glossary, recorded by the backup section it is
+    dumped to and the key it is found by when a backup is restored'''
+    id = db.Column(db.Integer, primary_key=True)
+    section = db.Column(db.String(20), nullable=False)
+    key = db.Column(db.Text, nullable=False)
+    deleted_on = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
+
+
+def referenced_name(connection, column, row_id):
+    '''Return the name of the row a foreign key refers to'''
+    if row_id is None:
+        return None
+    return connection.execute(select([column]).where(column.table.c.id == row_id)).scalar()
+
+
+# The backup section of each model and how to make the key of one of its rows
+TOMBSTONED = {
+    Person: ('person', lambda connection, row: {'name': row.name}),
+    TermStatus: ('term_status', lambda connection, row: {'status': row.status}),
+    DocumentType: ('document_type', lambda connection, row: {'type': row.type}),
+    Location: ('location', lambda connection, row: {'name': row.name}),
+    Category: ('category', lambda connection, row: {'name': row.name}),
+    Term: ('terms', lambda connection, row: {'name': row.name}),
+    Rule: ('rules', lambda connection, row: {'name': row.name}),
+    Note: ('notes', lambda connection, row: {
+        'rule': referenced_name(connection, Rule.__table__.c.name, row.rule_id),
+        'created_on': row.created_on}),
+    Table: ('tables', lambda connection, row: {'name': row.name}),
+    Column: ('columns', lambda connection, row: {
+        'table': referenced_name(connection, Table.__table__.c.name, row.table_id),
+        'name': row.name}),
+    Document: ('documents', lambda connection, row: {'name': row.name}),
+    Link: ('links', lambda connection, row: {'text': row.text})
+}
+
+
+def bury(section, make_key):
+    '''Return a listener recording a tombstone for each deleted row of a model'''
+    def after_delete(mapper, connection, target):
+        connection.execute(Tombstone.__table__.insert().values(
+            section=section,
+            key=json.dumps(make_key(connection, target), default=dump_datetime),
+            deleted_on=datetime.datetime.utcnow()))
+    return after_delete
+
+
+for model, (section, make_key) in TOMBSTONED.items():
+    listens_for(model, 'after_delete')(bury(section, make_key))
+
+
+class Change(db.Model):
+    '''
+    A change to the glossary, recorded in the order it was flushed for the
+    consumers following the change feed. The key of a row is its id, or the
+    ids it relates for the rows of association tables.
+    '''
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(40), nullable=False)
+    operation = db.Column(db.String(10), nullable=False)
+    key = db.Column(db.Text, nullable=False)
+    changed_on = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
+
+
+# The models whose changes are recorded in the change log
+LOGGED = (Term, Rule, Note, Link, Document, Column)
+
+# The association tables whose changes are recorded in the change log
+LOGGED_ASSOCIATIONS = (term_category_relationship, document_types_relationship,
+                       term_column_relationship, term_document_relationship,
+                       term_rule_relationship, rule_document_relationship,
+                       term_to_term_relationship)
+
+# Everything was replaced without the ORM, as by a bulk load or restore
+RELOAD = 'reload'
+
+# The key in session.info of the last operation the transaction logged on
+# each row
+LOGGED_CHANGES = 'logged_changes'
+
+
+def insert_changes(connection, rows):
+    '''
+    Insert rows into the change log. Consumers page through the log by id,
+    and a transaction may take its ids before another that commits first, so
+    a consumer could read past a change that is committed after the page was
+    read. The revision row is locked first, so transactions recording changes
+    take their ids and commit one at a time. SQLite writes one transaction at
+    a time already.
+    '''
+    if connection.dialect.name != 'sqlite':
+        connection.execute(select([Revision.id]).where(Revision.id == 1).with_for_update())
+    connection.execute(Change.__table__.insert(), rows)
+
+
+def record_changes(connection, entity, operation, keys):
+    '''
+    Record changes made without the ORM in the change log
+
+    :param entity: The table changed
+    :param operation: insert, update, delete or reload
+    :param keys: The key of each row changed
+    '''
+    now = datetime.datetime.utcnow()
+    rows = [{'entity': entity, 'operation': operation,
+             'key': json.dumps(key, sort_keys=True), 'changed_on': now} for key in keys]
+    if rows:
+        insert_changes(connection, rows)
+
+
+def record_reload(connection):
+    '''Record that the glossary was loaded in bulk, so consumers read it again'''
+    record_changes(connection, 'glossary', RELOAD, [{}])
+
+
+def association_key(relationship, obj, member):
+    '''Return the key of the association row relating two instances'''
+    key = {}
+    for column, association_column in relationship.synchronize_pairs:
+        key[association_column.name] = getattr(obj, column.key)
+    for column, association_column in relationship.secondary_synchronize_pairs:
+        key[association_column.name] = getattr(member, column.key)
+    return key
+
+
+@listens_for(db.session, 'after_flush')
+def log_changes(session, flush_context):
+    '''
+    Record the rows of the logged models and associations a flush inserted,
+    updated or deleted. The association rows of a deleted row are recorded
+    as deleted where they were loaded to be deleted with it.
+    '''
+    changes = []
+    logged = session.info.setdefault(LOGGED_CHANGES, {})
+
+    def change(entity, operation, key):
+        '''
+        Note a change once, however many sides of a relationship and flushes
+        of the transaction show it. A row is logged again when the operation
+        on it changes, such as an association added, removed and added again.
+        '''
+        key = json.dumps(key, sort_keys=True)
+        if logged.get((entity, key)) != operation:
+            logged[(entity, key)] = operation
+            changes.append((entity, operation, key))
+
+    for operation, objects in (('insert', session.new), ('update', session.dirty),
+                               ('delete', session.deleted)):
+        for obj in objects:
+            if not isinstance(obj, LOGGED):
+                continue
+            if operation != 'update' or session.is_modified(obj, include_collections=False):
+                change(obj.__table__.name, operation, {'id': obj.id})
+
+            state = inspect(obj)
+            for relationship in state.mapper.relationships:
+                if relationship.secondary not in LOGGED_ASSOCIATIONS:
+                    continue
+                history = state.attrs[relationship.key].history
+                if operation == 'delete':
+                    added, deleted = (), itertools.chain(history.unchanged or (),
+                                                         history.deleted or ())
+                else:
+                    added, deleted = history.added or (), history.deleted or ()
+                for member in added:
+                    change(relationship.secondary.name, 'insert',
+                           association_key(relationship, obj, member))
+                for member in deleted:
+                    change(relationship.secondary.name, 'delete',
+                           association_key(relationship, obj, member))
+
+    if changes:
+        now = datetime.datetime.utcnow()
+        insert_changes(session.connection(),
+                       [{'entity': entity, 'operation': operation, 'key': key,
+                         'changed_on': now} for entity, operation, key in changes])
+
+
+@listens_for(db.session, 'after_commit')
+@listens_for(db.session, 'after_rollback')
+def forget_logged_changes(session):
+    '''Start noting the changes logged afresh with each transaction'''
+    session.info.pop(LOGGED_CHANGES, None)
+
+
+def keep_name_key(target, value, oldvalue, initiator):
+    '''Set the name key of a term or rule as its name is set'''
+    target.name_key = name_key(value)
+
+
+listens_for(Term.name, 'set')(keep_name_key)
+listens_for(Rule.name, 'set')(keep_name_key)
+
+
 @listens_for(Document, 'after_delete')
 def del_file(mapper, connection, target):
     '''Delete hooks for models, delete files if models are getting deleted'''
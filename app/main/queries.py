@@ -0,0 +1,237 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''Read-only queries shared by the glossary views'''
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import aliased, joinedload, subqueryload
+
+from app.extensions import db
+from app.main.models import Term, Person, Category, Location, Table, Column, \
+    term_column_relationship, term_rule_relationship, name_key
+
+
+def association_count(association, label):
+    '''
+    Return a subquery counting the rows of an association table per term
+
+    :param association: A term association table with a term_id column
+    :param label: The name to give the count column
+    '''
+    return db.session.query(association.c.term_id.label('term_id'),
+                            func.count().label(label)) \
+        .group_by(association.c.term_id) \
+        .subquery()
+
+
+def glossary_listing():
+    '''
+    Return the query behind the glossary list of terms.
+
+    Each row holds the Term along with its column_count and rule_count. The
+    owner and categories are eager loaded and the counts come from aggregated
+    subqueries so the listing costs the same number of queries whatever the
+    size of the glossary.
+    '''
+    column_counts = association_count(term_column_relationship, 'column_count')
+    rule_counts = association_count(term_rule_relationship, 'rule_count')
+
+    return db.session.query(Term,
+                            func.coalesce(column_counts.c.column_count, 0).label('column_count'),
+                            func.coalesce(rule_counts.c.rule_count, 0).label('rule_count')) \
+        .outerjoin(column_counts, column_counts.c.term_id == Term.id) \
+        .outerjoin(rule_counts, rule_counts.c.term_id == Term.id) \
+        .options(joinedload(Term.owner), subqueryload(Term.categories)) \
+        .order_by(Term.name)
+
+
+def filter_glossary(query, search):
+    '''
+    Restrict a term query to terms whose name, short description, owner or
+    category contains the search text
+
+    :param query: A query selecting Term
+    :param search: The text to search for
+    '''
+    pattern = '%' + search + '%'
+    return query.filter(or_(Term.name.ilike(pattern),
+                            Term.short_description.ilike(pattern),
+                            Term.owner.has(Person.name.ilike(pattern)),
+                            Term.categories.any(Category.name.ilike(pattern))))
+
+
+def glossary_page(start, length, search=None, order_column=0, descending=False):
+    '''
+    Return one page of the glossary list of terms for a server-side table.
+
+    Returns a tuple of the total number of terms, the number of terms matching
+    the search and the rows of the requested page as per glossary_listing().
+
+    :param start: The offset of the first term on the page
+    :param length: The maximum number of terms on the page
+    :param search: Optional text to filter the terms by
+    :param order_column: The table column to order by; 0 name, 1 short
+                         description, 2 owner
+    :param descending: Order descending rather than ascending
+    '''
+    total = db.session.query(func.count(Term.id)).scalar()
+
+    query = glossary_listing().order_by(None)
+    if search:
+        query = filter_glossary(query, search)
+        filtered = filter_glossary(db.session.query(func.count(Term.id)), search).scalar()
+    else:
+        filtered = total
+
+    if order_column == 2:
+        owner = aliased(Person)
+        query = query.outerjoin(owner, Term.owner_id == owner.id)
+        sort_key = owner.name
+    elif order_column == 1:
+        sort_key = Term.short_description
+    else:
+        sort_key = Term.name
+
+    if descending:
+        query = query.order_by(sort_key.desc(), Term.id.desc())
+    else:
+        query = query.order_by(sort_key, Term.id)
+
+    return total, filtered, query.offset(start).limit(length).all()
+
+
+def prefix_range(expression, prefix):
+    '''
+    Return the criteria matching values of an expression starting with the
+    prefix as a range, so an index on the expression can be used
+
+    :param expression: A lower case column expression
+    :param prefix: The lower case prefix to match
+    '''
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return [expression >= prefix, expression < upper]
+
+
+def column_prefix_matches(prefix, limit):
+    '''
+    Return the id, column, table and location names of the columns whose name
+    starts with the prefix, ignoring case, in a single query
+
+    :param prefix: The start of the column name
+    :param limit: The maximum number of columns to return
+    '''
+    if not prefix:
+        return []
+    name = func.lower(Column.name)
+    return db.session.query(Column.id,
+                            Column.name.label('column'),
+                            Table.name.label('table'),
+                            Location.name.label('location')) \
+        .outerjoin(Table, Column.table_id == Table.id) \
+        .outerjoin(Location, Table.location_id == Location.id) \
+        .filter(*prefix_range(name, prefix.lower())) \
+        .order_by(name, Column.id) \
+        .limit(limit) \
+        .all()
+
+
+def term_prefix_matches(prefix, limit):
+    '''
+    Return the id and name of the terms whose name starts with the prefix,
+    ignoring case
+
+    :param prefix: The start of the term name
+    :param limit: The maximum number of terms to return
+    '''
+    if not prefix:
+        return []
+    return db.session.query(Term.id, Term.name) \
+        .filter(*prefix_range(Term.name_key, name_key(prefix))) \
+        .order_by(Term.name_key, Term.id) \
+        .limit(limit) \
+        .all()
+
+
+def child_count(parent_column, parent_id):
+    '''
+    Return a correlated count of the children of each row, which an index on
+    the parent column answers without reading the other rows
+
+    :param parent_column: The column of the children referring to the parent
+    :param parent_id: The id column of the parent
+    '''
+    return select([func.count()]).where(parent_column == parent_id).as_scalar()
+
+
+def page_of(query, offset, limit):
+    '''
+    Return a page of rows and whether there are more after it, reading one row
+    past the page rather than counting every row
+
+    :param query: The ordered query to page
+    :param offset: The number of rows before the page
+    :param limit: The maximum number of rows on the page
+    '''
+    rows = query.offset(offset).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+def location_nodes(offset, limit):
+    '''
+    Return a page of the id, name and table count of each location, ordered
+    by name, and whether there are more
+
+    :param offset: The number of locations before the page
+    :param limit: The maximum number of locations on the page
+    '''
+    query = db.session.query(Location.id, Location.name,
+                             child_count(Table.location_id, Location.id).label('count')) \
+        .order_by(Location.name, Location.id)
+    return page_of(query, offset, limit)
+
+
+def unlocated_table_count():
+    '''Return the number of tables without a location'''
+    return db.session.query(func.count(Table.id)).filter(Table.location_id == None).scalar()
+
+
+def table_nodes(location_id, offset, limit):
+    '''
+    Return a page of the id, name and column count of the tables in a
+    location, ordered by name, and whether there are more
+
+    :param location_id: The location of the tables, None for tables without one
+    :param offset: The number of tables before the page
+    :param limit: The maximum number of tables on the page
+    '''
+    query = db.session.query(Table.id, Table.name,
+                             child_count(Column.table_id, Table.id).label('count')) \
+        .filter(Table.location_id == location_id) \
+        .order_by(Table.name, Table.id)
+    return page_of(query, offset, limit)
+
+
+def column_nodes(table_id, offset, limit):
+    '''
+    Return a page of the id and name of the columns of a table, ordered by
+    name, and whether there are more
+
+    :param table_id: The table of the columns
+    :param offset: The number of columns before the page
+    :param limit: The maximum number of columns on the page
+    '''
+    query = db.session.query(Column.id, Column.name) \
+        .filter(Column.table_id == table_id) \
+        .order_by(Column.name, Column.id)
+    return page_of(query, offset, limit)
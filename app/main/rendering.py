@@ -0,0 +1,129 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''
+Markdown rendered when it is written rather than when it is shown.
+
+Each Markdown column has a column alongside it holding its HTML, set whenever
+the Markdown is set. Rows written without the ORM, or before the HTML columns
+were added, are rendered by `flask data render`.
+'''
+
+import logging
+import threading
+
+import markdown
+from markupsafe import Markup
+from sqlalchemy import select, bindparam
+from sqlalchemy.event import listens_for
+
+from app.extensions import db
+from app.main.models import Term, Rule, Note
+
+LOGGER = logging.getLogger("business-glossary.rendering")
+
+# The Markdown extensions used for glossary content
+EXTENSIONS = ['fenced_code', 'tables', 'abbr', 'footnotes']
+
+# The Markdown columns of each model and the columns their HTML is kept in
+RENDERED = {
+    Term: (('long_description', 'long_description_html'),),
+    Rule: (('description', 'description_html'), ('notes', 'notes_html')),
+    Note: (('note', 'note_html'),)
+}
+
+# Markdown instances keep state between conversions so each thread has its own
+LOCAL = threading.local()
+
+
+def render_markdown(text):
+    '''Render Markdown text to HTML'''
+    if text is None:
+        return None
+    converter = getattr(LOCAL, 'converter', None)
+    if converter is None:
+        converter = LOCAL.converter = markdown.Markdown(output_format='html5',
+                                                       extensions=EXTENSIONS)
+    return converter.reset().convert(text)
+
+
+def render_row(table, row):
+    '''Set the HTML columns of a row about to be inserted without the ORM'''
+    for model, columns in RENDERED.items():
+        if model.__table__ is table:
+            for source, html in columns:
+                row[html] = render_markdown(row.get(source))
+    return row
+
+
+def markdown_html(obj, field):
+    '''
+    Return the HTML of a Markdown field, a Jinja filter used as
+    {{ term|markdown_html('long_description') }}
+
+    Rows that have not been rendered yet are rendered as they are shown.
+    '''
+    html = getattr(obj, field + '_html')
+    if html is None:
+        html = render_markdown(getattr(obj, field)) or ''
+    return Markup(html)
+
+
+def keep_rendered(html):
+    '''Return a listener that renders a Markdown attribute as it is set'''
+    def render(target, value, oldvalue, initiator):
+        setattr(target, html, render_markdown(value))
+    return render
+
+
+for model, columns in RENDERED.items():
+    for source, html in columns:
+        listens_for(getattr(model, source), 'set')(keep_rendered(html))
+
+
+def backfill(everything=False, batch_size=1000):
+    '''
+    Render the Markdown of the rows that have no HTML and return how many
+    were rendered
+
+    :param everything: Render every row again, such as after the Markdown
+                       extensions are changed
+    :param batch_size: The number of rows rendered per transaction
+    '''
+    count = 0
+    for model, columns in RENDERED.items():
+        table = model.__table__
+        for source, html in columns:
+            # Rendering does not change what a row shows so updated_on is kept
+            values = {html: bindparam('rendered')}
+            if 'updated_on' in table.c:
+                values['updated_on'] = table.c.updated_on
+            update = table.update().where(table.c.id == bindparam('row_id')).values(values)
+
+            last = 0
+            while True:
+                query = select([table.c.id, table.c[source]]) \
+                    .where(table.c.id > last).where(table.c[source] != None)
+                if not everything:
+                    query = query.where(table.c[html] == None)
+                rows = db.session.execute(query.order_by(table.c.id).limit(batch_size)).fetchall()
+                if not rows:
+                    break
+                db.session.execute(update, [{'row_id': row_id, 'rendered': render_markdown(text)}
+                                            for row_id, text in rows])
+                db.session.commit()
+                last = rows[-1][0]
+                count += len(rows)
+            LOGGER.info("Rendered %s.%s", table.name, source)
+    return count
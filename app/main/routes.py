@@ -17,23 +17,27 @@ from os.path import dirname, join, isfile
 from datetime import datetime
 
 from flask import flash, redirect, url_for, render_template, request, \
-     send_from_directory, send_file
+     send_from_directory, send_file, jsonify, Response, stream_with_context
 from flask import current_app
 
 from flask_flatpages import pygments_style_defs
 from flask_security import current_user, login_required, roles_required
 from flask_security.utils import encrypt_password
 from flask_flatpages import FlatPages
-from sqlalchemy import func
-from app import models
+from app import fragments, models
+from app import pdf_cache
+from app import search as search_index
 from app.config import BASE_DIR
+from app.jobs import runner as job_runner
+from app.jobs.models import Job, QUEUED, RUNNING
 from app.main.forms import RegistrationForm
+from app.main.queries import glossary_page
 from app.extensions import db, pages
 from . import main
 
 from app.main.models import Document, DocumentType, Term, TermStatus, \
     Category, Person, Link, Location, Table, \
-    Column, Rule, Note
+    Column, Rule, Note, current_revision, name_key
 
 from app.users.models import User
 
@@ -84,8 +88,45 @@ def about():
 @login_required
 def glossary():
     '''Display the glossary main list of terms'''
-    glossary = models.Term.query.order_by(Term.name).all()
-    return render_template('show_glossary.html', glossary=glossary)
+    return render_template('show_glossary.html')
+
+
+@main.route('/glossary/data')
+@login_required
+def glossary_data():
+    '''
+    Serve one page of the glossary main list of terms to a server-side
+    DataTable. Paging, ordering and searching are all done by the database.
+    '''
+    draw = request.args.get('draw', 0, type=int)
+    start = max(request.args.get('start', 0, type=int), 0)
+    length = request.args.get('length', current_app.config['TERMS_PER_PAGE'], type=int)
+    if length < 1 or length > current_app.config['TERMS_PER_PAGE_MAX']:
+        length = current_app.config['TERMS_PER_PAGE_MAX']
+    search = request.args.get('search[value]', '').strip()
+    order_column = request.args.get('order[0][column]', 0, type=int)
+    descending = request.args.get('order[0][dir]') == 'desc'
+
+    total, filtered, rows = glossary_page(start, length, search, order_column, descending)
+
+    data = []
+    for term, column_count, rule_count in rows:
+        data.append({
+            'id': term.id,
+            'name': term.name,
+            'url': url_for('main.show_term', selected_term=term.id),
+            'short_description': term.short_description,
+            'owner': term.owner.name if term.owner else None,
+            'categories': [{'name': category.name,
+                            'url': url_for('main.show_terms', selected_category=category.id)}
+                           for category in term.categories],
+            'column_count': column_count,
+            'assets_url': url_for('main.show_assets', selected_term=term.id),
+            'rule_count': rule_count,
+            'rules_url': url_for('main.show_rules', selected_term=term.id)
+        })
+
+    return jsonify(draw=draw, recordsTotal=total, recordsFiltered=filtered, data=data)
 
 
 @main.route('/glossary_rules/')
@@ -131,45 +172,61 @@ def show_backup():
 @main.route('/do_backup/', methods=['POST'])
 @login_required
 def do_backup():
-    from app.loader import dump_yaml
+    '''Queue a YAML dump of all glossary data'''
     import time
     timestr = time.strftime("%Y%m%d-%H%M%S")
     filename = "bg_export_" + timestr + ".yml"
-    dump_yaml.dump(join(dirname(BASE_DIR), 'bg_interface', filename))
-    return render_template('backup/do_backup.html', 
-                           filename=filename,
-                           function='Backup',
-                           title='Backup Business Glossary Data')
+    job_id = job_runner.submit('backup', filename)
+    return redirect(url_for('jobs.show_job', job_id=job_id))
 
 
 @main.route('/do_column_association_export/', methods=['POST'])
 @login_required
 def do_column_association_export():
+    '''Queue an export of term to column associations'''
+    import time
+    timestr = time.strftime("%Y%m%d-%H%M%S")
+    filename = "bg_column_associations_" + timestr + ".csv"
+    job_id = job_runner.submit('export', filename)
+    return redirect(url_for('jobs.show_job', job_id=job_id))
+
+
+@main.route('/column_associations.csv')
+@login_required
+def column_associations_csv():
+    '''Stream the term to column associations as CSV as they are read'''
     from app.loader import export
     import time
     timestr = time.strftime("%Y%m%d-%H%M%S")
     filename = "bg_column_associations_" + timestr + ".csv"
-    export.export(join(dirname(BASE_DIR), 'bg_interface', filename))
-    return render_template('backup/do_backup.html', 
-                           filename=filename,
-                           function='Export',
-                           title='Column Associations Export')
+    return Response(stream_with_context(export.csv_chunks(export.get_column_associations())),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=%s' % filename})
 
 
 @main.route('/generate_pdf/', methods=['POST'])
 @login_required
 def do_print():
     '''
-    Generate a PDF of all glossary content
+    Download a PDF of all glossary content from the PDF cache, or queue it if
+    the glossary has changed since it was last printed
     '''
+    from app.print import select_terms
     categories = request.form.getlist("category")
 
-    from app.print import generate_pdf
-    import time
-    timestr = time.strftime("%Y%m%d-%H%M%S")
-    filename = "glossary_" + timestr + ".pdf"
-    generate_pdf(filename, categories)
-    return render_template('print/print_finished.html', filename=filename)
+    filename = pdf_cache.cache_name(current_revision(),
+                                    [term.id for term in select_terms(categories)],
+                                    categories, current_user.id)
+    if pdf_cache.lookup(filename):
+        return redirect(url_for('main.download', selected_filename=filename))
+
+    # Follow the job already printing this PDF rather than print it twice, as
+    # long as it is live rather than left behind by a process that stopped
+    jobs = Job.query.filter(Job.kind == 'pdf', Job.filename == filename,
+                            Job.status.in_((QUEUED, RUNNING))).order_by(Job.id.desc())
+    job = next((job for job in jobs if job_runner.live(job)), None)
+    job_id = job.id if job else job_runner.submit('pdf', filename, categories)
+    return redirect(url_for('jobs.show_job', job_id=job_id))
 
 
 @main.route('/download/<string:selected_filename>/')
@@ -208,16 +265,23 @@ def show_terms(selected_category=None, selected_status=None):
 def show_term(selected_term=None, selected_term_name=None):
 
     if selected_term is None:
-        term = Term.query.filter(func.lower(Term.name) == func.lower(selected_term_name)).first()
-        if not term:
-            return render_template('errors/404.html')
-        else:
-            return render_template('show_term.html',
-                                   term=Term.query.filter(func.lower(Term.name) == \
-                                                          func.lower(selected_term_name)).first())
+        term = Term.query.filter_by(name_key=name_key(selected_term_name)).first()
     else:
-        return render_template('show_term.html',
-                               term=Term.query.filter_by(id=selected_term).first())
+        term = Term.query.filter_by(id=selected_term).first()
+    if not term:
+        return render_template('errors/404.html')
+
+    # The body of the page is cached until the term or anything shown with it
+    # changes, separately for those who can and cannot edit it. The revision
+    # is part of the key, read before the body is rendered, so a body rendered
+    # from rows that changed while it was rendered is stored under a revision
+    # no later request asks for, even if it is stored after the change removed
+    # the term's fragments.
+    body = fragments.cached(fragments.term_group(term.id),
+                            '%s:%s:%s' % (current_revision(), term.updated_on,
+                                          current_user.is_active),
+                            lambda: render_template('_term_body.html', term=term))
+    return render_template('show_term.html', term=term, body=body)
 
 
 @main.route('/documents/<int:selected_term>')
@@ -256,15 +320,13 @@ def show_rules(selected_term):
 def show_rule(selected_rule=None, selected_rule_name=None):
 
     if selected_rule is None:
-        rule = Rule.query.filter(func.lower(Rule.name) == func.lower(selected_rule_name)).first()
-        if not rule:
-            return render_template('errors/404.html')
-        else:
-            return render_template('show_rule.html', rule=rule)
-
+        rule = Rule.query.filter_by(name_key=name_key(selected_rule_name)).first()
     else:
         rule = Rule.query.filter_by(id=selected_rule).first()
-        return render_template('show_rule.html', rule=rule)
+    if not rule:
+        return render_template('errors/404.html')
+
+    return render_template('show_rule.html', rule=rule)
 
 
 @main.route('/rule/documents/<int:selected_rule>')
@@ -331,21 +393,8 @@ def show_table_columns(selected_table):
 @login_required
 def search():
     if request.method == "POST":
-        search = request.form['search']
-
-        from sqlalchemy import or_
-
-        terms = Term.query.filter(or_(Term.name.ilike('%' + str(search) + '%'),
-                                      Term.short_description.ilike('%' + str(search) + '%'),
-                                      Term.long_description.ilike('%' + str(search) + '%'),
-                                      Term.abbreviation.ilike('%' + str(search) + '%'))).all()
-        columns = Column.query.filter(Column.name.ilike('%' + str(search) + '%')).all()
-        rules = Rule.query.filter(or_(Rule.identifier.ilike('%' + str(search) + '%'),
-                                      Rule.name.ilike('%' + str(search) + '%'),
-                                      Rule.description.ilike('%' + str(search) + '%'),
-                                      Rule.notes.ilike('%' + str(search) + '%'))).all()
-
-        return render_template("results.html", terms=terms, columns=columns, rules=rules)
+        results = search_index.search(request.form['search'])
+        return render_template("results.html", **results)
     return render_template('search.html')
 
 
@@ -355,7 +404,8 @@ def full_glossary():
     '''
     Produce a PDF of the full glossary.
     '''
-    terms = Term.query.order_by(Term.name).all()
+    from app.print import print_query
+    terms = print_query().order_by(Term.name).all()
     return render_template('print/full_glossary.html', terms=terms)
 
 
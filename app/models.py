@@ -13,4 +13,5 @@
 #   under the License.
 
 from app.main.models import *
-from app.users.models import *
\ No newline at end of file
+from app.users.models import *
+from app.jobs.models import *
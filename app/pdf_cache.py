@@ -0,0 +1,117 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''
+A cache of printed PDFs in bg_interface.
+
+Each PDF is named after the revision of the glossary it was printed from and
+a digest of the terms, categories and user it was printed for, so printing an
+unchanged glossary again finds the PDF already there. Any change to the
+glossary moves the revision on. PDFs of earlier revisions are removed when the
+next PDF is added, as are the least recently used PDFs once the cache holds
+more than PDF_CACHE_SIZE bytes.
+'''
+
+import hashlib
+import json
+import logging
+import os
+import re
+
+from flask import current_app
+
+from app.config import BASE_DIR
+
+LOGGER = logging.getLogger("business-glossary.pdf_cache")
+
+PREFIX = 'glossary_cache_'
+
+CACHE_NAME = re.compile(r'^%s(\d+)_[0-9a-f]+\.pdf$' % PREFIX)
+
+
+def cache_directory():
+    '''Return the directory PDFs are cached in'''
+    return os.path.join(os.path.dirname(BASE_DIR), 'bg_interface')
+
+
+def cache_name(revision, term_ids, categories=None, user_id=None):
+    '''
+    Return the name of the PDF of some terms
+
+    :param revision: The revision of the glossary
+    :param term_ids: The ids of the terms printed, in the order printed
+    :param categories: The ids of the categories selected
+    :param user_id: The user the PDF is printed for, who is named in it
+    '''
+    key = json.dumps([sorted(int(category) for category in categories or []),
+                      list(term_ids), user_id])
+    return '%s%s_%s.pdf' % (PREFIX, revision, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+
+def lookup(filename):
+    '''Return True if a PDF is cached, marking it as recently used'''
+    path = os.path.join(cache_directory(), filename)
+    try:
+        os.utime(path, None)
+    except OSError:
+        return False
+    LOGGER.info("Serving %s from the cache", filename)
+    return True
+
+
+def entries():
+    '''Return the (revision, last used, size, path) of each cached PDF'''
+    directory = cache_directory()
+    cached = []
+    for filename in os.listdir(directory):
+        match = CACHE_NAME.match(filename)
+        if match:
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            cached.append((int(match.group(1)), stat.st_mtime, stat.st_size, path))
+    return cached
+
+
+def evict(keep):
+    '''
+    Remove PDFs of earlier revisions than the one just added and then the
+    least recently used until the cache fits in PDF_CACHE_SIZE
+
+    :param keep: The name of the PDF just added, which is never removed
+    '''
+    match = CACHE_NAME.match(keep)
+    if not match:
+        return
+    revision = int(match.group(1))
+    keep = os.path.join(cache_directory(), keep)
+    limit = current_app.config['PDF_CACHE_SIZE']
+
+    cached = sorted(entry for entry in entries() if entry[3] != keep)
+    total = sum(size for _, _, size, _ in cached)
+    if os.path.isfile(keep):
+        total += os.path.getsize(keep)
+
+    # Oldest revision first, then least recently used
+    for entry_revision, _, size, path in cached:
+        if entry_revision >= revision and total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        LOGGER.info("Removed %s from the cache", os.path.basename(path))
+        total -= size
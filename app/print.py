@@ -14,12 +14,31 @@
 #   License for the specific language governing permissions and limitations
 #   under the License.
 
+import logging
 import os
+import shutil
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pdfkit
-from flask import render_template, Response, send_from_directory
+from flask import render_template, current_app
+from sqlalchemy.orm import subqueryload
+
 from app.config import BASE_DIR
-from app.main.models import Term, Category
+from app.main.models import Term, Category, Column, Table, Rule
+
+# The chunks are merged with the PyPDF2 1.x API. Later releases still have
+# its names but raise when they are used, so they are treated as missing.
+try:
+    import PyPDF2
+    from PyPDF2 import PdfFileReader, PdfFileWriter
+    if not PyPDF2.__version__.startswith('1.'):
+        PdfFileWriter = None
+except ImportError:
+    PdfFileWriter = None
+
+LOGGER = logging.getLogger("business-glossary.print")
 
 #########################################################################################
 ##                                                                                     ##
@@ -27,30 +46,9 @@ from app.main.models import Term, Category
 ##                                                                                     ##
 #########################################################################################
 
-def generate_pdf(filename, categories):
-    '''
-    Dump all glossary content
-    '''
-
-    pdf_directory = os.path.join(BASE_DIR, 'app', 'static', 'files')
-
-    # Add wkhtmltopdf directory to path
-    path = os.getenv("PATH")
-    if "wkhtmltopdf" not in path:
-        os.environ["PATH"] += os.pathsep + 'C:/Program Files/wkhtmltopdf/bin'
-
-    if categories:
-        print("Categories requested: %s" % categories)
-        terms = Term.query.join(Term.categories).filter(Category.id.in_(categories)).order_by(Term.name).all()
-        cats = Category.query.filter(Category.id.in_(categories)).all()
-        print(terms)
-    else:
-        #terms = Term.query.order_by(Term.name).limit(10).all()
-        cats = None
-        terms = Term.query.order_by(Term.name).all()
-
-    html_text = render_template('print/glossary_print.html', terms=terms, categories=cats)
 
+def pdf_options(footer_right='Page [page] of [topage]', outline=False):
+    '''Return the wkhtmltopdf options for glossary pages'''
     options = {
         'page-size': 'A4',
         'dpi': 300,
@@ -65,20 +63,170 @@ def generate_pdf(filename, categories):
         'header-font-size': '8',
         'header-spacing': '10',
         'footer-left': '{}'.format(time.strftime("%d/%m/%Y %I:%M %p").lower()),
-        'footer-right': 'Page [page] of [topage]',
+        'footer-right': footer_right,
         'footer-font-name': 'Roboto',
         'footer-font-size': '8',
         'footer-spacing': '10',
-        'no-outline': None
     }
+    if outline:
+        # Bookmark each term so its page can be found when the chunks are merged
+        options['outline-depth'] = 1
+    else:
+        options['no-outline'] = None
+    return options
+
+
+def print_query():
+    '''Return a query of terms with everything the print template shows loaded'''
+    return Term.query.options(subqueryload(Term.related_terms),
+                              subqueryload(Term.documents),
+                              subqueryload(Term.rules).subqueryload(Rule.listed_comments),
+                              subqueryload(Term.columns).joinedload(Column.table)
+                              .joinedload(Table.location))
+
+
+def select_terms(categories):
+    '''Return the (id, name) of the terms to print in name order'''
+    query = Term.query.with_entities(Term.id, Term.name)
+    if categories:
+        query = query.join(Term.categories).filter(Category.id.in_(categories)).distinct()
+    return query.order_by(Term.name, Term.id).all()
+
+
+def chunk_terms(terms, size):
+    '''Split terms in name order into alphabetical ranges of up to size terms'''
+    return [terms[index:index + size] for index in range(0, len(terms), size)]
+
+
+def chunk_label(chunk):
+    '''Return the alphabetical range of a chunk of terms, such as A - C'''
+    first = (chunk[0].name or '?')[:1].upper()
+    last = (chunk[-1].name or '?')[:1].upper()
+    return first if first == last else '%s - %s' % (first, last)
+
+
+def render_terms(path, term_ids, **context):
+    '''Render the print template for some terms to an HTML file'''
+    terms = print_query().filter(Term.id.in_(term_ids)).order_by(Term.name, Term.id).all() \
+        if term_ids else []
+    html_text = render_template('print/glossary_print.html', terms=terms, **context)
+    with open(path, 'w', encoding='utf-8') as html_file:
+        html_file.write(html_text)
+
+
+def outline_pages(reader):
+    '''Return the (title, page) of each top level bookmark of a PDF'''
+    pages = []
+    for item in reader.getOutlines():
+        if not isinstance(item, list):
+            pages.append((item.title, reader.getDestinationPageNumber(item)))
+    return pages
+
+
+def generate_pdf(filename, categories, user=None, progress=None):
+    '''
+    Dump all glossary content
+
+    Large glossaries are rendered in chunks of PDF_CHUNK_SIZE terms, each an
+    alphabetical range converted by its own wkhtmltopdf process with up to
+    PDF_WORKERS running at once. The chunks are then merged behind a table of
+    contents. Merging needs PyPDF2 1.x; without it the glossary is rendered
+    in a single pass.
+
+    :param user: The user the report is generated for when not generated
+                 within a request from that user
+    :param progress: Called with the percentage done and a message as chunks
+                     are converted
+    '''
+
+    # Add wkhtmltopdf directory to path
+    path = os.getenv("PATH")
+    if "wkhtmltopdf" not in path:
+        os.environ["PATH"] += os.pathsep + 'C:/Program Files/wkhtmltopdf/bin'
+
+    if categories:
+        LOGGER.info("Categories requested: %s", categories)
+        cats = Category.query.filter(Category.id.in_(categories)).all()
+    else:
+        cats = None
+    terms = select_terms(categories)
+
+    context = {'current_user': user} if user is not None else {}
 
     css = os.path.join(BASE_DIR, 'app', 'static', 'css', 'print_style.css')
     cover = os.path.join(BASE_DIR, 'app', 'templates', 'print', 'cover_page.html')
 
     directory = os.path.join(os.path.dirname(BASE_DIR), 'bg_interface')
+    target = os.path.join(directory, filename)
+
+    chunk_size = current_app.config['PDF_CHUNK_SIZE']
+    chunks = chunk_terms(terms, chunk_size)
+
+    # The PDF is written to the work directory and moved into place when
+    # complete so a partly written PDF is never downloaded
+    work = tempfile.mkdtemp(dir=directory)
+    output = os.path.join(work, 'glossary.pdf')
+    pdf_files = []
+    try:
+        if len(chunks) <= 1 or PdfFileWriter is None:
+            if len(chunks) > 1:
+                LOGGER.info("PyPDF2 1.x is not installed so the PDF is rendered in one pass")
+            html_path = os.path.join(work, 'glossary.html')
+            render_terms(html_path, [term.id for term in terms], categories=cats, **context)
+            pdfkit.from_file(html_path, output, options=pdf_options(), css=css, cover=cover)
+            os.replace(output, target)
+            return
+
+        labels = [chunk_label(chunk) for chunk in chunks]
+        chunk_paths = [os.path.join(work, 'chunk%04d.pdf' % index) for index in range(len(chunks))]
+
+        # Each chunk is rendered to HTML here, where the database and
+        # templates are, and converted by a wkhtmltopdf process while the next
+        # chunk is rendered. Chunks number their pages within their range.
+        with ThreadPoolExecutor(max_workers=current_app.config['PDF_WORKERS'] or
+                                os.cpu_count()) as pool:
+            futures = []
+            for index, chunk in enumerate(chunks):
+                html_path = os.path.join(work, 'chunk%04d.html' % index)
+                render_terms(html_path, [term.id for term in chunk],
+                             categories=cats if index == 0 else None, **context)
+                options = pdf_options('%s page [page] of [topage]' % labels[index], outline=True)
+                futures.append(pool.submit(pdfkit.from_file, html_path, chunk_paths[index],
+                                           options=options, css=css))
+
+            for done, future in enumerate(futures, 1):
+                future.result()
+                if progress:
+                    progress(done * 90 // len(futures),
+                             "Converted %s of %s sections" % (done, len(futures)))
+
+        # The readers read pages from their files until the merged PDF is written
+        pdf_files = [open(chunk_path, 'rb') for chunk_path in chunk_paths]
+        readers = [PdfFileReader(pdf_file) for pdf_file in pdf_files]
+        sections = [(label, outline_pages(reader)) for label, reader in zip(labels, readers)]
+
+        contents_path = os.path.join(work, 'contents.html')
+        with open(contents_path, 'w', encoding='utf-8') as html_file:
+            html_file.write(render_template('print/glossary_contents.html', sections=sections))
+        contents_pdf = os.path.join(work, 'contents.pdf')
+        pdfkit.from_file(contents_path, contents_pdf, options=pdf_options('Contents'),
+                         css=css, cover=cover)
 
-    pdfkit.from_string(html_text, \
-                       os.path.join(directory, filename), \
-                       options=options, \
-                       css=css, \
-                       cover=cover)
+        writer = PdfFileWriter()
+        pdf_files.append(open(contents_pdf, 'rb'))
+        for page in PdfFileReader(pdf_files[-1]).pages:
+            writer.addPage(page)
+        for reader, (label, pages) in zip(readers, sections):
+            start = writer.getNumPages()
+            for page in reader.pages:
+                writer.addPage(page)
+            parent = writer.addBookmark(label, start)
+            for title, page in pages:
+                writer.addBookmark(title, start + page, parent)
+        with open(output, 'wb') as pdf_file:
+            writer.write(pdf_file)
+        os.replace(output, target)
+    finally:
+        for pdf_file in pdf_files:
+            pdf_file.close()
+        shutil.rmtree(work, ignore_errors=True)
@@ -0,0 +1,184 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''
+Full-text search over terms, rules and columns.
+
+The index is kept by a pluggable backend chosen with the SEARCH_BACKEND
+setting, or from the database dialect when it is not set. The index is
+maintained by mapper events as rows are flushed and can be rebuilt with
+`flask data reindex`. Indexes held in the database are changed in the
+transaction that changes the rows, while the changes to indexes held
+elsewhere are noted as rows are flushed and applied once they are committed.
+'''
+
+import logging
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.event import listens_for
+from sqlalchemy.orm import joinedload, object_session
+
+from app.extensions import db
+from app.main.models import Term, Rule, Column, Table
+from app.search.backends import LikeBackend, SqliteFtsBackend, PostgresFtsBackend
+from app.search.memory import MemoryBackend
+from app.search.documents import MODEL_KINDS, document_for, iter_documents
+
+LOGGER = logging.getLogger("business-glossary.search")
+
+BACKENDS = {
+    'like': LikeBackend,
+    'sqlite': SqliteFtsBackend,
+    'postgres': PostgresFtsBackend,
+    'memory': MemoryBackend
+}
+
+# The backend used for each database dialect when none is configured
+DIALECT_BACKENDS = {
+    'sqlite': 'sqlite',
+    'postgresql': 'postgres'
+}
+
+# The key in session.info of the documents a commit adds to or removes from
+# an index not held in the database, None for those removed
+PENDING = 'pending_search_documents'
+
+
+def init_app(app):
+    '''Choose the search backend for the application and create its index'''
+    with app.app_context():
+        name = app.config.get('SEARCH_BACKEND') or \
+            DIALECT_BACKENDS.get(db.engine.dialect.name, 'like')
+        backend = BACKENDS[name].from_config(app.config)
+        app.extensions['search'] = backend
+
+        connection = db.session.connection()
+        backend.create(connection)
+        if backend.is_empty(connection):
+            rebuild(backend)
+        db.session.commit()
+
+
+def get_backend():
+    '''Return the search backend of the current application'''
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('search')
+
+
+def rebuild(backend=None):
+    '''Rebuild the search index from the database'''
+    backend = backend or get_backend()
+    connection = db.session.connection()
+    backend.clear(connection)
+    count = 0
+    for documents in iter_documents(connection):
+        backend.add(connection, documents)
+        count += len(documents)
+    backend.save(connection)
+    LOGGER.info("Indexed %s documents with the %s search backend", count, backend.name)
+    return count
+
+
+def ordered(model, ids, *options):
+    '''Load instances of a model by id keeping the order of the ids'''
+    if not ids:
+        return []
+    found = dict((obj.id, obj) for obj in model.query.options(*options).filter(model.id.in_(ids)))
+    return [found[ref_id] for ref_id in ids if ref_id in found]
+
+
+def search(query, limit=None):
+    '''
+    Return a dict of the terms, rules and columns matching the query, best
+    matches first
+    '''
+    backend = get_backend()
+    limit = limit or current_app.config['SEARCH_RESULTS_LIMIT']
+    connection = db.session.connection()
+    return {
+        'terms': ordered(Term, backend.search(connection, query, 'term', limit)),
+        'rules': ordered(Rule, backend.search(connection, query, 'rule', limit)),
+        'columns': ordered(Column, backend.search(connection, query, 'column', limit),
+                           joinedload(Column.table).joinedload(Table.location))
+    }
+
+
+def index_document(mapper, connection, target):
+    '''Add an inserted or updated term, rule or column to the search index'''
+    backend = get_backend()
+    if backend is None:
+        return
+    document = document_for(target)
+    if backend.transactional:
+        backend.add(connection, [document])
+    else:
+        pending(target)[document[:2]] = document
+
+
+def unindex_document(mapper, connection, target):
+    '''Remove a deleted term, rule or column from the search index'''
+    backend = get_backend()
+    if backend is None:
+        return
+    key = (MODEL_KINDS[type(target)], target.id)
+    if backend.transactional:
+        backend.remove(connection, [key])
+    else:
+        pending(target)[key] = None
+
+
+def pending(target):
+    '''Return the documents the session of an instance is to change when it commits'''
+    return object_session(target).info.setdefault(PENDING, {})
+
+
+@listens_for(db.session, 'after_commit')
+def apply_pending_documents(session):
+    '''Apply the changes to the documents just committed to the index'''
+    documents = session.info.pop(PENDING, None)
+    backend = get_backend()
+    if not documents or backend is None:
+        return
+    backend.remove(None, [key for key, document in documents.items() if document is None])
+    backend.add(None, [document for document in documents.values() if document is not None])
+
+
+@listens_for(db.session, 'after_rollback')
+def forget_pending_documents(session):
+    '''Forget the changes to the documents that were rolled back'''
+    session.info.pop(PENDING, None)
+
+
+for model in MODEL_KINDS:
+    event.listen(model, 'after_insert', index_document)
+    event.listen(model, 'after_update', index_document)
+    event.listen(model, 'after_delete', unindex_document)
+
+
+@listens_for(db.metadata, 'after_create')
+def create_search_index(target, connection, **kw):
+    '''Create the search index alongside the tables'''
+    backend = get_backend()
+    if backend is not None:
+        backend.create(connection)
+
+
+@listens_for(db.metadata, 'before_drop')
+def drop_search_index(target, connection, **kw):
+    '''Drop the search index along with the tables'''
+    backend = get_backend()
+    if backend is not None:
+        backend.drop(connection)
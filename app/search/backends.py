@@ -0,0 +1,193 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''Search index backends'''
+
+from sqlalchemy import select, or_, text
+
+from app.search.documents import INDEXED, KIND_CODES, KIND_COUNT, document_key, tokenize
+
+
+class SearchBackend(object):
+    '''
+    Base class of the search index backends.
+
+    Documents are (kind, id, title, body) tuples where kind is one of 'term',
+    'rule' or 'column'. Every method is given the connection to work with so
+    an index held in the database is maintained in the same transaction as the
+    rows it indexes.
+
+    Backends whose index is not held in the database are not transactional,
+    and are given the changes of a transaction only once it commits.
+    '''
+    name = None
+    transactional = True
+
+    @classmethod
+    def from_config(cls, config):
+        '''Create the backend from the application configuration'''
+        return cls()
+
+    def create(self, connection):
+        '''Create the index structures if they do not exist'''
+
+    def drop(self, connection):
+        '''Drop the index structures'''
+
+    def clear(self, connection):
+        '''Remove every document from the index'''
+
+    def is_empty(self, connection):
+        '''Return True if the index holds no documents'''
+        return True
+
+    def add(self, connection, documents):
+        '''Add or replace documents in the index'''
+
+    def remove(self, connection, keys):
+        '''Remove documents given as (kind, id) tuples from the index'''
+
+    def search(self, connection, query, kind, limit):
+        '''Return the ids of the documents of a kind matching the query, best first'''
+        raise NotImplementedError
+
+    def save(self, connection):
+        '''Persist the index after it has been rebuilt'''
+
+
+class LikeBackend(SearchBackend):
+    '''
+    Unindexed substring matching with LIKE. Used for databases without a
+    supported full-text engine.
+    '''
+    name = 'like'
+
+    def search(self, connection, query, kind, limit):
+        model, title_fields, body_fields = INDEXED[kind]
+        table = model.__table__
+        pattern = '%' + query + '%'
+        statement = select([table.c.id]) \
+            .where(or_(*[table.c[field].ilike(pattern) for field in title_fields + body_fields])) \
+            .order_by(table.c.id) \
+            .limit(limit)
+        return [row[0] for row in connection.execute(statement)]
+
+
+class SqliteFtsBackend(SearchBackend):
+    '''
+    SQLite FTS5 index ranked by bm25. The rowid of the index holds the document
+    key so documents are replaced and removed by rowid.
+    '''
+    name = 'sqlite'
+
+    def create(self, connection):
+        connection.execute(text('CREATE VIRTUAL TABLE IF NOT EXISTS search_index '
+                                'USING fts5(title, body)'))
+
+    def drop(self, connection):
+        connection.execute(text('DROP TABLE IF EXISTS search_index'))
+
+    def clear(self, connection):
+        connection.execute(text('DELETE FROM search_index'))
+
+    def is_empty(self, connection):
+        return connection.execute(text('SELECT 1 FROM search_index LIMIT 1')).scalar() is None
+
+    def add(self, connection, documents):
+        rows = [{'key': document_key(kind, ref_id), 'title': title, 'body': body}
+                for kind, ref_id, title, body in documents]
+        if not rows:
+            return
+        connection.execute(text('DELETE FROM search_index WHERE rowid = :key'), rows)
+        connection.execute(text('INSERT INTO search_index (rowid, title, body) '
+                                'VALUES (:key, :title, :body)'), rows)
+
+    def remove(self, connection, keys):
+        rows = [{'key': document_key(kind, ref_id)} for kind, ref_id in keys]
+        if rows:
+            connection.execute(text('DELETE FROM search_index WHERE rowid = :key'), rows)
+
+    def search(self, connection, query, kind, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = ' '.join('"%s"*' % token for token in tokens)
+        statement = text('SELECT rowid FROM search_index '
+                         'WHERE search_index MATCH :match AND rowid % :count = :code '
+                         'ORDER BY bm25(search_index, 10.0, 1.0) '
+                         'LIMIT :limit')
+        result = connection.execute(statement, match=match, count=KIND_COUNT,
+                                    code=KIND_CODES[kind], limit=limit)
+        return [row[0] // KIND_COUNT for row in result]
+
+
+class PostgresFtsBackend(SearchBackend):
+    '''
+    PostgreSQL tsvector index with a GIN index, ranked by ts_rank. Titles are
+    given a higher weight than bodies.
+    '''
+    name = 'postgres'
+
+    # The simple configuration does no stemming so identifiers and column
+    # names are matched as they are written.
+    config = 'simple'
+
+    def create(self, connection):
+        connection.execute(text('CREATE TABLE IF NOT EXISTS search_index ('
+                                'key BIGINT PRIMARY KEY, '
+                                'kind SMALLINT NOT NULL, '
+                                'document TSVECTOR NOT NULL)'))
+        connection.execute(text('CREATE INDEX IF NOT EXISTS ix_search_index_document '
+                                'ON search_index USING GIN (document)'))
+
+    def drop(self, connection):
+        connection.execute(text('DROP TABLE IF EXISTS search_index'))
+
+    def clear(self, connection):
+        connection.execute(text('TRUNCATE search_index'))
+
+    def is_empty(self, connection):
+        return connection.execute(text('SELECT 1 FROM search_index LIMIT 1')).scalar() is None
+
+    def add(self, connection, documents):
+        rows = [{'key': document_key(kind, ref_id), 'kind': KIND_CODES[kind],
+                 'title': title, 'body': body}
+                for kind, ref_id, title, body in documents]
+        if not rows:
+            return
+        statement = text("INSERT INTO search_index (key, kind, document) "
+                         "VALUES (:key, :kind, "
+                         "setweight(to_tsvector('%(config)s', :title), 'A') || "
+                         "setweight(to_tsvector('%(config)s', :body), 'B')) "
+                         "ON CONFLICT (key) DO UPDATE SET document = EXCLUDED.document"
+                         % {'config': self.config})
+        connection.execute(statement, rows)
+
+    def remove(self, connection, keys):
+        rows = [{'key': document_key(kind, ref_id)} for kind, ref_id in keys]
+        if rows:
+            connection.execute(text('DELETE FROM search_index WHERE key = :key'), rows)
+
+    def search(self, connection, query, kind, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        tsquery = ' & '.join('%s:*' % token for token in tokens)
+        statement = text("SELECT key FROM search_index "
+                         "WHERE kind = :code AND document @@ to_tsquery('%(config)s', :tsquery) "
+                         "ORDER BY ts_rank(document, to_tsquery('%(config)s', :tsquery)) DESC "
+                         "LIMIT :limit" % {'config': self.config})
+        result = connection.execute(statement, code=KIND_CODES[kind], tsquery=tsquery, limit=limit)
+        return [row[0] // KIND_COUNT for row in result]
+
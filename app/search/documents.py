@@ -0,0 +1,96 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''The glossary content that is indexed for searching'''
+
+import re
+
+from sqlalchemy import select
+
+from app.main.models import Term, Rule, Column
+
+# Each kind of searchable document with the model it comes from, the fields
+# that make up its title and the fields that make up its body. Title matches
+# rank above body matches.
+INDEXED = {
+    'term': (Term, ('name', 'abbreviation'), ('short_description', 'long_description')),
+    'rule': (Rule, ('identifier', 'name'), ('description', 'notes')),
+    'column': (Column, ('name',), ())
+}
+
+# Small integer codes used to pack the kind and key of a document into one
+# integer key for the index
+KIND_CODES = {
+    'term': 1,
+    'rule': 2,
+    'column': 3
+}
+
+KIND_COUNT = 4
+
+MODEL_KINDS = dict((model, kind) for kind, (model, _, _) in INDEXED.items())
+
+TOKEN_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def tokenize(text):
+    '''Split text into lower case word tokens'''
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+def document_key(kind, ref_id):
+    '''Return the single integer key of a document'''
+    return ref_id * KIND_COUNT + KIND_CODES[kind]
+
+
+def join_fields(values):
+    '''Join the non-empty field values of a document'''
+    return ' '.join(value for value in values if value)
+
+
+def document_for(obj):
+    '''
+    Return the (kind, id, title, body) document for a model instance or None if
+    the instance is not searchable
+    '''
+    kind = MODEL_KINDS.get(type(obj))
+    if kind is None:
+        return None
+    _, title_fields, body_fields = INDEXED[kind]
+    return (kind,
+            obj.id,
+            join_fields(getattr(obj, field) for field in title_fields),
+            join_fields(getattr(obj, field) for field in body_fields))
+
+
+def iter_documents(connection, batch_size=1000):
+    '''
+    Yield lists of (kind, id, title, body) documents for everything in the
+    database, reading each table in a single pass
+    '''
+    for kind, (model, title_fields, body_fields) in sorted(INDEXED.items()):
+        table = model.__table__
+        fields = [table.c.id] + [table.c[field] for field in title_fields + body_fields]
+        result = connection.execution_options(stream_results=True).execute(select(fields))
+        title_count = len(title_fields)
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [(kind,
+                    row[0],
+                    join_fields(row[1:1 + title_count]),
+                    join_fields(row[1 + title_count:])) for row in rows]
@@ -0,0 +1,227 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''In-process inverted index search backend'''
+
+import logging
+import math
+import os
+import pickle
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from sqlalchemy import select, func
+
+from app.search.backends import SearchBackend
+from app.search.documents import INDEXED, tokenize
+
+LOGGER = logging.getLogger("business-glossary.search")
+
+# A title token counts as this many body tokens
+TITLE_WEIGHT = 10
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+class InvertedIndex(object):
+    '''
+    An inverted index of the documents of one kind scored with BM25.
+
+    Each token maps to the weighted term frequency of the token in every
+    document containing it. A sorted vocabulary gives prefix matching.
+    '''
+
+    def __init__(self):
+        self.postings = {}
+        self.lengths = {}
+        self.tokens = {}
+        self.vocabulary = []
+        self.total_length = 0
+
+    def add(self, ref_id, title, body):
+        '''Add or replace a document'''
+        self.remove(ref_id)
+
+        counts = Counter()
+        for token in tokenize(title):
+            counts[token] += TITLE_WEIGHT
+        for token in tokenize(body):
+            counts[token] += 1
+
+        for token, frequency in counts.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                insort(self.vocabulary, token)
+            self.postings[token][ref_id] = frequency
+
+        length = sum(counts.values())
+        self.lengths[ref_id] = length
+        self.tokens[ref_id] = tuple(counts)
+        self.total_length += length
+
+    def remove(self, ref_id):
+        '''Remove a document if it is in the index'''
+        tokens = self.tokens.pop(ref_id, None)
+        if tokens is None:
+            return
+        for token in tokens:
+            documents = self.postings[token]
+            del documents[ref_id]
+            if not documents:
+                del self.postings[token]
+                del self.vocabulary[bisect_left(self.vocabulary, token)]
+        self.total_length -= self.lengths.pop(ref_id)
+
+    def expand(self, prefix):
+        '''Return the tokens in the vocabulary starting with the prefix'''
+        start = bisect_left(self.vocabulary, prefix)
+        end = start
+        while end < len(self.vocabulary) and self.vocabulary[end].startswith(prefix):
+            end += 1
+        return self.vocabulary[start:end]
+
+    def search(self, query, limit):
+        '''
+        Return the ids of the documents containing a token starting with each
+        word of the query, best BM25 score first
+        '''
+        words = tokenize(query)
+        if not words or not self.lengths:
+            return []
+
+        count = len(self.lengths)
+        average_length = float(self.total_length) / count
+        scores = None
+
+        for word in set(words):
+            word_scores = {}
+            for token in self.expand(word):
+                documents = self.postings[token]
+                idf = math.log(1 + (count - len(documents) + 0.5) / (len(documents) + 0.5))
+                for ref_id, frequency in documents.items():
+                    norm = K1 * (1 - B + B * self.lengths[ref_id] / average_length)
+                    word_scores[ref_id] = word_scores.get(ref_id, 0.0) + \
+                        idf * frequency * (K1 + 1) / (frequency + norm)
+
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = dict((ref_id, score + word_scores[ref_id])
+                              for ref_id, score in scores.items() if ref_id in word_scores)
+            if not scores:
+                return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [ref_id for ref_id, _ in ranked[:limit]]
+
+
+def fingerprint(connection):
+    '''
+    Return a summary of the indexed tables used to tell whether a snapshot
+    still matches the database: the row count and highest id of each table
+    and the latest update of the tables that record one.
+    '''
+    summary = []
+    for kind, (model, _, _) in sorted(INDEXED.items()):
+        table = model.__table__
+        columns = [func.count(table.c.id), func.max(table.c.id)]
+        if 'updated_on' in table.c:
+            columns.append(func.max(table.c.updated_on))
+        summary.append([str(value) for value in connection.execute(select(columns)).first()])
+    return summary
+
+
+class MemoryBackend(SearchBackend):
+    '''
+    Keeps the index in the memory of each process for deployments that cannot
+    rely on the full-text engine of their database.
+
+    Changes are applied as they are committed, so each process only sees the
+    changes made through it; a rebuild picks up changes made elsewhere. The
+    index can be saved to a snapshot file, a local cache written and read only
+    by the application, so that new worker processes start with a warm index
+    when the database has not changed since it was saved.
+    '''
+    name = 'memory'
+    transactional = False
+
+    def __init__(self, snapshot=None):
+        self.snapshot = snapshot
+        self.lock = threading.RLock()
+        self.indexes = dict((kind, InvertedIndex()) for kind in INDEXED)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(snapshot=config.get('SEARCH_SNAPSHOT'))
+
+    def create(self, connection):
+        if self.snapshot and self.is_empty(connection):
+            self.load(connection)
+
+    def drop(self, connection):
+        self.clear(connection)
+
+    def clear(self, connection):
+        with self.lock:
+            self.indexes = dict((kind, InvertedIndex()) for kind in INDEXED)
+
+    def is_empty(self, connection):
+        return not any(index.lengths for index in self.indexes.values())
+
+    def add(self, connection, documents):
+        with self.lock:
+            for kind, ref_id, title, body in documents:
+                self.indexes[kind].add(ref_id, title, body)
+
+    def remove(self, connection, keys):
+        with self.lock:
+            for kind, ref_id in keys:
+                self.indexes[kind].remove(ref_id)
+
+    def search(self, connection, query, kind, limit):
+        with self.lock:
+            return self.indexes[kind].search(query, limit)
+
+    def save(self, connection):
+        '''Write the index to the snapshot file'''
+        if not self.snapshot:
+            return
+        with self.lock:
+            state = {'fingerprint': fingerprint(connection), 'indexes': self.indexes}
+            temp_name = '%s.%s.tmp' % (self.snapshot, os.getpid())
+            with open(temp_name, 'wb') as snapshot_file:
+                pickle.dump(state, snapshot_file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_name, self.snapshot)
+        LOGGER.info("Saved search index snapshot %s", self.snapshot)
+
+    def load(self, connection):
+        '''Read the index from the snapshot file if it matches the database'''
+        if not os.path.isfile(self.snapshot):
+            return False
+        try:
+            with open(self.snapshot, 'rb') as snapshot_file:
+                state = pickle.load(snapshot_file)
+        except (OSError, EOFError, pickle.UnpicklingError) as ex:
+            LOGGER.warning("Could not read search index snapshot %s: %s", self.snapshot, ex)
+            return False
+        if state.get('fingerprint') != fingerprint(connection):
+            LOGGER.info("Search index snapshot %s is out of date", self.snapshot)
+            return False
+        with self.lock:
+            self.indexes = state['indexes']
+        LOGGER.info("Loaded search index snapshot %s", self.snapshot)
+        return True
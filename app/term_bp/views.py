@@ -1,16 +1,22 @@
+import hashlib
 import os
 
 from werkzeug.utils import secure_filename
 
-from flask import abort, flash, redirect, render_template, url_for, request, jsonify, send_from_directory, Response
+from flask import abort, flash, redirect, render_template, url_for, request, jsonify, send_from_directory, Response, \
+    current_app, json
 from flask_login import current_user, login_required
 
 from sqlalchemy import exc
 from app.term_bp.forms import TermForm, DocumentForm, RuleForm, LinkForm, RelatedTermForm, AssetForm, DemoForm
 from app.config import BASE_DIR
 from . import term_bp
+from app import fragments
 from app.extensions import db
-from app.models import Term, Document, Rule, Link, Table, Column
+from app.models import Term, Document, Rule, Link, Table, Column, current_revision
+from app.main.assignments import assign_columns, unassign_columns
+from app.main.queries import column_prefix_matches, term_prefix_matches, \
+    location_nodes, unlocated_table_count, table_nodes, column_nodes
 
 
 def check_admin():
@@ -134,69 +140,43 @@ def delete_term(id):
 
 @term_bp.route('/term/print/<int:term_id>')
 def print_report(term_id):
+    '''Download a PDF of a term, printing it if it is not in the PDF cache'''
 
     import pdfkit
-    import time
-
-    pdf_directory = os.path.join(BASE_DIR, 'app', 'static', 'files')
-    path = os.getenv("PATH")
-    if "wkhtmltopdf" not in path:
-        os.environ["PATH"] += os.pathsep + 'C:/Program Files/wkhtmltopdf/bin'
-
-    timestr = time.strftime("%Y%m%d-%H%M%S")
-    output_filename = "glossary_" + timestr + ".pdf"
-
-    print(">> Generating PDF for term %s" % term_id)
-    terms = Term.query.filter_by(id=term_id).all()
-    print(terms)
-
-    from flask import current_app
-
-    html_text = render_template('print/glossary_print.html', terms=terms)
-
-    options = {
-        'page-size': 'A4',
-        'dpi': 300,
-        'margin-top': '20mm',
-        'margin-right': '20mm',
-        'margin-bottom': '20mm',
-        'margin-left': '20mm',
-        'encoding': "UTF-8",
-        'header-left': "BOQ Credit Risk Analytics",
-        'header-right': "Term Definition",
-        'header-font-name': 'Roboto',
-        'header-font-size': '8',
-        'header-spacing': '10',
-        'footer-left': '{}'.format(time.strftime("%d/%m/%Y %I:%M %p").lower()),
-        'footer-right': 'Page [page] of [topage]',
-        'footer-font-name': 'Roboto',
-        'footer-font-size': '8',
-        'footer-spacing': '10',
-        'no-outline': None
-    }
-
-    css = os.path.join(BASE_DIR, 'app', 'static', 'css', 'print_style.css')
-    cover = os.path.join(BASE_DIR, 'app', 'templates', 'print', 'cover_page.html')
-    
-    print("css=%s" % css)
-    print("pdf_directory=%s" % pdf_directory)
+    import shutil
+    import tempfile
+    from app import pdf_cache
+    from app.print import pdf_options, render_terms
 
-    try:
-        pdfkit.from_string(html_text, os.path.join(pdf_directory, output_filename), options=options, css=css)
-    except IOError as ex:
-        print("An error has happened")
-        print("Error %s occured." % ex)
-        return render_template('errors/print_error.html',
-                               error=ex)
+    term = Term.query.get_or_404(term_id)
+    pdf_directory = pdf_cache.cache_directory()
+    output_filename = pdf_cache.cache_name(current_revision(), [term.id],
+                                           user_id=getattr(current_user, 'id', None))
+
+    if not pdf_cache.lookup(output_filename):
+        path = os.getenv("PATH")
+        if "wkhtmltopdf" not in path:
+            os.environ["PATH"] += os.pathsep + 'C:/Program Files/wkhtmltopdf/bin'
 
-    response = Response()
-    response.headers.add('Cache-Control', 'no-cache, no-store, must-revalidate')
-    response.headers.add('Pragma', 'no-cache')
-    response.headers.add('Content-Length', str(os.path.getsize(os.path.join(pdf_directory, output_filename))))
+        css = os.path.join(BASE_DIR, 'app', 'static', 'css', 'print_style.css')
+
+        work = tempfile.mkdtemp(dir=pdf_directory)
+        try:
+            html_path = os.path.join(work, 'term.html')
+            render_terms(html_path, [term.id])
+            pdfkit.from_file(html_path, os.path.join(work, 'term.pdf'),
+                             options=pdf_options(), css=css)
+            os.replace(os.path.join(work, 'term.pdf'),
+                       os.path.join(pdf_directory, output_filename))
+        except IOError as ex:
+            return render_template('errors/print_error.html',
+                                   error=ex)
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+        pdf_cache.evict(output_filename)
 
     return send_from_directory(directory=pdf_directory,
                                filename=output_filename,
-
                                as_attachment=True,
                                mimetype='application/pdf')
 
@@ -544,40 +524,79 @@ def add_asset_v1(term_id):
                            term=term)
 
 
-@term_bp.route('/assets/list/')
-@login_required
-def list_assets():
-    '''
-    List all assets by table and column.
+def parse_node(node):
     '''
+    Return the kind and id of an asset tree node, such as ('table', 12) for
+    'table:12'. The root is ('root', None) and the tables without a location
+    are under ('location', None).
 
-    tables = Table.query.limit(200)
-
-    if tables:
-
-        results = []
-
-        for table in tables:
-
-            tmp_table = {
-                'text' : table.name
-            }
-
-            tmp_table['nodes'] = []
-
-            for column in table.columns:
-
-                tmp_child = {
-                    'text': column.name
-                }
+    :param node: The node id passed by the asset picker
+    '''
+    if not node:
+        return 'root', None
+    kind, _, node_id = node.partition(':')
+    if kind == 'location' and node_id == 'none':
+        return kind, None
+    if kind in ('location', 'table') and node_id.isdigit():
+        return kind, int(node_id)
+    abort(404)
 
-                tmp_table['nodes'].append(tmp_child)
 
-            results.append(tmp_table)
+def asset_page(kind, node_id, offset, limit):
+    '''
+    Return a page of the children of an asset tree node
 
-    print(results)
+    :param kind: The kind of node, root, location or table
+    :param node_id: The id of the location or table
+    :param offset: The number of children before the page
+    :param limit: The maximum number of children on the page
+    '''
+    if kind == 'root':
+        rows, more = location_nodes(offset, limit)
+        nodes = [{'id': 'location:%s' % row.id, 'text': row.name, 'count': row.count}
+                 for row in rows]
+        if not more:
+            unlocated = unlocated_table_count()
+            if unlocated:
+                nodes.append({'id': 'location:none', 'text': 'No location', 'count': unlocated})
+    elif kind == 'location':
+        rows, more = table_nodes(node_id, offset, limit)
+        nodes = [{'id': 'table:%s' % row.id, 'text': row.name, 'count': row.count}
+                 for row in rows]
+    else:
+        rows, more = column_nodes(node_id, offset, limit)
+        nodes = [{'id': 'column:%s' % row.id, 'text': row.name} for row in rows]
+    return {'offset': offset, 'limit': limit, 'more': more, 'nodes': nodes}
+
+
+@term_bp.route('/assets/tree/')
+@term_bp.route('/assets/list/')
+@login_required
+def asset_tree():
+    '''
+    Return a page of the children of a node of the asset tree of locations,
+    tables and columns, for the asset picker to expand as it is browsed.
 
-    return jsonify(results)
+    The node is passed as node=location:<id> or node=table:<id>, the
+    locations being listed when it is left out. Pages are cached and tagged
+    with the glossary revision so unchanged pages are not sent again.
+    '''
+    kind, node_id = parse_node(request.args.get('node', ''))
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = requested_limit('ASSET_TREE_PAGE_SIZE')
+
+    key = '%s:%s:%s:%s:%s' % (current_revision(), kind, node_id, offset, limit)
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        page = fragments.cached('assets', key,
+                                lambda: json.dumps(asset_page(kind, node_id, offset, limit)))
+        response = Response(str(page), mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 
 @term_bp.route('/term/<int:term_id>/assets/v2')
@@ -586,29 +605,31 @@ def add_assets_v2(term_id):
     return render_template('admin/terms/assets_v2.html', term=term)
 
 
-@term_bp.route('/autocomplete', methods=['GET'])
-def autocomplete():
-    #current_app.config['SQLALCHEMY_ECHO'] = False
-
-    search = request.args.get('q')
-
-    print(">> %s" % search)
+def requested_limit(setting):
+    '''
+    Return the number of results requested, within the configured limit
 
-    query = Column.query.filter(Column.name.like('%' + str(search) + '%'))
+    :param setting: The configuration setting holding the limit
+    '''
+    maximum = current_app.config[setting]
+    limit = request.args.get('limit', maximum, type=int)
+    return limit if 0 < limit <= maximum else maximum
 
-    results = [mv.name for mv in query.all()]
 
-    # New attempt
+@term_bp.route('/autocomplete', methods=['GET'])
+def autocomplete():
+    '''Suggest columns, with their table and location, by the start of their name'''
+    search = request.args.get('q', '').strip()
 
     my_results = []
 
-    for column in query:
+    for column in column_prefix_matches(search, requested_limit('AUTOCOMPLETE_LIMIT')):
 
         tmp_table = {
             'id': column.id,
-            'location': column.table.location.name,
-            'table': column.table.name,
-            'column': column.name
+            'location': column.location,
+            'table': column.table,
+            'column': column.column
         }
 
         my_results.append(tmp_table)
@@ -616,6 +637,17 @@ def autocomplete():
     return jsonify(matching_results=my_results)
 
 
+@term_bp.route('/autocomplete/terms', methods=['GET'])
+def autocomplete_terms():
+    '''Suggest terms by the start of their name'''
+    search = request.args.get('q', '').strip()
+
+    results = [{'id': term.id, 'label': term.name, 'value': term.name}
+               for term in term_prefix_matches(search, requested_limit('AUTOCOMPLETE_LIMIT'))]
+
+    return jsonify(matching_results=results)
+
+
 @term_bp.route("/term/<int:term_id>/assets/v3", methods=["GET", "POST"])
 def add_assets_v3(term_id):
     '''Relate assets to a term'''
@@ -639,28 +671,50 @@ def add_assets_v3(term_id):
 @term_bp.route("/term/<int:term_id>/assets/v4", methods=["GET", "POST"])
 def add_assets_v4(term_id):
     '''Relate assets to a term'''
-
-    #app.config['SQLALCHEMY_ECHO'] = False
-
-    print("Grab term %s", term_id)
     term = Term.query.get_or_404(term_id)
 
     if request.method == "POST":
-        print("Form submitted")
+        assign_columns(term.id, request.form.getlist('do_assign', type=int))
 
-        selected = request.form.getlist('do_assign')
+        # Redirect to term page
+        return redirect(url_for('main.show_term', selected_term=term_id))
 
-        print("Loop through selected columns")
-        for selected_asset in selected:
+    return render_template("admin/terms/assets_v4.html", term=term)
 
-            print("Grab column %s" % selected_asset)
-            column = Column.query.filter_by(id=selected_asset).first()
 
-            # If the term exists the add the column to term relationship
-            term.columns.append(column)
-            db.session.commit()
+def requested_column_ids():
+    '''
+    Return the column ids posted as a JSON object such as {"columns": [1, 2]}
+    or as a form of do_assign fields
+    '''
+    if request.is_json:
+        column_ids = (request.get_json(silent=True) or {}).get('columns')
+        if not isinstance(column_ids, list) or \
+                not all(isinstance(column_id, int) for column_id in column_ids):
+            abort(400)
+        return column_ids
+    return request.form.getlist('do_assign', type=int)
 
-        # Redirect to term page
-        return redirect(url_for('main.show_term', selected_term=term_id))
 
-    return render_template("admin/terms/assets_v4.html", term=term)
+@term_bp.route("/term/<int:term_id>/assets/assign", methods=["POST"])
+@login_required
+def assign_assets(term_id):
+    '''
+    Relate many columns to a term at once and return the ids of the columns
+    assigned, already assigned and unknown as JSON
+    '''
+    check_admin()
+    term = Term.query.get_or_404(term_id)
+    return jsonify(assign_columns(term.id, requested_column_ids()))
+
+
+@term_bp.route("/term/<int:term_id>/assets/unassign", methods=["POST"])
+@login_required
+def unassign_assets(term_id):
+    '''
+    Remove many columns from a term at once and return the ids of the
+    columns removed and those that were not assigned as JSON
+    '''
+    check_admin()
+    term = Term.query.get_or_404(term_id)
+    return jsonify(unassign_columns(term.id, requested_column_ids()))
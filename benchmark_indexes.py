@@ -0,0 +1,143 @@
+#   Copyright 2017 Alan Tindale, All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+'''
+Show the query plans and timings of the hot lookups with and without the
+indexes on the lookup columns.
+
+A scratch SQLite database is filled with generated terms, tables and columns
+and each lookup is run as the application issues it, first with every
+secondary index dropped and then with the indexes the models declare.
+
+    python benchmark_indexes.py --terms 20000
+'''
+
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.main.models import Term, Rule, Location, Table, Column, \
+    term_column_relationship, term_rule_relationship, name_key
+import app.users.models
+import app.jobs.models
+
+
+def fill(engine, terms, tables, columns_per_table):
+    '''Fill the database with generated glossary rows'''
+    connection = engine.connect()
+    connection.execute(Location.__table__.insert(), [{'name': 'location_%s' % index}
+                                                     for index in range(10)])
+    connection.execute(Table.__table__.insert(), [{'name': 'table_%s' % index,
+                                                   'location_id': index % 10 + 1}
+                                                  for index in range(tables)])
+    connection.execute(Column.__table__.insert(), [{'name': 'column_%s' % index,
+                                                    'table_id': index // columns_per_table + 1}
+                                                   for index in range(tables * columns_per_table)])
+    connection.execute(Term.__table__.insert(), [{'name': 'Term %06d' % index,
+                                                  'name_key': 'term %06d' % index,
+                                                  'abbreviation': 'T%s' % index}
+                                                 for index in range(terms)])
+    connection.execute(Rule.__table__.insert(), [{'identifier': 'R%s' % index,
+                                                  'name': 'Rule %s' % index,
+                                                  'name_key': 'rule %s' % index}
+                                                 for index in range(terms // 4)])
+    column_count = tables * columns_per_table
+    connection.execute(term_column_relationship.insert(),
+                       [{'term_id': index % terms + 1, 'column_id': index % column_count + 1}
+                        for index in range(column_count)])
+    connection.execute(term_rule_relationship.insert(),
+                       [{'term_id': index * 4 + 1, 'rule_id': index + 1}
+                        for index in range(terms // 4)])
+    connection.close()
+
+
+def lookups(session, terms, tables):
+    '''Return the (name, query) of each lookup measured'''
+    term = session.query(Term).get(terms // 2)
+    table = session.query(Table).get(tables // 2)
+    column = session.query(Column).get(tables)
+    rule = session.query(Rule).get(terms // 8)
+    location = session.query(Location).get(5)
+    return [
+        ('show_term by name', session.query(Term).filter_by(name_key=name_key(term.name))),
+        ('show_rule by name', session.query(Rule).filter_by(name_key=name_key(rule.name))),
+        ('show_table_columns: columns of a table', table.columns),
+        ('show_location_details: tables of a location', location.tables),
+        ('export: terms in name order', session.query(Term).order_by(Term.name)),
+        ('column associations: terms of a column',
+         session.query(Term).with_parent(column, 'terms')),
+        ('rule page: terms of a rule', session.query(Term).with_parent(rule, 'terms')),
+        ('abbreviations', session.query(Term).filter(Term.abbreviation != "")
+         .order_by(Term.abbreviation))
+    ]
+
+
+def measure(session, query, repeat):
+    '''Return the query plan and the average milliseconds to run a query'''
+    statement = query.statement.compile(session.bind)
+    params = [statement.params[name] for name in statement.positiontup]
+    plan = session.connection().execute('EXPLAIN QUERY PLAN ' + str(statement), params).fetchall()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        query.all()
+    elapsed = (time.perf_counter() - start) * 1000 / repeat
+    return [row[-1] for row in plan], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the glossary lookup indexes')
+    parser.add_argument('--terms', type=int, default=20000)
+    parser.add_argument('--tables', type=int, default=2000)
+    parser.add_argument('--columns-per-table', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        engine = create_engine('sqlite:///' + path)
+        db.metadata.create_all(engine)
+        fill(engine, args.terms, args.tables, args.columns_per_table)
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes]
+
+        results = {}
+        for label in ('without indexes', 'with indexes'):
+            if label == 'without indexes':
+                for index in indexes:
+                    index.drop(engine)
+            else:
+                for index in indexes:
+                    index.create(engine)
+            engine.execute('ANALYZE')
+
+            session = Session(bind=engine)
+            for name, query in lookups(session, args.terms, args.tables):
+                results.setdefault(name, {})[label] = measure(session, query, args.repeat)
+            session.close()
+
+        for name, measured in results.items():
+            print(name)
+            for label, (plan, elapsed) in measured.items():
+                print('  %-16s %9.3f ms  %s' % (label, elapsed, ' / '.join(plan)))
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
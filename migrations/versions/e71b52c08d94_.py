@@ -0,0 +1,71 @@
+"""Index lookup columns
+
+Revision ID: e71b52c08d94
+Revises: c4e9a7d1f385
+Create Date: 2026-10-18 16:48:51.730166
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e71b52c08d94'
+down_revision = 'c4e9a7d1f385'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+INDEXES = [
+    ('ix_term_name', 'term', ['name']),
+    ('ix_term_abbreviation', 'term', ['abbreviation']),
+    ('ix_term_status_id', 'term', ['status_id']),
+    ('ix_rule_identifier', 'rule', ['identifier']),
+    ('ix_column_name', 'column', ['name']),
+    ('ix_column_table_id', 'column', ['table_id']),
+    ('ix_table_location_id', 'table', ['location_id']),
+    ('ix_link_term_id', 'link', ['term_id']),
+    ('ix_note_rule_id', 'note', ['rule_id']),
+    ('ix_term_category_relationship_category_id', 'term_category_relationship', ['category_id']),
+    ('ix_document_types_table_document_type_id', 'document_types_table', ['document_type_id']),
+    ('ix_term_column_relationship_column_id', 'term_column_relationship', ['column_id']),
+    ('ix_term_document_relationship_document_id', 'term_document_relationship', ['document_id']),
+    ('ix_term_rule_relationship_rule_id', 'term_rule_relationship', ['rule_id']),
+    ('ix_rule_document_relationship_document_id', 'rule_document_relationship', ['document_id']),
+    ('ix_term_to_term_relationship_related_term_id', 'term_to_term_relationship', ['related_term_id'])
+]
+
+# Case-insensitive name lookups, created where the database can index an expression
+LOWER_INDEXES = [
+    ('ix_term_name_lower', 'term'),
+    ('ix_column_name_lower', 'column'),
+    ('ix_rule_name_lower', 'rule')
+]
+
+EXPRESSION_DIALECTS = ('sqlite', 'postgresql')
+
+
+def existing_indexes(table):
+    '''Return the names of the indexes of a table, which databases created by
+    the application rather than by migrations already have'''
+    return set(index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table))
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        if name not in existing_indexes(table):
+            op.create_index(name, table, columns)
+
+    if op.get_bind().dialect.name in EXPRESSION_DIALECTS:
+        for name, table in LOWER_INDEXES:
+            if name not in existing_indexes(table):
+                op.create_index(name, table, [sa.text('lower(name)')])
+
+
+def downgrade():
+    if op.get_bind().dialect.name in EXPRESSION_DIALECTS:
+        for name, table in reversed(LOWER_INDEXES):
+            if name in existing_indexes(table):
+                op.drop_index(name, table_name=table)
+
+    for name, table, columns in reversed(INDEXES):
+        if name in existing_indexes(table):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,260 @@
+import json
+import unittest
+
+from sqlalchemy import event
+
+from app.core import create_app
+from app.models import db
+
+from app.main.models import Term, Rule, Location, Table, Column, Change, Category, Link, \
+    Person, TermStatus, record_reload
+
+
+def ordered(change):
+    '''Sort changes by their entity, operation and key'''
+    return json.dumps(change, sort_keys=True)
+
+
+class ApiTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('testing')
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        db.create_all()
+
+        self.client = self.app.test_client()
+        self.client.testing = True
+        self.client.post('/login', data={'email': 'admin@example.com', 'password': 'password'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _get_json(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.get_data(as_text=True))
+
+    def _changes(self, since=0):
+        data = self._get_json('/api/changes?since=%s' % since)
+        return data['cursor'], [(change['entity'], change['operation'], change['key'])
+                                for change in data['changes']]
+
+    def _add_glossary(self):
+        table = Table(name='account', location=Location(name='warehouse'))
+        self.column = Column(name='balance', table=table)
+        self.balance = Term(name='Balance', columns=[self.column])
+        self.limit = Term(name='Credit Limit')
+        self.rule = Rule(identifier='BR001', name='Limit check', terms=[self.limit])
+        db.session.add_all([table, self.balance, self.limit, self.rule])
+        db.session.commit()
+
+    def test_changes_recorded(self):
+        self._add_glossary()
+        cursor, changes = self._changes()
+        self.assertEqual(sorted(changes, key=ordered), sorted([
+            ('column', 'insert', {'id': self.column.id}),
+            ('term', 'insert', {'id': self.balance.id}),
+            ('term', 'insert', {'id': self.limit.id}),
+            ('rule', 'insert', {'id': self.rule.id}),
+            ('term_column_relationship', 'insert',
+             {'term_id': self.balance.id, 'column_id': self.column.id}),
+            ('term_rule_relationship', 'insert',
+             {'term_id': self.limit.id, 'rule_id': self.rule.id})], key=ordered))
+
+        self.limit.short_description = 'The most that can be borrowed'
+        self.limit.relate(self.balance)
+        db.session.commit()
+        cursor, changes = self._changes(cursor)
+        self.assertEqual(sorted(changes, key=ordered), sorted([
+            ('term', 'update', {'id': self.limit.id}),
+            ('term', 'update', {'id': self.balance.id}),
+            ('term_to_term_relationship', 'insert',
+             {'term_id': self.limit.id, 'related_term_id': self.balance.id}),
+            ('term_to_term_relationship', 'insert',
+             {'term_id': self.balance.id, 'related_term_id': self.limit.id})], key=ordered))
+
+        balance_id = self.balance.id
+        db.session.delete(self.balance)
+        db.session.commit()
+        cursor, changes = self._changes(cursor)
+        self.assertTrue(('term', 'delete', {'id': balance_id}) in changes)
+        self.assertTrue(('term_column_relationship', 'delete',
+                         {'term_id': balance_id, 'column_id': self.column.id}) in changes)
+
+        self.assertEqual(self._changes(cursor), (cursor, []))
+
+    def test_association_changed_back_and_forth(self):
+        self._add_glossary()
+        cursor, _ = self._changes()
+        category = Category(name='Lending')
+        db.session.add(category)
+        db.session.flush()
+        for _ in range(2):
+            self.limit.categories.append(category)
+            db.session.flush()
+            self.limit.categories.remove(category)
+            db.session.flush()
+        self.limit.categories.append(category)
+        db.session.commit()
+
+        cursor, changes = self._changes(cursor)
+        key = {'term_id': self.limit.id, 'category_id': category.id}
+        self.assertEqual([operation for entity, operation, change_key in changes
+                          if entity == 'term_category_relationship' and change_key == key],
+                         ['insert', 'delete', 'insert', 'delete', 'insert'])
+
+    def test_changes_without_the_orm(self):
+        self._add_glossary()
+        cursor, _ = self._changes()
+        column_id = self.column.id
+        response = self.client.post('/term/%s/assets/assign' % self.limit.id,
+                                    data=json.dumps({'columns': [column_id]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        cursor, changes = self._changes(cursor)
+        self.assertEqual(changes, [('term_column_relationship', 'insert',
+                                    {'term_id': self.limit.id, 'column_id': column_id})])
+
+        record_reload(db.session.connection())
+        db.session.commit()
+        cursor, changes = self._changes(cursor)
+        self.assertEqual(changes, [('glossary', 'reload', {})])
+
+    def test_changes_pages(self):
+        self._add_glossary()
+        total = Change.query.count()
+        seen = []
+        since = 0
+        while True:
+            data = self._get_json('/api/changes?since=%s&limit=4' % since)
+            self.assertTrue(len(data['changes']) <= 4)
+            seen.extend(change['id'] for change in data['changes'])
+            since = data['cursor']
+            if not data['more']:
+                break
+        self.assertEqual(len(seen), total)
+        self.assertEqual(seen, sorted(seen))
+
+        response = self.client.get('/api/changes?since=yesterday')
+        self.assertEqual(response.status_code, 400)
+
+    def test_changes_need_login(self):
+        self.client.get('/logout')
+        response = self.client.get('/api/changes')
+        self.assertNotEqual(response.status_code, 200)
+
+    def _add_terms(self, count):
+        status = TermStatus(status='Approved')
+        person = Person(name='Jo Bloggs')
+        category = Category(name='Finance')
+        table = Table(name='ledger', location=Location(name='warehouse'))
+        terms = []
+        for number in range(count):
+            column = Column(name='amount_%s' % number, table=table)
+            term = Term(name='Term %03d' % number, short_description='Term %s' % number,
+                        status=status, owner=person, steward=person, categories=[category],
+                        columns=[column])
+            term.links.append(Link(text='Source %s' % number, address='http://example.com'))
+            terms.append(term)
+        db.session.add_all(terms)
+        db.session.commit()
+        return [term.id for term in terms]
+
+    def _count_queries(self, path):
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            data = self._get_json(path)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        return data, len(statements)
+
+    def test_terms(self):
+        ids = self._add_terms(5)
+        data = self._get_json('/api/terms/%s?include=category,links,columns' % ids[0])['data']
+        self.assertEqual(data['name'], 'Term 000')
+        self.assertEqual(data['status'], 'Approved')
+        self.assertEqual(data['steward'], 'Jo Bloggs')
+        self.assertEqual(data['category'], [{'name': 'Finance', 'description': None}])
+        self.assertEqual(data['links'], [{'text': 'Source 0', 'address': 'http://example.com'}])
+        self.assertEqual(data['columns'][0]['name'], 'amount_0')
+        self.assertFalse('rules' in data)
+
+        data = self._get_json('/api/terms/%s?fields=name' % ids[1])['data']
+        self.assertEqual(data, {'id': ids[1], 'name': 'Term 001'})
+
+        response = self.client.get('/api/terms/%s?fields=colour' % ids[0])
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/terms/0')
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue('error' in json.loads(response.get_data(as_text=True)))
+
+    def test_terms_pages(self):
+        ids = self._add_terms(5)
+        seen = []
+        path = '/api/terms?fields=name&limit=2'
+        while True:
+            data = self._get_json(path)
+            self.assertTrue(len(data['data']) <= 2)
+            seen.extend(term['id'] for term in data['data'])
+            if not data['more']:
+                break
+            path = data['next']
+            self.assertTrue('fields=name' in path)
+        self.assertEqual(seen, ids)
+
+        response = self.client.get('/api/terms?after=last')
+        self.assertEqual(response.status_code, 400)
+
+    def test_terms_batch(self):
+        ids = self._add_terms(3)
+        data = self._get_json('/api/terms?fields=name&ids=%s,%s,0,%s' % (ids[2], ids[0], ids[2]))
+        self.assertEqual([term['id'] for term in data['data']], [ids[2], ids[0]])
+        self.assertEqual(data['missing'], [0])
+
+        response = self.client.get('/api/terms?ids=%s' % ','.join(str(i) for i in range(200)))
+        self.assertEqual(response.status_code, 400)
+
+    def test_terms_eager_loaded(self):
+        self._add_terms(30)
+        path = '/api/terms?include=category,links,columns,rules&limit=%s'
+        few, few_queries = self._count_queries(path % 3)
+        many, many_queries = self._count_queries(path % 30)
+        self.assertEqual(len(few['data']), 3)
+        self.assertEqual(len(many['data']), 30)
+        self.assertEqual(few_queries, many_queries)
+
+    def test_rules(self):
+        self._add_glossary()
+        data = self._get_json('/api/rules?include=terms')
+        self.assertEqual(data['data'], [{
+            'id': self.rule.id, 'identifier': 'BR001', 'name': 'Limit check',
+            'description': None, 'created_on': data['data'][0]['created_on'],
+            'updated_on': data['data'][0]['updated_on'],
+            'terms': [{'id': self.limit.id, 'name': 'Credit Limit'}]}])
+        self.assertFalse(data['more'])
+
+    def test_table_columns(self):
+        self._add_glossary()
+        table = self.column.table
+        data = self._get_json('/api/tables/%s/columns?include=terms' % table.id)
+        self.assertEqual(len(data['data']), 1)
+        column = data['data'][0]
+        self.assertEqual(column['table'], 'account')
+        self.assertEqual(column['location'], 'warehouse')
+        self.assertEqual(column['terms'], [{'id': self.balance.id, 'name': 'Balance'}])
+
+        response = self.client.get('/api/tables/0/columns')
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app.core import create_app
+from app.models import db, Term, Rule, Link, Note
+from app.fragments.backends import MemoryBackend, SqliteBackend
+from app.main import routes
+
+
+class FragmentTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('testing')
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        db.create_all()
+
+        self.client = self.app.test_client()
+        self.client.testing = True
+        self.client.post('/login', data={'email': 'admin@example.com', 'password': 'password'})
+
+        self.term = Term(name='Credit Limit', long_description='The most that can be borrowed')
+        self.related = Term(name='Balance', long_description='What is owed')
+        self.term.relate(self.related)
+        self.rule = Rule(identifier='CL1', name='Limit Review', description='Reviewed yearly',
+                         notes='Set by the credit team')
+        self.term.rules.append(self.rule)
+        db.session.add_all([self.term, self.related])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _page(self, term):
+        response = self.client.get('/term/%s' % term.id)
+        self.assertEqual(response.status_code, 200)
+        return response.get_data(as_text=True)
+
+    def test_term_body_is_cached(self):
+        self.assertTrue('The most that can be borrowed' in self._page(self.term))
+
+        # Written without the ORM or moving updated_on, so the cached page is still shown
+        table = Term.__table__
+        db.session.execute(table.update().values(short_description='Changed elsewhere',
+                                                 updated_on=table.c.updated_on))
+        db.session.commit()
+        self.assertFalse('Changed elsewhere' in self._page(self.term))
+
+        self.term.long_description = 'The least that can be borrowed'
+        db.session.commit()
+        page = self._page(self.term)
+        self.assertTrue('Changed elsewhere' in page)
+        self.assertTrue('The least that can be borrowed' in page)
+
+    def test_changes_shown_with_term(self):
+        self._page(self.term)
+
+        self.rule.description = 'Reviewed monthly'
+        db.session.commit()
+        self.assertTrue('Reviewed monthly' in self._page(self.term))
+
+        self.rule.comments.append(Note(note='Checked by the risk team'))
+        db.session.commit()
+        self.assertTrue('Checked by the risk team' in self._page(self.term))
+
+        db.session.add(Link(text='Policy', address='http://example.com', term_id=self.term.id))
+        db.session.commit()
+        self.assertTrue('http://example.com' in self._page(self.term))
+
+        self.related.name = 'Outstanding Balance'
+        db.session.commit()
+        self.assertTrue('Outstanding Balance' in self._page(self.term))
+
+    def test_change_committed_during_render(self):
+        render = routes.render_template
+        changed = []
+
+        def render_then_change(template, **context):
+            '''Render a template, committing a change to the rule once the body is rendered'''
+            html = render(template, **context)
+            if template == '_term_body.html' and not changed:
+                changed.append(template)
+                self.rule.description = 'Reviewed monthly'
+                db.session.commit()
+            return html
+
+        with mock.patch('app.main.routes.render_template', render_then_change):
+            self.assertTrue('Reviewed yearly' in self._page(self.term))
+        self.assertTrue('Reviewed monthly' in self._page(self.term))
+
+    def test_missing_term(self):
+        self.assertTrue('Page Not Found' in self.client.get('/term/99').get_data(as_text=True))
+
+
+class FragmentBackendTestCase(unittest.TestCase):
+
+    def test_memory_backend(self):
+        backend = MemoryBackend(size=2)
+        backend.set('term:1', 'a', 'one')
+        backend.set('term:2', 'a', 'two')
+        self.assertEqual(backend.get('term:1', 'a'), 'one')
+        backend.set('term:3', 'a', 'three')
+        self.assertIsNone(backend.get('term:2', 'a'))
+
+        backend.invalidate(['term:1'])
+        self.assertIsNone(backend.get('term:1', 'a'))
+        self.assertEqual(backend.get('term:3', 'a'), 'three')
+
+    def test_sqlite_backend(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'fragments.sqlite')
+        try:
+            backend = SqliteBackend(path, size=2)
+            backend.set('term:1', 'a', 'one')
+            backend.set('term:1', 'b', 'one for editors')
+            backend.set('term:2', 'a', 'two')
+            self.assertIsNone(backend.get('term:1', 'a'))
+
+            # Another process sees the same cache
+            other = SqliteBackend(path, size=2)
+            self.assertEqual(other.get('term:2', 'a'), 'two')
+            other.invalidate(['term:1', 'term:2'])
+            self.assertIsNone(backend.get('term:1', 'b'))
+            self.assertIsNone(backend.get('term:2', 'a'))
+            other.local.connection.close()
+            backend.local.connection.close()
+        finally:
+            for filename in os.listdir(directory):
+                os.remove(os.path.join(directory, filename))
+            os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import json
+import unittest
+
+from sqlalchemy import event
+
+from app.core import create_app
+from app.models import db
+
+from app.main.models import TermStatus, Term, Category, Person, Location, Table, Column, Rule
+
+
+class GlossaryTestCase(unittest.TestCase):
+
+    def _add_terms(self, count):
+        p = Person(name='Jo Black')
+        ts = TermStatus(status='Approved')
+        cat = Category(name='Credit', description='Credit terms')
+        l = Location(name='test location')
+        t = Table(name='test_table', location=l)
+        db.session.add_all([p, ts, cat, l, t])
+        for i in range(count):
+            term = Term(name='Term %03d' % i, short_description='Short %s' % i,
+                        owner=p, steward=p, status=ts, categories=[cat])
+            term.columns.append(Column(name='column_%s' % i, table=t))
+            term.rules.append(Rule(identifier='BR%03d' % i, name='Rule %s' % i))
+            db.session.add(term)
+        db.session.commit()
+
+    def _count_queries(self, path):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = db.get_engine(self.app)
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            response = self.client.get(path)
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        self.assertEqual(response.status_code, 200)
+        return len(statements), response
+
+    def setUp(self):
+        self.app = create_app('testing')
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        db.create_all()
+
+        self.client = self.app.test_client()
+        self.client.testing = True
+        self.client.post('/login', data={'email': 'admin@example.com', 'password': 'password'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_glossary_page(self):
+        response = self.client.get('/glossary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue('glossary/data' in response.get_data(as_text=True))
+
+    def test_glossary_data(self):
+        self._add_terms(3)
+        response = self.client.get('/glossary/data?draw=4&start=0&length=2')
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual(data['draw'], 4)
+        self.assertEqual(data['recordsTotal'], 3)
+        self.assertEqual(data['recordsFiltered'], 3)
+        self.assertEqual([row['name'] for row in data['data']], ['Term 000', 'Term 001'])
+        self.assertEqual(data['data'][0]['owner'], 'Jo Black')
+        self.assertEqual(data['data'][0]['categories'][0]['name'], 'Credit')
+        self.assertEqual(data['data'][0]['column_count'], 1)
+        self.assertEqual(data['data'][0]['rule_count'], 1)
+
+    def test_glossary_data_search_and_order(self):
+        self._add_terms(3)
+        response = self.client.get('/glossary/data?start=0&length=10&search[value]=Short 1')
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual(data['recordsFiltered'], 1)
+        self.assertEqual(data['data'][0]['name'], 'Term 001')
+
+        response = self.client.get('/glossary/data?start=1&length=10&order[0][column]=0&order[0][dir]=desc')
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual([row['name'] for row in data['data']], ['Term 001', 'Term 000'])
+
+        response = self.client.get('/glossary/data?length=10&search[value]=credit')
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual(data['recordsFiltered'], 3)
+
+    def test_glossary_query_count_is_constant(self):
+        self._add_terms(2)
+        small, _ = self._count_queries('/glossary/data?length=50')
+        for i in range(10):
+            term = Term(name='Extra %s' % i, owner=Person.query.first(),
+                        categories=[Category.query.first()])
+            db.session.add(term)
+        db.session.commit()
+        large, _ = self._count_queries('/glossary/data?length=50')
+        self.assertEqual(small, large)
+
+
+if __name__ == '__main__':
+    unittest.main()
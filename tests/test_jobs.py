@@ -0,0 +1,157 @@
+import datetime
+import json
+import os
+import unittest
+from os.path import dirname, join
+
+from app.core import create_app
+from app.config import BASE_DIR
+from app.models import db, Job, Term, Location, Table, Column
+from app.jobs import runner
+
+
+class JobTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('testing')
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        db.create_all()
+
+        self.client = self.app.test_client()
+        self.client.testing = True
+        self.client.post('/login', data={'email': 'admin@example.com', 'password': 'password'})
+        self.files = []
+
+    def tearDown(self):
+        for filename in self.files:
+            path = join(dirname(BASE_DIR), 'bg_interface', filename)
+            if os.path.isfile(path):
+                os.remove(path)
+        runner.TASKS.pop('failing', None)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _status(self, job_id):
+        response = self.client.get('/jobs/%s/status' % job_id)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.get_data(as_text=True))
+
+    def test_backup_job(self):
+        db.session.add(Term(name='Credit Limit'))
+        db.session.commit()
+
+        response = self.client.post('/do_backup/')
+        self.assertEqual(response.status_code, 302)
+        job = Job.query.one()
+        self.files.append(job.filename)
+        self.assertTrue(response.location.endswith('/jobs/%s' % job.id))
+
+        status = self._status(job.id)
+        self.assertEqual(status['status'], 'finished')
+        self.assertEqual(status['progress'], 100)
+        self.assertTrue(status['download'].endswith('/download/%s/' % job.filename))
+
+        response = self.client.get('/jobs/%s' % job.id)
+        self.assertTrue(job.filename in response.get_data(as_text=True))
+
+        response = self.client.get(status['download'])
+        self.assertTrue('Credit Limit' in response.get_data(as_text=True))
+
+    def test_failed_job(self):
+        @runner.task('failing')
+        def failing(job, message):
+            raise RuntimeError(message)
+
+        job_id = runner.submit('failing', 'nothing.txt', 'Out of paper')
+        status = self._status(job_id)
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(status['error'], 'Out of paper')
+
+    def test_threaded_job(self):
+        self.app.config['JOBS_SYNCHRONOUS'] = False
+        self.app.config['JOB_WORKERS'] = 1
+        runner.init_app(self.app)
+
+        with self.app.test_request_context():
+            job_id = runner.submit('backup', 'bg_export_threaded.yml')
+        self.files.append('bg_export_threaded.yml')
+
+        self.app.extensions['jobs'].shutdown(wait=True)
+        self.assertEqual(self._status(job_id)['status'], 'finished')
+
+    def _left_running(self, hours):
+        started = datetime.datetime.utcnow() - datetime.timedelta(hours=hours)
+        job = Job(kind='pdf', filename='glossary.pdf', status='running',
+                  created_on=started, started_on=started)
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+    def test_abandoned_job(self):
+        abandoned = self._left_running(hours=2)
+        recent = self._left_running(hours=0)
+
+        runner.init_app(self.app)
+        self.assertEqual(Job.query.get(abandoned).status, 'failed')
+        self.assertEqual(Job.query.get(abandoned).error, runner.ABANDONED)
+        self.assertEqual(Job.query.get(recent).status, 'running')
+
+        self.app.config['JOB_TIMEOUT'] = 0
+        status = self._status(recent)
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(status['error'], runner.ABANDONED)
+
+    def test_missing_job(self):
+        self.assertEqual(self.client.get('/jobs/99/status').status_code, 404)
+
+    def _add_associations(self):
+        location = Location(name='warehouse')
+        table = Table(name='customer', location=location)
+        db.session.add_all([
+            Term(name='Customer', columns=[Column(name='customer_id', table=table),
+                                           Column(name='name', table=table)]),
+            Term(name='Account', columns=[Column(name='account_id')]),
+            Term(name='Balance')])
+        db.session.commit()
+
+    def test_export_job(self):
+        self._add_associations()
+        self.client.post('/do_column_association_export/')
+        job = Job.query.one()
+        self.files.append(job.filename)
+        self.assertEqual(self._status(job.id)['status'], 'finished')
+
+        with open(join(dirname(BASE_DIR), 'bg_interface', job.filename)) as export_file:
+            self.assertEqual(export_file.read().splitlines(),
+                             ['term,table,column',
+                              'Account,,account_id',
+                              'Customer,warehouse.customer,customer_id',
+                              'Customer,warehouse.customer,name'])
+
+    def test_empty_export_job(self):
+        self.client.post('/do_column_association_export/')
+        job = Job.query.one()
+        self.files.append(job.filename)
+        self.assertEqual(self._status(job.id)['status'], 'finished')
+
+        with open(join(dirname(BASE_DIR), 'bg_interface', job.filename)) as export_file:
+            self.assertEqual(export_file.read().splitlines(), ['term,table,column'])
+
+    def test_streamed_export(self):
+        self._add_associations()
+        response = self.client.get('/column_associations.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.get_data(as_text=True).splitlines()[1:],
+                         ['Account,,account_id',
+                          'Customer,warehouse.customer,customer_id',
+                          'Customer,warehouse.customer,name'])
+
+
+if __name__ == '__main__':
+    unittest.main()
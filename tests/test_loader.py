@@ -0,0 +1,506 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import event
+
+from app.core import create_app
+from app.models import db
+from app import search
+from app.loader import load_yaml, dump_yaml, snapshot, scheduler, load_csv
+from app.loader.stream_yaml import read_sections
+
+from app.main.models import Term, Person, Category, Rule, Table, Column, Document, \
+    DocumentType, Link, Note, Backup, Location
+
+GLOSSARY = '''
+person:
+- name: Jo Black
+term_status:
+- status: Approved
+document_type:
+- type: Policy
+location:
+- name: warehouse
+category:
+- name: Credit
+terms:
+- name: Credit Limit
+  short_description: The most that can be borrowed
+  long_description: Applies to credit cards
+  abbreviation: CL
+  owner: Jo Black
+  steward: Jo Black
+  status: Approved
+  categories: [Credit, Lending]
+- name: Balance
+  short_description: The amount owed
+  long_description: ''
+  abbreviation: ''
+  owner: Jo Black
+  steward: Nobody
+  status: Approved
+  categories: [Credit]
+rules:
+- identifier: BR001
+  name: Limit check
+  description: Balance below limit
+  notes: ''
+  terms: [Credit Limit, Missing Term]
+tables:
+- name: account
+  location: warehouse
+  description: Accounts
+columns:
+- name: credit_limit
+  table: account
+  type: NUMBER
+  terms: [Credit Limit]
+- name: balance
+  table: account
+  terms: [Balance, Credit Limit]
+documents:
+- name: Lending policy
+  path: policy.pdf
+  description: The lending policy
+  types: [Policy, Guide]
+  terms: [Credit Limit]
+links:
+- text: Regulator
+  address: http://example.com
+  term: Credit Limit
+related_terms:
+- term: Credit Limit
+  related_terms: [Balance]
+- term: Balance
+  related_terms: [Credit Limit]
+notes:
+- note_type: Info
+  note: Reviewed
+  rule: Limit check
+'''
+
+
+INTERFACE_FILES = {
+    'bg_interface_status.csv': 'status\nApproved\nDraft\nApproved\n',
+    'bg_interface_category.csv': 'category,description\nCredit,Lending\n',
+    'bg_interface_person.csv': 'person\nJo Black\n',
+    'bg_interface_terms.csv':
+        'name,short_description,long_description,abbreviation,status,owner,steward\n'
+        'Credit Limit,The most that can be borrowed,Applies to *cards*,CL,Approved,Jo Black,'
+        'Nobody\n'
+        'Balance,The amount owed,,,Draft,Jo Black,Jo Black\n'
+        'credit limit,A duplicate,,,,,\n',
+    'bg_interface_categories.csv': 'term,category\nCredit Limit,Credit\nBalance,Missing\n',
+    'bg_interface_links.csv': 'text,address,term\nRegulator,http://example.com,Credit Limit\n',
+    'bg_interface_rules.csv': 'identifier,name,description,notes,term\n'
+                              'BR001,Limit check,Balance below limit,First\\nSecond,'
+                              'Credit Limit\n',
+    'bg_interface_locations.csv': 'name,host,description,path,notes\nwarehouse,db1,,,\n',
+    'bg_interface_table.csv': 'location,table,description\nwarehouse,account,Accounts\n'
+                              'warehouse,customer,Customers\n',
+    'bg_interface_column.csv': 'table,name,description,type,length,format\n'
+                               'account,credit_limit,,NUMBER,10,\n'
+                               'account,balance,,NUMBER,10,\n'
+                               'customer,balance,,NUMBER,10,\n'
+                               'missing,balance,,,,\n'
+                               'account,balance,,NUMBER,10,\n',
+    'bg_interface_columns_term.csv': 'table,name,term\n'
+                                     'account,credit_limit,Credit Limit\n'
+                                     'account,balance,Balance\n'
+                                     'account,balance,Balance\n'
+                                     'customer,balance,Nothing\n'
+}
+
+
+def reorder(text, *first):
+    '''Move the named sections of a glossary to the start of the file'''
+    sections = {}
+    name = None
+    for line in text.strip().splitlines():
+        if not line.startswith(('-', ' ')):
+            name = line.rstrip(':')
+            sections[name] = []
+        sections[name].append(line)
+    order = list(first) + [section for section in sections if section not in first]
+    return '\n'.join('\n'.join(sections[section]) for section in order) + '\n'
+
+
+class LoaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('testing')
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'glossary.yaml')
+        self._write(GLOSSARY)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.directory)
+
+    def _write(self, text):
+        with open(self.file_name, 'w') as glossary:
+            glossary.write(text)
+
+    def _counts(self):
+        return dict((model.__name__, model.query.count()) for model in
+                    (Term, Person, Category, Rule, Table, Column, Document, DocumentType,
+                     Link, Note))
+
+    def _check_loaded(self, notes=1):
+        self.assertEqual(self._counts(), {'Term': 2, 'Person': 1, 'Category': 2, 'Rule': 1,
+                                          'Table': 1, 'Column': 2, 'Document': 1,
+                                          'DocumentType': 2, 'Link': 1, 'Note': notes})
+        limit = Term.query.filter_by(name='Credit Limit').one()
+        balance = Term.query.filter_by(name='Balance').one()
+        self.assertEqual(limit.owner.name, 'Jo Black')
+        self.assertEqual(limit.status.status, 'Approved')
+        self.assertIsNone(balance.steward)
+        self.assertEqual(sorted(c.name for c in limit.categories), ['Credit', 'Lending'])
+        self.assertEqual([r.name for r in limit.rules], ['Limit check'])
+        self.assertEqual(sorted(c.name for c in limit.columns), ['balance', 'credit_limit'])
+        self.assertEqual([c.table.name for c in balance.columns], ['account'])
+        self.assertEqual([t.name for t in limit.related_terms], ['Balance'])
+        self.assertEqual([t.name for t in balance.related_terms], ['Credit Limit'])
+        self.assertEqual([d.name for d in limit.documents], ['Lending policy'])
+        self.assertEqual(limit.links[0].text, 'Regulator')
+        self.assertEqual(Rule.query.one().comments.first().note, 'Reviewed')
+        self.assertEqual(limit.long_description_html, '<p>Applies to credit cards</p>')
+        self.assertEqual(limit.name_key, 'credit limit')
+        self.assertEqual(Rule.query.one().name_key, 'limit check')
+        self.assertIsNotNone(limit.created_on)
+
+    def test_load(self):
+        load_yaml.load(self.file_name)
+        self._check_loaded()
+
+    def test_bulk_load(self):
+        load_yaml.load(self.file_name, bulk=True, batch_size=1)
+        self._check_loaded()
+        self.assertEqual(search.search('limit')['terms'][0].name, 'Credit Limit')
+
+    def test_bulk_load_skips_existing(self):
+        # Notes have no natural key so every load adds them again
+        load_yaml.load(self.file_name, bulk=True)
+        load_yaml.load(self.file_name, bulk=True)
+        self._check_loaded(notes=2)
+
+        load_yaml.load(self.file_name)
+        self._check_loaded(notes=3)
+
+    def test_sections_load_after_their_dependencies(self):
+        self._write(reorder(GLOSSARY, 'notes', 'columns', 'terms', 'tables', 'related_terms'))
+        load_yaml.load(self.file_name)
+        self._check_loaded()
+
+    def test_bulk_sections_load_after_their_dependencies(self):
+        self._write(reorder(GLOSSARY, 'columns', 'documents', 'rules'))
+        load_yaml.load(self.file_name, bulk=True)
+        self._check_loaded()
+
+    def test_incorrect_format(self):
+        self._write('- name: Jo Black\n')
+        load_yaml.load(self.file_name)
+        self.assertEqual(Person.query.count(), 0)
+
+    def test_dump_round_trip(self):
+        load_yaml.load(self.file_name)
+        dump_name = os.path.join(self.directory, 'dump.yaml')
+        dump_yaml.dump(dump_name, page_size=1)
+
+        with open(dump_name) as dumped:
+            text = dumped.read()
+        self.assertTrue('# Terms' in text)
+        self.assertTrue(text.index('tables:') < text.index('columns:'))
+
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        load_yaml.load(dump_name)
+        self._check_loaded()
+
+    def test_incremental_backup(self):
+        load_yaml.load(self.file_name)
+        base_name = os.path.join(self.directory, 'base.yaml')
+        delta_name = os.path.join(self.directory, 'delta.yaml')
+        overlap = dump_yaml.MARK_OVERLAP
+        dump_yaml.MARK_OVERLAP = datetime.timedelta(0)
+        try:
+            dump_yaml.dump(base_name)
+            since = dump_yaml.last_backup_mark()
+
+            limit = Term.query.filter_by(name='Credit Limit').one()
+            balance = Term.query.filter_by(name='Balance').one()
+            limit.short_description = 'The most that may be borrowed'
+            limit.unrelate(balance)
+            overdraft = Term(name='Overdraft', short_description='Borrowing on an account')
+            db.session.add(overdraft)
+            column = Column.query.filter_by(name='balance').one()
+            column.terms.append(overdraft)
+            db.session.delete(Link.query.one())
+            db.session.delete(Column.query.filter_by(name='credit_limit').one())
+            db.session.commit()
+
+            dump_yaml.dump(delta_name, since=since)
+            self.assertEqual(dump_yaml.last_backup_mark(),
+                             db.session.query(db.func.max(Backup.until)).scalar())
+        finally:
+            dump_yaml.MARK_OVERLAP = overlap
+
+        with open(delta_name) as dumped:
+            text = dumped.read()
+        self.assertTrue(text.index('deleted:') < text.index('terms:'))
+        self.assertTrue('Overdraft' in text)
+        self.assertFalse('Lending policy' in text)
+        self.assertFalse('Limit check' in text)
+
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        load_yaml.load(base_name)
+        load_yaml.load(delta_name, update=True)
+
+        limit = Term.query.filter_by(name='Credit Limit').one()
+        self.assertEqual(limit.short_description, 'The most that may be borrowed')
+        self.assertEqual(limit.related_terms, [])
+        self.assertEqual(Link.query.count(), 0)
+        self.assertEqual([c.name for c in Column.query], ['balance'])
+        self.assertEqual(sorted(t.name for t in Column.query.one().terms),
+                         ['Balance', 'Credit Limit', 'Overdraft'])
+        self.assertEqual([r.name for r in limit.rules], ['Limit check'])
+        self.assertEqual([d.name for d in limit.documents], ['Lending policy'])
+
+    def test_snapshot_round_trip(self):
+        load_yaml.load(self.file_name)
+        limit = Term.query.filter_by(name='Credit Limit').one()
+        related = sorted(t.name for t in limit.related_terms)
+        created_on = limit.created_on
+        snapshot_name = os.path.join(self.directory, 'snapshot')
+        snapshot.dump(snapshot_name, chunk_rows=1)
+        self.assertEqual(Backup.query.count(), 1)
+
+        self.assertRaises(ValueError, snapshot.load, snapshot_name)
+
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        snapshot.load(snapshot_name)
+        self._check_loaded()
+
+        limit = Term.query.filter_by(name='Credit Limit').one()
+        self.assertEqual(sorted(t.name for t in limit.related_terms), related)
+        self.assertEqual(limit.created_on, created_on)
+        self.assertEqual(limit.name_key, 'credit limit')
+        self.assertEqual(search.search('limit')['terms'][0].name, 'Credit Limit')
+
+    def test_snapshot_checksum(self):
+        load_yaml.load(self.file_name)
+        snapshot_name = os.path.join(self.directory, 'snapshot')
+        snapshot.dump(snapshot_name)
+        with open(os.path.join(snapshot_name, 'term.0000.jsonl.gz'), 'ab') as chunk:
+            chunk.write(b'\0')
+
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        self.assertRaises(ValueError, snapshot.load, snapshot_name)
+        self.assertEqual(Term.query.count(), 0)
+
+    def test_snapshot_parallel_restore(self):
+        load_yaml.load(self.file_name)
+        snapshot_name = os.path.join(self.directory, 'snapshot')
+        snapshot.dump(snapshot_name, chunk_rows=1)
+
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        messages = []
+        snapshot.load(snapshot_name, progress=lambda done, message: messages.append(done),
+                      workers=3)
+        self._check_loaded()
+        self.assertEqual(messages[-1], 100)
+        limit = Term.query.filter_by(name='Credit Limit').one()
+        self.assertEqual([t.name for t in limit.related_terms], ['Balance'])
+
+    def test_scheduler_order(self):
+        graph = scheduler.dependency_graph(snapshot.glossary_tables())
+        self.assertEqual(graph['term_to_term_relationship'], {'term'})
+        self.assertEqual(graph['person'], set())
+
+        graph = {'a': set(), 'b': {'a'}, 'c': {'a'}, 'd': {'b', 'c'}, 'e': {'d'}}
+        partitions = {'a': [1, 2], 'b': [1, 2, 3], 'c': [1], 'd': [1, 2]}
+        events = []
+
+        def work(node, partition):
+            events.append(('start', node))
+            events.append(('end', node))
+
+        finished = []
+        scheduler.run(graph, partitions, work, 3, finished.append)
+        self.assertEqual(sorted(finished), ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(finished[0], 'a')
+        self.assertEqual(finished[-2:], ['d', 'e'])
+        for node, depends_on in graph.items():
+            for dependency in depends_on:
+                last_end = max(i for i, event in enumerate(events) if event == ('end', dependency))
+                starts = [i for i, event in enumerate(events) if event == ('start', node)]
+                self.assertTrue(all(start > last_end for start in starts))
+
+    def test_scheduler_failure(self):
+        def work(node, partition):
+            if node == 'b':
+                raise RuntimeError('failed')
+
+        started = []
+        self.assertRaises(RuntimeError, scheduler.run, {'a': set(), 'b': set(), 'c': {'b'}},
+                          {'a': [1], 'b': [1], 'c': [1]},
+                          lambda node, partition: started.append(node) or work(node, partition),
+                          2)
+        self.assertFalse('c' in started)
+        self.assertRaises(ValueError, scheduler.run, {'a': {'b'}, 'b': {'a'}},
+                          {'a': [1], 'b': [1]}, work, 2)
+
+    def test_load_csv(self):
+        self._write_interface_files()
+        counts = load_csv.load(self.directory, chunk_size=2)
+        self.assertEqual(counts['bg_interface_status.csv'], 2)
+        self.assertEqual(counts['bg_interface_terms.csv'], 2)
+        self.assertEqual(counts['bg_interface_column.csv'], 3)
+        self.assertEqual(counts['bg_interface_columns_term.csv'], 2)
+
+        limit = Term.query.filter_by(name_key='credit limit').one()
+        self.assertEqual(limit.short_description, 'The most that can be borrowed')
+        self.assertEqual(limit.status.status, 'Approved')
+        self.assertEqual(limit.owner.name, 'Jo Black')
+        self.assertIsNone(limit.steward)
+        self.assertTrue('<em>cards</em>' in limit.long_description_html)
+        self.assertEqual([c.name for c in limit.categories], ['Credit'])
+        self.assertEqual([l.text for l in limit.links], ['Regulator'])
+        self.assertEqual([r.notes for r in limit.rules], ['First\nSecond'])
+        self.assertEqual([(c.table.name, c.name) for c in limit.columns],
+                         [('account', 'credit_limit')])
+        self.assertEqual(sorted((c.table.name, c.name) for c in Column.query),
+                         [('account', 'balance'), ('account', 'credit_limit'),
+                          ('customer', 'balance')])
+        self.assertEqual(Table.query.filter_by(name='account').one().location.name, 'warehouse')
+        self.assertEqual(search.search('borrowed')['terms'][0].name, 'Credit Limit')
+
+        counts = load_csv.load(self.directory)
+        self.assertEqual(sum(counts.values()), 0)
+        self.assertEqual(Column.query.count(), 3)
+
+    def _write_interface_files(self, **changes):
+        for file_name, text in INTERFACE_FILES.items():
+            with open(os.path.join(self.directory, file_name), 'w') as csv_file:
+                csv_file.write(changes.get(file_name[len('bg_interface_'):-len('.csv')], text))
+
+    def test_sync_csv(self):
+        self._write_interface_files()
+        load_csv.load(self.directory)
+        limit = Term.query.filter_by(name_key='credit limit').one()
+        balance_updated = Term.query.filter_by(name='Balance').one().updated_on
+
+        self._write_interface_files(
+            terms='name,short_description,long_description,abbreviation,status,owner,steward\n'
+                  'Credit Limit,The most that may be borrowed,Applies to **cards**,CL,Draft,'
+                  'Jo Black,Jo Black\n'
+                  'Balance,The amount owed,,,Draft,Jo Black,Jo Black\n'
+                  'Overdraft,Borrowing on an account,,,Draft,Jo Black,Jo Black\n',
+            locations='name,host,description,path,notes\nwarehouse,db2,,,\n',
+            table='location,table,description\nwarehouse,account,Customer accounts\n',
+            column='table,name,description,type,length,format\n'
+                   'account,credit_limit,,NUMBER,12,\n'
+                   'account,balance,,NUMBER,10,\n'
+                   'customer,balance,,NUMBER,10,\n')
+        counts = load_csv.load(self.directory, sync=True)
+        self.assertEqual(counts['bg_interface_terms.csv'], 2)
+        self.assertEqual(counts['bg_interface_locations.csv'], 1)
+        self.assertEqual(counts['bg_interface_table.csv'], 1)
+        self.assertEqual(counts['bg_interface_column.csv'], 1)
+
+        db.session.expire_all()
+        limit = Term.query.get(limit.id)
+        self.assertEqual(limit.short_description, 'The most that may be borrowed')
+        self.assertTrue('<strong>cards</strong>' in limit.long_description_html)
+        self.assertEqual(limit.status.status, 'Draft')
+        self.assertEqual(limit.steward.name, 'Jo Black')
+        self.assertEqual(Term.query.filter_by(name='Balance').one().updated_on, balance_updated)
+        self.assertEqual(Term.query.filter_by(name='Overdraft').count(), 1)
+        self.assertEqual(Location.query.one().host, 'db2')
+        self.assertEqual(Table.query.filter_by(name='account').one().description,
+                         'Customer accounts')
+        self.assertEqual(sorted(c.length for c in Column.query), ['10', '10', '12'])
+        self.assertEqual(search.search('borrowed')['terms'][0].name, 'Credit Limit')
+
+        writes = []
+
+        def count_writes(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith(('INSERT', 'UPDATE', 'DELETE')) and \
+                    'csv_staging' not in statement:
+                writes.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count_writes)
+        try:
+            counts = load_csv.load(self.directory, sync=True)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_writes)
+        self.assertEqual(sum(counts.values()), 0)
+        self.assertEqual(writes, [])
+
+        # Names that cannot be found leave the rows referring to what they did
+        self._write_interface_files(
+            terms='name,short_description,long_description,abbreviation,status,owner,steward\n'
+                  'Credit Limit,The most that may be lent,Applies to **cards**,CL,Retired,'
+                  'Jo Black,Nobody\n',
+            locations='name,host,description,path,notes\nwarehouse,db2,,,\n',
+            table='location,table,description\nlake,account,Accounts\n',
+            column='table,name,description,type,length,format\n')
+        counts = load_csv.load(self.directory, sync=True)
+        self.assertEqual(counts['bg_interface_terms.csv'], 1)
+        self.assertEqual(counts['bg_interface_table.csv'], 1)
+        db.session.expire_all()
+        limit = Term.query.get(limit.id)
+        self.assertEqual(limit.short_description, 'The most that may be lent')
+        self.assertEqual(limit.status.status, 'Draft')
+        self.assertEqual(limit.steward.name, 'Jo Black')
+        account = Table.query.filter_by(name='account').one()
+        self.assertEqual(account.description, 'Accounts')
+        self.assertEqual(account.location.name, 'warehouse')
+
+    def test_dump_empty_sections(self):
+        dump_name = os.path.join(self.directory, 'dump.yaml')
+        dump_yaml.dump(dump_name)
+        with open(dump_name) as dumped:
+            text = dumped.read()
+        self.assertTrue('terms: []' in text)
+        self.assertTrue('# No documents' in text)
+
+    def test_read_sections(self):
+        seen = []
+
+        def handler(section):
+            if section == 'terms':
+                return lambda records: seen.extend(record['name'] for record in records)
+            if section == 'rules':
+                # Records the handler does not read are skipped
+                return lambda records: seen.append(next(records)['name'])
+            return None
+
+        with open(self.file_name) as stream:
+            sections = read_sections(stream, handler)
+        self.assertEqual(sections[:7], ['person', 'term_status', 'document_type', 'location',
+                                        'category', 'terms', 'rules'])
+        self.assertEqual(seen, ['Credit Limit', 'Balance', 'Limit check'])
+
+
+if __name__ == '__main__':
+    unittest.main()
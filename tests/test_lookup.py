@@ -0,0 +1,93 @@
+import unittest
+
+from sqlalchemy import event
+
+from app.core import create_app
+from app.models import db
+from app.main.models import Term, Rule, Note
+
+
+class LookupTestCase(unittest.TestCase):
+
+    def _statements(self, path):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = db.get_engine(self.app)
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            response = self.client.get(path)
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return statements, response.get_data(as_text=True)
+
+    def setUp(self):
+        self.app = create_app('testing')
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        db.create_all()
+
+        self.client = self.app.test_client()
+        self.client.testing = True
+        self.client.post('/login', data={'email': 'admin@example.com', 'password': 'password'})
+
+        rule = Rule(identifier='CL1', name='Limit Review', description='Reviewed yearly',
+                    notes='Yearly')
+        rule.comments.append(Note(note='Reviewed'))
+        self.term = Term(name='Credit Limit', long_description='The most that can be borrowed',
+                         rules=[rule])
+        db.session.add(self.term)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_name_key_kept_on_write(self):
+        self.assertEqual(self.term.name_key, 'credit limit')
+        self.assertEqual(Rule.query.one().name_key, 'limit review')
+
+        self.term.name = 'Credit LIMIT Amount'
+        db.session.commit()
+        self.assertEqual(self.term.name_key, 'credit limit amount')
+
+    def test_term_by_name(self):
+        statements, page = self._statements('/term/CREDIT%20limit')
+        self.assertTrue('The most that can be borrowed' in page)
+        lookups = [statement for statement in statements if 'FROM term \nWHERE' in statement]
+        self.assertEqual(len(lookups), 1)
+        self.assertTrue('term.name_key = ?' in lookups[0])
+
+    def test_rule_by_name(self):
+        page = self.client.get('/rule/limit%20REVIEW').get_data(as_text=True)
+        self.assertTrue('Reviewed yearly' in page)
+
+    def test_rule_renamed_in_admin(self):
+        rule = Rule.query.one()
+        form = self.client.get('/admin/rule/edit/?id=%s' % rule.id).get_data(as_text=True)
+        self.assertFalse('name="name_key"' in form)
+        self.assertFalse('name="listed_comments"' in form)
+
+        response = self.client.post('/admin/rule/edit/?id=%s' % rule.id,
+                                    data={'identifier': 'CL1', 'name': 'Limit Approval',
+                                          'description': 'Reviewed yearly', 'notes': 'Yearly'})
+        self.assertEqual(response.status_code, 302)
+        db.session.expire_all()
+        self.assertEqual(Rule.query.one().name_key, 'limit approval')
+        page = self.client.get('/rule/Limit%20Approval').get_data(as_text=True)
+        self.assertTrue('Reviewed yearly' in page)
+
+    def test_missing_rule(self):
+        page = self.client.get('/rule/Unknown').get_data(as_text=True)
+        self.assertTrue('Page Not Found' in page)
+        page = self.client.get('/rule/999').get_data(as_text=True)
+        self.assertTrue('Page Not Found' in page)
+
+
+if __name__ == '__main__':
+    unittest.main()
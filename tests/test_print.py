@@ -0,0 +1,271 @@
+import datetime
+import os
+import re
+import tempfile
+import unittest
+from collections import namedtuple
+from unittest import mock
+
+from PyPDF2 import PdfFileReader, PdfFileWriter
+from sqlalchemy import event
+
+from app import pdf_cache
+from app.core import create_app
+from app.models import db, Job, User
+from app.print import chunk_terms, chunk_label, select_terms, render_terms, generate_pdf
+
+from app.main.models import Term, Category, Rule, Note, current_revision
+
+Row = namedtuple('Row', 'id name')
+
+
+def fake_pdf(html_path, pdf_path, options=None, css=None, cover=None):
+    '''Stand in for wkhtmltopdf, writing a page with a bookmark for each term of
+    a chunk, or a single page for the contents'''
+    with open(html_path, encoding='utf-8') as html_file:
+        names = re.findall(r'<h1>(.*?)</h1>', html_file.read())
+    writer = PdfFileWriter()
+    for page, name in enumerate(names or ['Contents']):
+        writer.addBlankPage(595, 842)
+        if names and 'outline-depth' in options:
+            writer.addBookmark(name, page)
+    with open(pdf_path, 'wb') as pdf_file:
+        writer.write(pdf_file)
+
+
+class PrintTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('testing')
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_chunks(self):
+        terms = [Row(i, name) for i, name in enumerate(['apple', 'Banana', 'cherry', 'Date', 'egg'])]
+        chunks = chunk_terms(terms, 2)
+        self.assertEqual([[row.name for row in chunk] for chunk in chunks],
+                         [['apple', 'Banana'], ['cherry', 'Date'], ['egg']])
+        self.assertEqual([chunk_label(chunk) for chunk in chunks], ['A - B', 'C - D', 'E'])
+
+    def test_select_terms(self):
+        credit = Category(name='Credit')
+        risk = Category(name='Risk')
+        db.session.add_all([Term(name='Limit', categories=[credit, risk]),
+                            Term(name='Balance', categories=[credit]),
+                            Term(name='Account')])
+        db.session.commit()
+        self.assertEqual([row.name for row in select_terms(None)], ['Account', 'Balance', 'Limit'])
+        self.assertEqual([row.name for row in select_terms([credit.id, risk.id])],
+                         ['Balance', 'Limit'])
+
+    def test_render_terms(self):
+        term = Term(name='Limit', long_description='The **most** that can be borrowed')
+        db.session.add(term)
+        db.session.commit()
+
+        handle, path = tempfile.mkstemp(suffix='.html')
+        os.close(handle)
+        try:
+            with self.app.test_request_context():
+                render_terms(path, [term.id])
+            with open(path, encoding='utf-8') as html_file:
+                html = html_file.read()
+        finally:
+            os.remove(path)
+        self.assertTrue('<h1>Limit</h1>' in html)
+        self.assertTrue('<strong>most</strong>' in html)
+
+    def test_generate_chunked_pdf(self):
+        self.app.config['PDF_CHUNK_SIZE'] = 2
+        self.app.config['PDF_WORKERS'] = 2
+        db.session.add_all([Term(name=name) for name in
+                            ('Account', 'Balance', 'Credit', 'Debit', 'Equity')])
+        db.session.commit()
+
+        filename = 'glossary_chunked_test.pdf'
+        target = os.path.join(pdf_cache.cache_directory(), filename)
+        try:
+            with self.app.test_request_context(), \
+                    mock.patch('app.print.pdfkit.from_file', fake_pdf):
+                generate_pdf(filename, None, user=User.query.first())
+            with open(target, 'rb') as pdf_file:
+                reader = PdfFileReader(pdf_file)
+                self.assertEqual(reader.getNumPages(), 6)
+                outlines = reader.getOutlines()
+                sections = [(item.title, reader.getDestinationPageNumber(item))
+                            for item in outlines if not isinstance(item, list)]
+                terms = [(item.title, reader.getDestinationPageNumber(item))
+                         for children in outlines if isinstance(children, list)
+                         for item in children]
+        finally:
+            if os.path.isfile(target):
+                os.remove(target)
+        self.assertEqual(sections, [('A - B', 1), ('C - D', 3), ('E', 5)])
+        self.assertEqual(terms, [('Account', 1), ('Balance', 2), ('Credit', 3), ('Debit', 4),
+                                 ('Equity', 5)])
+
+    def _render_queries(self, term):
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        handle, path = tempfile.mkstemp(suffix='.html')
+        os.close(handle)
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            with self.app.test_request_context():
+                render_terms(path, [term.id])
+            with open(path, encoding='utf-8') as html_file:
+                html = html_file.read()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+            os.remove(path)
+        return html, len(statements)
+
+    def test_render_notes_eager_loaded(self):
+        term = Term(name='Limit')
+        db.session.add(term)
+        for number in range(5):
+            rule = Rule(identifier='R%s' % number, name='Rule %s' % number)
+            rule.comments.append(Note(note='Checked by job %s' % number))
+            term.rules.append(rule)
+            if number == 0:
+                db.session.commit()
+                html, few = self._render_queries(term)
+                self.assertTrue('Checked by job 0' in html)
+        db.session.commit()
+
+        html, many = self._render_queries(term)
+        self.assertTrue('Checked by job 4' in html)
+        self.assertEqual(few, many)
+
+
+class PdfCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('testing')
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        db.create_all()
+
+        self.client = self.app.test_client()
+        self.client.testing = True
+        self.client.post('/login', data={'email': 'admin@example.com', 'password': 'password'})
+        self.files = []
+
+    def tearDown(self):
+        for filename in self.files:
+            path = os.path.join(pdf_cache.cache_directory(), filename)
+            if os.path.isfile(path):
+                os.remove(path)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _cache(self, filename, size=10, used=None):
+        self.files.append(filename)
+        path = os.path.join(pdf_cache.cache_directory(), filename)
+        with open(path, 'wb') as pdf_file:
+            pdf_file.write(b'%' * size)
+        if used is not None:
+            os.utime(path, (used, used))
+        return path
+
+    def _glossary_pdf(self, *terms):
+        user = User.query.filter_by(email='admin@example.com').one()
+        return pdf_cache.cache_name(current_revision(), [term.id for term in terms], [], user.id)
+
+    def test_revision(self):
+        revision = current_revision()
+        rule = Rule(identifier='R1', name='Limit Rule')
+        db.session.add_all([Term(name='Limit'), rule])
+        db.session.commit()
+        self.assertEqual(current_revision(), revision + 1)
+
+        rule.description = 'Limits are reviewed yearly'
+        db.session.commit()
+        self.assertEqual(current_revision(), revision + 2)
+
+        db.session.add(Job(kind='backup', filename='backup.yml'))
+        db.session.commit()
+        self.assertEqual(current_revision(), revision + 2)
+
+    def test_cached_pdf_is_served(self):
+        term = Term(name='Limit')
+        db.session.add(term)
+        db.session.commit()
+        filename = self._glossary_pdf(term)
+        self._cache(filename)
+
+        response = self.client.post('/generate_pdf/')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith('/download/%s/' % filename))
+        self.assertEqual(Job.query.count(), 0)
+
+    def test_changed_glossary_is_printed(self):
+        term = Term(name='Limit')
+        db.session.add(term)
+        db.session.commit()
+        filename = self._glossary_pdf(term)
+        self._cache(filename)
+
+        term.short_description = 'The most that can be borrowed'
+        db.session.commit()
+
+        response = self.client.post('/generate_pdf/')
+        self.assertEqual(response.status_code, 302)
+        job = Job.query.one()
+        self.files.append(job.filename)
+        self.assertEqual(job.filename, self._glossary_pdf(term))
+        self.assertNotEqual(job.filename, filename)
+
+    def test_abandoned_print_is_not_followed(self):
+        term = Term(name='Limit')
+        db.session.add(term)
+        db.session.commit()
+        filename = self._glossary_pdf(term)
+        self.files.append(filename)
+        started = datetime.datetime.utcnow() - datetime.timedelta(hours=2)
+        live = Job(kind='pdf', filename=filename, status='running')
+        db.session.add(live)
+        db.session.commit()
+        abandoned = Job(kind='pdf', filename=filename, status='running',
+                        created_on=started, started_on=started)
+        db.session.add(abandoned)
+        db.session.commit()
+
+        response = self.client.post('/generate_pdf/')
+        self.assertTrue(response.location.endswith('/jobs/%s' % live.id))
+
+        live.status = 'failed'
+        db.session.commit()
+        response = self.client.post('/generate_pdf/')
+        self.assertEqual(Job.query.count(), 3)
+        self.assertFalse(response.location.endswith('/jobs/%s' % abandoned.id))
+
+    def test_evict(self):
+        self.app.config['PDF_CACHE_SIZE'] = 25
+        old_revision = self._cache('glossary_cache_1_aa.pdf', used=400)
+        recent = self._cache('glossary_cache_2_bb.pdf', used=300)
+        least_recent = self._cache('glossary_cache_2_cc.pdf', used=200)
+        latest = self._cache('glossary_cache_2_dd.pdf', used=100)
+
+        pdf_cache.evict('glossary_cache_2_dd.pdf')
+        self.assertFalse(os.path.isfile(old_revision))
+        self.assertFalse(os.path.isfile(least_recent))
+        self.assertTrue(os.path.isfile(recent))
+        self.assertTrue(os.path.isfile(latest))
+
+
+if __name__ == '__main__':
+    unittest.main()
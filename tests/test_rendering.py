@@ -0,0 +1,78 @@
+import unittest
+
+from app.core import create_app
+from app.models import db, Term, Rule, Note
+from app.main import rendering
+
+
+class RenderingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('testing')
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        db.create_all()
+
+        self.client = self.app.test_client()
+        self.client.testing = True
+        self.client.post('/login', data={'email': 'admin@example.com', 'password': 'password'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_rendered_on_write(self):
+        rule = Rule(identifier='CL1', name='Limit Review', description='Reviewed *yearly*')
+        rule.comments.append(Note(note='| Limit |\n| --- |\n| 100 |'))
+        term = Term(name='Credit Limit', long_description='The **most** that can be borrowed',
+                    rules=[rule])
+        db.session.add(term)
+        db.session.commit()
+
+        self.assertTrue('<strong>most</strong>' in term.long_description_html)
+        self.assertTrue('<em>yearly</em>' in rule.description_html)
+        self.assertIsNone(rule.notes_html)
+        self.assertTrue('<table>' in rule.comments.one().note_html)
+
+        term.long_description = 'The least that can be borrowed'
+        db.session.commit()
+        self.assertEqual(term.long_description_html, '<p>The least that can be borrowed</p>')
+
+    def test_page_shows_stored_html(self):
+        term = Term(name='Credit Limit', long_description='The most that can be borrowed')
+        db.session.add(term)
+        db.session.commit()
+
+        table = Term.__table__
+        db.session.execute(table.update().values(long_description_html='<p>Stored HTML</p>'))
+        db.session.commit()
+
+        page = self.client.get('/term/%s' % term.id).get_data(as_text=True)
+        self.assertTrue('Stored HTML' in page)
+        self.assertFalse('The most that can be borrowed' in page)
+
+    def test_backfill(self):
+        db.session.execute(Term.__table__.insert(), [
+            {'name': 'Term %s' % index, 'long_description': '# Term %s' % index}
+            for index in range(5)])
+        db.session.execute(Term.__table__.insert().values(name='Undescribed'))
+        db.session.commit()
+        updated_on = dict(db.session.query(Term.id, Term.updated_on))
+
+        self.assertEqual(rendering.backfill(batch_size=2), 5)
+        self.assertEqual(rendering.backfill(), 0)
+        self.assertEqual(rendering.backfill(everything=True), 5)
+
+        for term in Term.query:
+            if term.long_description:
+                self.assertEqual(term.long_description_html, '<h1>%s</h1>' % term.name)
+            else:
+                self.assertIsNone(term.long_description_html)
+            self.assertEqual(term.updated_on, updated_on[term.id])
+
+
+if __name__ == '__main__':
+    unittest.main()
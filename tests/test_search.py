@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from app.core import create_app
+from app.models import db
+from app import search
+from app.search.memory import InvertedIndex, MemoryBackend
+
+from app.main.models import TermStatus, Term, Person, Location, Table, Column, Rule
+
+
+class SearchTestCase(unittest.TestCase):
+
+    def _add_content(self):
+        p = Person(name='Jo Black')
+        ts = TermStatus(status='Approved')
+        desc = """Comprehensive credit reporting (CCR) commenced on 12 March 2014."""
+        term = Term(name='Comprehensive Credit Reporting', abbreviation='CCR',
+                    short_description='Hello', long_description=desc, owner=p, steward=p, status=ts)
+        other = Term(name='Credit Limit', short_description='Mentions comprehensive reporting',
+                     owner=p, steward=p, status=ts)
+        l = Location(name='test location')
+        t = Table(name='test_table', location=l)
+        c = Column(name='test_ccr', table=t)
+        r = Rule(identifier='BR001', name='Credit rule', notes='Checks the reporting flag')
+        db.session.add_all([p, ts, term, other, l, t, c, r])
+        db.session.commit()
+        return term, other, c, r
+
+    def setUp(self):
+        self.app = create_app('testing')
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        db.create_all()
+
+        self.client = self.app.test_client()
+        self.client.testing = True
+        self.client.post('/login', data={'email': 'admin@example.com', 'password': 'password'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_search_finds_terms_rules_and_columns(self):
+        term, other, column, rule = self._add_content()
+        results = search.search('ccr')
+        self.assertEqual(results['terms'], [term])
+        self.assertEqual(results['columns'], [column])
+        self.assertEqual(search.search('reporting')['rules'], [rule])
+
+    def test_search_ranks_title_matches_first(self):
+        term, other, column, rule = self._add_content()
+        self.assertEqual(search.search('comprehensive')['terms'], [term, other])
+        self.assertEqual(search.search('compre')['terms'], [term, other])
+
+    def test_index_follows_changes(self):
+        term, other, column, rule = self._add_content()
+        term.name = 'Positive Reporting'
+        db.session.commit()
+        self.assertEqual(search.search('positive')['terms'], [term])
+
+        db.session.delete(column)
+        db.session.commit()
+        self.assertEqual(search.search('ccr')['columns'], [])
+
+    def _clear_index(self):
+        db.session.execute('DELETE FROM search_index')
+
+    def test_rebuild(self):
+        self._add_content()
+        self._clear_index()
+        self.assertEqual(search.search('ccr')['terms'], [])
+        self.assertEqual(search.rebuild(), 4)
+        self.assertEqual(len(search.search('ccr')['terms']), 1)
+
+    def test_search_page(self):
+        self._add_content()
+        response = self.client.post('/search', data={'search': 'ccr'})
+        self.assertTrue('Comprehensive Credit Reporting' in response.get_data(as_text=True))
+        self.assertTrue('test_ccr' in response.get_data(as_text=True))
+
+
+class MemorySearchTestCase(SearchTestCase):
+
+    def setUp(self):
+        super(MemorySearchTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.app.config['SEARCH_BACKEND'] = 'memory'
+        self.app.config['SEARCH_SNAPSHOT'] = os.path.join(self.directory, 'search_index.pickle')
+        search.init_app(self.app)
+
+    def tearDown(self):
+        super(MemorySearchTestCase, self).tearDown()
+        shutil.rmtree(self.directory)
+
+    def _clear_index(self):
+        search.get_backend().clear(None)
+
+    def test_backend(self):
+        self.assertTrue(isinstance(search.get_backend(), MemoryBackend))
+
+    def test_rolled_back_changes(self):
+        term, other, column, rule = self._add_content()
+        db.session.delete(term)
+        db.session.add(Term(name='Credit Reporting Agency'))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual([t.name for t in search.search('ccr')['terms']],
+                         ['Comprehensive Credit Reporting'])
+        self.assertEqual(search.search('agency')['terms'], [])
+
+        term = Term.query.filter_by(abbreviation='CCR').one()
+        db.session.delete(term)
+        db.session.commit()
+        self.assertEqual(search.search('ccr')['terms'], [])
+
+    def test_snapshot(self):
+        term, other, column, rule = self._add_content()
+        search.rebuild()
+        self.assertTrue(os.path.isfile(self.app.config['SEARCH_SNAPSHOT']))
+
+        backend = MemoryBackend(snapshot=self.app.config['SEARCH_SNAPSHOT'])
+        backend.create(db.session.connection())
+        self.assertEqual(backend.search(None, 'ccr', 'term', 10), [term.id])
+
+        # A snapshot is not used once the database has moved on
+        db.session.add(Term(name='Another Term'))
+        db.session.commit()
+        backend = MemoryBackend(snapshot=self.app.config['SEARCH_SNAPSHOT'])
+        backend.create(db.session.connection())
+        self.assertTrue(backend.is_empty(None))
+
+
+class InvertedIndexTestCase(unittest.TestCase):
+
+    def test_prefix_and_ranking(self):
+        index = InvertedIndex()
+        index.add(1, 'Credit Limit', 'The limit of credit')
+        index.add(2, 'Loan', 'A credit facility')
+        index.add(3, 'Account', 'Nothing relevant')
+        self.assertEqual(index.search('cred', 10), [1, 2])
+        self.assertEqual(index.search('credit facility', 10), [2])
+        self.assertEqual(index.search('missing', 10), [])
+
+    def test_replace_and_remove(self):
+        index = InvertedIndex()
+        index.add(1, 'Credit Limit', '')
+        index.add(1, 'Debit Limit', '')
+        self.assertEqual(index.search('credit', 10), [])
+        self.assertEqual(index.search('debit', 10), [1])
+        index.remove(1)
+        self.assertEqual(index.search('limit', 10), [])
+        self.assertEqual(index.vocabulary, [])
+        self.assertEqual(index.total_length, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import json
+import unittest
+
+from app.core import create_app
+from app.models import db
+
+from app.main.models import Term, Location, Table, Column
+
+
+class TermBlueprintTestCase(unittest.TestCase):
+
+    def _add_assets(self):
+        l = Location(name='warehouse')
+        t1 = Table(name='customer', location=l)
+        t2 = Table(name='account', location=l)
+        db.session.add_all([l, t1, t2,
+                            Column(name='Customer_Id', table=t1),
+                            Column(name='customer_name', table=t1),
+                            Column(name='account_id', table=t2),
+                            Column(name='cust', table=t2),
+                            Term(name='Customer'),
+                            Term(name='customer number'),
+                            Term(name='Account')])
+        db.session.commit()
+
+    def _get_json(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.get_data(as_text=True))
+
+    def setUp(self):
+        self.app = create_app('testing')
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        db.create_all()
+
+        self.client = self.app.test_client()
+        self.client.testing = True
+        self.client.post('/login', data={'email': 'admin@example.com', 'password': 'password'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_autocomplete_columns(self):
+        self._add_assets()
+        data = self._get_json('/autocomplete?q=CUSTOMER')
+        self.assertEqual([row['column'] for row in data['matching_results']],
+                         ['Customer_Id', 'customer_name'])
+        self.assertEqual(data['matching_results'][0]['table'], 'customer')
+        self.assertEqual(data['matching_results'][0]['location'], 'warehouse')
+
+        data = self._get_json('/autocomplete?q=cust&limit=1')
+        self.assertEqual([row['column'] for row in data['matching_results']], ['cust'])
+
+        data = self._get_json('/autocomplete?q=')
+        self.assertEqual(data['matching_results'], [])
+
+    def test_autocomplete_terms(self):
+        self._add_assets()
+        data = self._get_json('/autocomplete/terms?q=cust')
+        self.assertEqual([row['label'] for row in data['matching_results']],
+                         ['Customer', 'customer number'])
+
+    def test_asset_tree(self):
+        self._add_assets()
+        db.session.add(Table(name='orphan'))
+        db.session.commit()
+
+        data = self._get_json('/assets/tree/')
+        self.assertEqual([(node['text'], node['count']) for node in data['nodes']],
+                         [('warehouse', 2), ('No location', 1)])
+        self.assertFalse(data['more'])
+
+        location = data['nodes'][0]['id']
+        data = self._get_json('/assets/tree/?node=%s&limit=1' % location)
+        self.assertEqual([(node['text'], node['count']) for node in data['nodes']],
+                         [('account', 2)])
+        self.assertTrue(data['more'])
+        data = self._get_json('/assets/tree/?node=%s&limit=1&offset=1' % location)
+        self.assertEqual([node['text'] for node in data['nodes']], ['customer'])
+        self.assertFalse(data['more'])
+
+        data = self._get_json('/assets/tree/?node=%s' % data['nodes'][0]['id'])
+        self.assertEqual([node['text'] for node in data['nodes']], ['Customer_Id', 'customer_name'])
+
+        data = self._get_json('/assets/tree/?node=location:none')
+        self.assertEqual([node['text'] for node in data['nodes']], ['orphan'])
+
+        self.assertEqual(self.client.get('/assets/tree/?node=column:1').status_code, 404)
+
+    def test_asset_tree_etag(self):
+        self._add_assets()
+        response = self.client.get('/assets/tree/')
+        etag = response.headers['ETag']
+
+        response = self.client.get('/assets/tree/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        db.session.add(Location(name='lake'))
+        db.session.commit()
+        response = self.client.get('/assets/tree/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(len(json.loads(response.get_data(as_text=True))['nodes']), 2)
+
+    def _post_json(self, path, data):
+        response = self.client.post(path, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.get_data(as_text=True))
+
+    def test_assign_assets(self):
+        self._add_assets()
+        term = Term.query.filter_by(name='Customer').one()
+        term.long_description = 'A customer'
+        db.session.commit()
+        ids = [column.id for column in Column.query.order_by(Column.id)]
+        self.assertFalse('account_id' in self.client.get('/term/%s' % term.id).get_data(as_text=True))
+
+        data = self._post_json('/term/%s/assets/assign' % term.id, {'columns': ids[:2]})
+        self.assertEqual(data, {'assigned': ids[:2], 'existing': [], 'unknown': []})
+
+        data = self._post_json('/term/%s/assets/assign' % term.id,
+                               {'columns': ids[1:] + ids[2:] + [999]})
+        self.assertEqual(data, {'assigned': ids[2:], 'existing': ids[1:2], 'unknown': [999]})
+        self.assertEqual(sorted(column.id for column in term.columns), ids)
+        self.assertTrue('account_id' in self.client.get('/term/%s' % term.id).get_data(as_text=True))
+
+        data = self._post_json('/term/%s/assets/unassign' % term.id, {'columns': ids[2:] + [999]})
+        self.assertEqual(data, {'unassigned': ids[2:], 'missing': [999]})
+        self.assertEqual(sorted(column.id for column in term.columns), ids[:2])
+        self.assertFalse('account_id' in self.client.get('/term/%s' % term.id).get_data(as_text=True))
+
+        response = self.client.post('/term/%s/assets/assign' % term.id,
+                                    data=json.dumps({'columns': 'all'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_assign_assets_form(self):
+        self._add_assets()
+        term = Term.query.filter_by(name='Customer').one()
+        ids = [column.id for column in Column.query.order_by(Column.id)]
+        self.client.post('/term/%s/assets/v4' % term.id, data={'do_assign': ids[:3]})
+        self.assertEqual(sorted(column.id for column in term.columns), ids[:3])
+
+
+if __name__ == '__main__':
+    unittest.main()